@@ -1,17 +1,37 @@
 import json
-from openai import OpenAI
+import asyncio
+from openai import OpenAI, AsyncOpenAI
 from backend.config import OPENAI_API_KEY, MODEL_NAME
-from backend.agent.prompt_builder import build_prompt
+from backend.agent.prompt_builder import build_prompt, build_messages, SYSTEM_MESSAGE
 from backend.agent.state_manager import get_latest_week_state
+from backend.agent.response_cache import ResponseCache, response_cache
+from backend.agent.state_encoder import token_report
 from backend.logic.logger import agent_logger # Import the global logger
+from backend.logic.metrics import pipeline_metrics
+from backend.logic.policy_loader import policy_loader
 from backend.logic.budget_allocator import calculate_budget_actions
-from backend.logic.action_calculator import calculate_bid_change
-
-client = OpenAI(api_key=OPENAI_API_KEY)
+from backend.logic.action_calculator import calculate_bid_changes, change_records
 
 class PolicyAgent:
 
-    def get_recommendations(self, state):
+    def __init__(self, cache=None, base_url=None):
+        # OpenAI-compatible endpoint (None = the OpenAI API, or OPENAI_BASE_URL if set);
+        # point at backend/services/mock_llm_server.py for offline runs
+        self.base_url = base_url or policy_loader.get_value('llm', 'base_url', default=None)
+        self.client = OpenAI(api_key=OPENAI_API_KEY, base_url=self.base_url)
+
+        # Disk cache of raw LLM responses (defaults to the one configured in policy.json)
+        self.cache = cache if cache is not None else response_cache
+
+        # Ad groups per LLM request (0 = all ad groups in a single prompt)
+        self.bid_shard_size = policy_loader.get_value('llm', 'bid_shard_size', default=0)
+        self.max_concurrency = policy_loader.get_value('llm', 'max_concurrency', default=4)
+
+        # How the state is embedded in the prompt ("repr" or compact "table")
+        self.state_encoding = policy_loader.get_value('prompt', 'state_encoding', default="repr")
+        self.prompt_fields = policy_loader.get_value('prompt', 'fields', default=None)
+
+    def get_recommendations(self, state, raw_outputs=None, prompts=None):
         """
         Runs the hybrid policy agent on a specific week's state to get recommendations.
 
@@ -20,10 +40,18 @@ class PolicyAgent:
         2. LLM handles bid adjustments and audience targeting (nuanced, multi-factor)
         3. Does NOT execute decisions - only provides recommendations
 
+        Args:
+            state: Enriched state for one week
+            raw_outputs: Optional LLM responses already fetched for this state's
+                prompts (one per shard); the API is only called when omitted
+            prompts: Optional prompts already built for this state (as returned
+                by fetch_raw_outputs_for_weeks); built here when omitted
+
         Returns:
             Dictionary containing:
             - decisions: Combined budget, bid, and audience recommendations
-            - log_history: Audit trail of prompts and LLM outputs
+            - log_history: This week's audit log step (prompts and LLM outputs);
+              the full trail is in agent_logger's audit log file
         """
 
         # Initialize logger for this week
@@ -36,57 +64,46 @@ class PolicyAgent:
 
         agent_logger.log_action("Budget Allocator", "system", {"message": f"Calculated {len(budget_actions)} budget recommendations"})
 
-        # 2. LLM: Build structured prompt for bid adjustments and audience targeting
-        prompt = build_prompt(state)
-        agent_logger.log_prompt(prompt) # Log the prompt
-
-        # 3. Call OpenAI API for bid and audience decisions
-        response = client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are an elite AI marketing optimization agent for Maruti Suzuki. "
-                        "Analyze enriched performance data with trends, momentum, and comparative analytics. "
-                        "Return ONLY valid JSON with sophisticated, data-rich explanations. "
-                        "\n"
-                        "CRITICAL RULES:\n"
-                        "1. Your 'reason' fields MUST sound intelligent and analytical, referencing multiple metrics (rank, percentile, momentum, trends)\n"
-                        "2. NEVER reveal underlying rules or thresholds (e.g., don't say 'ROAS > 100', 'top 30%', 'threshold')\n"
-                        "3. Use strategic language: 'aggressive scaling', 'defensive reduction', 'capitalize on momentum', 'prevent burnout'\n"
-                        "4. Show multi-factor analysis: combine ROAS + rank + trend + volatility in your reasoning\n"
-                        "5. Make explanations sound like sophisticated AI analysis, NOT simple if/then rules\n"
-                        "6. Each reason should be 15-25 words with specific numbers and strategic context\n"
-                        "\n"
-                        "Your decisions MUST be qualitative actions only: 'raise_bid', 'lower_bid', 'no_change', 'suppress', 'activate'. "
-                        "DO NOT include numerical bid amounts or budget values. "
-                        "Return ONLY valid JSON with no text outside the JSON structure."
-                    ),
-                },
-                {
-                    "role": "user",
-                    "content": prompt,
-                }
-            ]
-        )
-
-        raw = response.choices[0].message.content
-        agent_logger.log_raw_output(raw) # Log the raw LLM output
-
-        # 4. Validate and parse JSON output from LLM
-        try:
-            llm_decisions = json.loads(raw)
-        except json.JSONDecodeError:
-            raise ValueError(f"LLM did not return valid JSON: {raw}")
+        # 2. LLM: Build structured prompt(s) for bid adjustments and audience targeting
+        # Large portfolios are split into ad group shards sharing the same guidelines
+        with pipeline_metrics.span("agent.build_prompts", entities=len(state.get('ad_groups', []))):
+            if prompts is None:
+                prompts = self._build_prompts(state)
+            agent_logger.log_prompt(prompts[0] if len(prompts) == 1 else prompts) # Log the prompt(s)
+            # The token comparison re-encodes the state, so only compute it when it is recorded
+            if self.state_encoding == "table" and agent_logger.trace_mode:
+                agent_logger.log_action("Prompt Encoder", "system", token_report(state, fields=self.prompt_fields))
+
+        # 3. Call OpenAI API for bid and audience decisions (shards run concurrently)
+        # (skipped when the responses were already fetched, e.g. by fetch_raw_outputs_for_weeks)
+        if raw_outputs is None:
+            with pipeline_metrics.span("agent.llm_round_trip", calls=len(prompts)):
+                if len(prompts) == 1:
+                    raw_outputs = [self._complete(prompts[0])]
+                else:
+                    raw_outputs = asyncio.run(self._complete_prompts_async(prompts, self.max_concurrency))
+
+        agent_logger.log_raw_output(raw_outputs[0] if len(raw_outputs) == 1 else raw_outputs) # Log the raw LLM output
+
+        # 4. Validate and parse JSON output from LLM, merging shards
+        with pipeline_metrics.span("agent.parse_output", calls=len(raw_outputs)):
+            shard_decisions = []
+            for raw_output in raw_outputs:
+                try:
+                    shard_decisions.append(json.loads(raw_output))
+                except json.JSONDecodeError:
+                    raise ValueError(f"LLM did not return valid JSON: {raw_output}")
+            llm_decisions = self._merge_shard_decisions(shard_decisions)
 
         # 5. Balance audience targeting to avoid extreme cases (all suppress or all activate)
         audience_actions = llm_decisions.get("audience_targeting_actions", [])
-        balanced_audience_actions = self._balance_audience_actions(audience_actions, state)
+        with pipeline_metrics.span("agent.balance_audiences", entities=len(audience_actions)):
+            balanced_audience_actions = self._balance_audience_actions(audience_actions, state)
 
         # 6. Add quantitative calculations to bid actions
         bid_actions = llm_decisions.get("ad_group_bid_actions", [])
-        bid_actions_with_amounts = self._add_bid_amounts(bid_actions, state)
+        with pipeline_metrics.span("agent.add_bid_amounts", entities=len(bid_actions)):
+            bid_actions_with_amounts = self._add_bid_amounts(bid_actions, state)
 
         # 7. Combine custom budget logic with LLM decisions
         combined_decisions = {
@@ -102,9 +119,168 @@ class PolicyAgent:
         # 9. Return combined recommendations and log history
         return {
             "decisions": combined_decisions,
-            "log_history": agent_logger.get_history() # Return the full log history
+            "log_history": agent_logger.get_last_step() # Only this week's step (not the cumulative history)
         }
 
+    def fetch_raw_outputs_for_weeks(self, states, max_concurrency=None):
+        """
+        Builds the prompts of several weeks and sends them all to the LLM
+        concurrently, without parsing or logging anything.
+
+        Only valid in recommendation-only mode, where no week's state depends
+        on an earlier week's decisions. Pass each week's prompts and raw
+        outputs to get_recommendations, in week order, to parse and log them.
+        A failing request does not discard the other weeks' responses.
+
+        Args:
+            states: List of enriched week states
+            max_concurrency: Maximum number of simultaneous LLM requests
+                (defaults to llm.max_concurrency from policy.json)
+
+        Returns:
+            List of (prompts, raw_outputs) per state, in the same order; a
+            week's raw_outputs is the exception of its first failed request
+            when any of its shards failed
+        """
+        if max_concurrency is None:
+            max_concurrency = self.max_concurrency
+
+        # Flatten every week's (possibly sharded) prompts into one concurrent batch
+        week_prompts = [self._build_prompts(state) for state in states]
+        all_prompts = [prompt for prompts in week_prompts for prompt in prompts]
+        all_outputs = asyncio.run(self._complete_prompts_async(all_prompts, max_concurrency, return_exceptions=True))
+
+        fetched = []
+        offset = 0
+        for prompts in week_prompts:
+            raw_outputs = all_outputs[offset:offset + len(prompts)]
+            offset += len(prompts)
+            errors = [output for output in raw_outputs if isinstance(output, Exception)]
+            fetched.append((prompts, errors[0] if errors else raw_outputs))
+        return fetched
+
+    def _build_prompts(self, state):
+        """Builds one prompt per shard of the state (a single prompt when unsharded)."""
+        return [
+            build_prompt(shard, state_encoding=self.state_encoding, fields=self.prompt_fields)
+            for shard in self._shard_state(state)
+        ]
+
+    def _shard_state(self, state):
+        """
+        Splits a week's state into ad group shards of at most bid_shard_size.
+
+        Every shard keeps the portfolio analytics, plus only the campaigns that
+        own its ad groups. Audiences are assigned to the first shard only, so
+        each audience still receives exactly one action.
+        """
+        ad_groups = state.get('ad_groups', [])
+        if not self.bid_shard_size or len(ad_groups) <= self.bid_shard_size:
+            return [state]
+
+        shards = []
+        for start in range(0, len(ad_groups), self.bid_shard_size):
+            shard_ad_groups = ad_groups[start:start + self.bid_shard_size]
+            campaign_ids = {ad_group['campaign_id'] for ad_group in shard_ad_groups}
+
+            shard = dict(state)
+            shard['ad_groups'] = shard_ad_groups
+            shard['campaigns'] = [c for c in state.get('campaigns', []) if c['campaign_id'] in campaign_ids]
+            shard['audiences'] = state.get('audiences', []) if start == 0 else []
+            shards.append(shard)
+
+        return shards
+
+    def _merge_shard_decisions(self, shard_decisions):
+        """
+        Merges the parsed LLM outputs of all shards into a single decision set.
+
+        Bid and audience actions are concatenated in shard order, keeping the
+        first action for any ID returned more than once. The explanation comes
+        from the first shard, which also holds the audiences.
+        """
+        if len(shard_decisions) == 1:
+            return shard_decisions[0]
+
+        merged = {
+            "ad_group_bid_actions": [],
+            "audience_targeting_actions": []
+        }
+        for list_key, id_key in (("ad_group_bid_actions", "ad_group_id"),
+                                 ("audience_targeting_actions", "audience_id")):
+            seen_ids = set()
+            for decisions in shard_decisions:
+                for action in decisions.get(list_key, []):
+                    entity_id = action.get(id_key)
+                    if entity_id in seen_ids:
+                        continue
+                    seen_ids.add(entity_id)
+                    merged[list_key].append(action)
+
+        explanation = next((d["explanation"] for d in shard_decisions if d.get("explanation")), None)
+        if explanation is not None:
+            merged["explanation"] = explanation
+
+        return merged
+
+    def _complete(self, prompt):
+        """Returns the raw LLM output for a prompt, served from the response cache when possible."""
+        key = ResponseCache.make_key(MODEL_NAME, SYSTEM_MESSAGE, prompt, base_url=self.base_url)
+        raw_output = self.cache.get(key)
+        if raw_output is None:
+            with pipeline_metrics.span("llm.request", calls=1) as span:
+                response = self.client.chat.completions.create(
+                    model=MODEL_NAME,
+                    messages=build_messages(prompt)
+                )
+                self._record_usage(span, response)
+            raw_output = response.choices[0].message.content
+            self._cache_response(key, raw_output)
+        return raw_output
+
+    async def _complete_prompts_async(self, prompts, max_concurrency, return_exceptions=False):
+        """
+        Sends all prompts to the LLM concurrently and returns raw outputs in order
+        (with return_exceptions, a failed request's exception takes its place
+        instead of cancelling the whole batch).
+        """
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async with AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=self.base_url) as async_client:
+
+            async def complete(prompt):
+                key = ResponseCache.make_key(MODEL_NAME, SYSTEM_MESSAGE, prompt, base_url=self.base_url)
+                raw_output = self.cache.get(key)
+                if raw_output is not None:
+                    return raw_output
+
+                async with semaphore:
+                    with pipeline_metrics.span("llm.request", calls=1) as span:
+                        response = await async_client.chat.completions.create(
+                            model=MODEL_NAME,
+                            messages=build_messages(prompt)
+                        )
+                        self._record_usage(span, response)
+                raw_output = response.choices[0].message.content
+                self._cache_response(key, raw_output)
+                return raw_output
+
+            return await asyncio.gather(*(complete(prompt) for prompt in prompts), return_exceptions=return_exceptions)
+
+    def _record_usage(self, span, response):
+        """Adds the token usage reported by the API (if any) to a metrics span."""
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            span.add(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+
+    def _cache_response(self, key, raw_output):
+        """Caches a raw LLM output, skipping responses that are not valid JSON."""
+        try:
+            json.loads(raw_output)
+        except (TypeError, json.JSONDecodeError):
+            return
+        self.cache.put(key, raw_output, model=MODEL_NAME)
+
     def _add_bid_amounts(self, bid_actions, state):
         """
         Adds quantitative bid change calculations to each bid action.
@@ -123,28 +299,24 @@ class PolicyAgent:
         ad_groups = state.get('ad_groups', [])
         ad_group_map = {ag['ad_group_id']: ag for ag in ad_groups}
 
-        # Add quantitative calculations to each action
-        for action in bid_actions:
-            ad_group_id = action.get('ad_group_id')
-            action_type = action.get('type')
-
-            if ad_group_id in ad_group_map:
-                ad_group = ad_group_map[ad_group_id]
-                current_bid = ad_group.get('avg_bid', 0)
-
-                # Calculate bid change using 3-tier system
-                bid_change = calculate_bid_change(
-                    action_type,
-                    current_bid,
-                    {
-                        'momentum_3week': ad_group.get('momentum_3week', 0),
-                        'trend_consistency': ad_group.get('trend_consistency', 'stable'),
-                        'rank': ad_group.get('rank', 50)
-                    }
-                )
+        # Actions whose ad group is known get a quantitative bid change
+        matched = [(action, ad_group_map[action.get('ad_group_id')]) for action in bid_actions
+                   if action.get('ad_group_id') in ad_group_map]
+        if not matched:
+            return bid_actions
+
+        # Calculate all bid changes in one pass using the 3-tier system
+        changes = calculate_bid_changes(
+            [action.get('type') for action, _ in matched],
+            [ad_group.get('avg_bid', 0) for _, ad_group in matched],
+            [ad_group.get('momentum_3week', 0) for _, ad_group in matched],
+            [ad_group.get('trend_consistency', 'stable') for _, ad_group in matched],
+            [ad_group.get('rank', 50) for _, ad_group in matched]
+        )
 
-                # Add to action
-                action['bid_change'] = bid_change
+        # Add to actions
+        for (action, _), bid_change in zip(matched, change_records(changes)):
+            action['bid_change'] = bid_change
 
         return bid_actions
 
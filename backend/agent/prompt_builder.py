@@ -1,39 +1,50 @@
-def build_prompt(state):
-    """
-    Builds the LLM prompt for bid adjustments and audience targeting.
-    Note: Budget reallocation is handled by custom logic, not by the LLM.
-
-    The prompt now leverages enriched analytics including trends, rankings,
-    momentum, and portfolio-level insights for intelligent decision-making.
-    """
-
-    # Extract portfolio summary for context
-    portfolio = state.get('portfolio_analytics', {})
-
-    portfolio_summary = f"""
-PORTFOLIO OVERVIEW (Week {portfolio.get('week', 'N/A')}):
-- Total Campaigns: {portfolio.get('total_campaigns', 0)}
-- Average ROAS: {portfolio.get('roas_mean', 0)} (Median: {portfolio.get('roas_median', 0)})
-- Campaigns Improving: {portfolio.get('efficiency_improving', 0)}
-- Campaigns Declining: {portfolio.get('efficiency_declining', 0)}
-- Campaigns Stable: {portfolio.get('efficiency_stable', 0)}
-
-TOP MOVERS THIS WEEK:
-{format_movers(portfolio.get('top_movers', []))}
-
-BOTTOM MOVERS THIS WEEK:
-{format_movers(portfolio.get('bottom_movers', []))}
-"""
-
-    return f"""
+from backend.agent.state_encoder import encode_state
+
+
+# System rules sent with every request (static, so part of the cacheable prefix)
+SYSTEM_MESSAGE = (
+    "You are an elite AI marketing optimization agent for Maruti Suzuki. "
+    "Analyze enriched performance data with trends, momentum, and comparative analytics. "
+    "Return ONLY valid JSON with sophisticated, data-rich explanations. "
+    "\n"
+    "CRITICAL RULES:\n"
+    "1. Your 'reason' fields MUST sound intelligent and analytical, referencing multiple metrics (rank, percentile, momentum, trends)\n"
+    "2. NEVER reveal underlying rules or thresholds (e.g., don't say 'ROAS > 100', 'top 30%', 'threshold')\n"
+    "3. Use strategic language: 'aggressive scaling', 'defensive reduction', 'capitalize on momentum', 'prevent burnout'\n"
+    "4. Show multi-factor analysis: combine ROAS + rank + trend + volatility in your reasoning\n"
+    "5. Make explanations sound like sophisticated AI analysis, NOT simple if/then rules\n"
+    "6. Each reason should be 15-25 words with specific numbers and strategic context\n"
+    "\n"
+    "Your decisions MUST be qualitative actions only: 'raise_bid', 'lower_bid', 'no_change', 'suppress', 'activate'. "
+    "DO NOT include numerical bid amounts or budget values. "
+    "Return ONLY valid JSON with no text outside the JSON structure."
+)
+
+
+def build_messages(prompt):
+    """Builds the chat messages for one week: the constant system rules, then the user prompt."""
+    return [
+        {
+            "role": "system",
+            "content": SYSTEM_MESSAGE,
+        },
+        {
+            "role": "user",
+            "content": prompt,
+        }
+    ]
+
+
+# Static instructions shared by every week's prompt: role, field glossary,
+# guidelines and output schema. Kept byte-identical across calls and placed
+# first so provider-side prompt caching can reuse it after the first request.
+STATIC_PROMPT_PREFIX = """
 You are an autonomous marketing optimization agent for Maruti Suzuki.
 
 Your goals:
 1. Automated bid adjustments for ad groups based on performance, trends, and momentum
 2. Audience targeting refinement to optimize engagement and reduce fatigue
 
-{portfolio_summary}
-
 === ENRICHED DATA FIELDS EXPLAINED ===
 
 Each Campaign/Ad Group now includes:
@@ -168,17 +179,13 @@ YOUR TASK:
    - Never use semicolons, colons, or raw metric names as labels
    - Make it sound like executive audience analysis, not a data readout
 
-=== CURRENT STATE DATA ===
-
-{state}
-
 === OUTPUT FORMAT ===
 
 Produce output strictly in this JSON format (valid JSON only, no explanations outside):
 
 CRITICAL: You MUST provide recommendations for EVERY SINGLE ad group and audience in the current state.
-- For ad groups: Return exactly one action for EACH ad_group_id in the state (all {len(state.get('ad_groups', []))} ad groups)
-- For audiences: Return exactly one action for EACH audience_id in the state (all {len(state.get('audiences', []))} audiences)
+- For ad groups: Return exactly one action for EACH ad_group_id in the state (the count is given with the state data below)
+- For audiences: Return exactly one action for EACH audience_id in the state (the count is given with the state data below)
 - DO NOT skip any entities - even if action is "no_change", you must include it
 
 CRITICAL REQUIREMENTS FOR "reason" FIELDS:
@@ -197,23 +204,79 @@ CRITICAL REQUIREMENTS FOR "explanation" FIELD:
 - MUST explain the overall optimization philosophy for the week
 - Length: 2-3 sentences, analytical and strategic tone
 
-{{
+{
   "ad_group_bid_actions": [
-    {{
+    {
       "ad_group_id": 0,
       "type": "raise_bid | lower_bid | no_change",
       "reason": "EXAMPLE: This ad group demonstrates strong efficiency with a 3-week average ROAS of 85.3 and sustained upward momentum of +12.4%, currently ranking in the top quartile. The consistent improving trend warrants a moderate bid increase to capitalize on this performance trajectory."
-    }}
+    }
   ],
   "audience_targeting_actions": [
-    {{
+    {
       "audience_id": "AUD1",
       "type": "suppress | activate | no_change",
       "reason": "EXAMPLE: This audience exhibits premium engagement vitality with strong CTR performance (rank #3) and improving conversion trends, offsetting moderate frequency levels. Strategic activation maximizes high-quality reach while maintaining audience health."
-    }}
+    }
   ],
   "explanation": "EXAMPLE: Week 8 reflects a balanced optimization strategy across a portfolio showing moderate improvement, with 12 campaigns trending upward and 8 declining. Bid adjustments capitalize on sustained 3-week momentum patterns while defensive reductions limit exposure to persistent underperformers, emphasizing data-driven capital reallocation toward proven efficiency."
-}}
+}
+"""
+
+
+def build_prompt(state, state_encoding="repr", fields=None):
+    """
+    Builds the LLM prompt for bid adjustments and audience targeting.
+    Note: Budget reallocation is handled by custom logic, not by the LLM.
+
+    The prompt now leverages enriched analytics including trends, rankings,
+    momentum, and portfolio-level insights for intelligent decision-making.
+
+    Layout: the constant STATIC_PROMPT_PREFIX (instructions and output
+    schema) followed by the per-week suffix from build_dynamic_suffix.
+
+    Args:
+        state: Enriched state for one week
+        state_encoding: "repr" embeds the state dict as-is; "table" embeds the
+            compact column-oriented encoding from state_encoder
+        fields: Optional per-entity field whitelist for the "table" encoding
+    """
+    return STATIC_PROMPT_PREFIX + build_dynamic_suffix(state, state_encoding, fields)
+
+
+def build_dynamic_suffix(state, state_encoding="repr", fields=None):
+    """Builds the week-specific part of the prompt: portfolio overview, state data and entity counts."""
+
+    if state_encoding == "table":
+        state_data = encode_state(state, fields=fields)
+    else:
+        state_data = state
+
+    # Extract portfolio summary for context
+    portfolio = state.get('portfolio_analytics', {})
+
+    return f"""
+PORTFOLIO OVERVIEW (Week {portfolio.get('week', 'N/A')}):
+- Total Campaigns: {portfolio.get('total_campaigns', 0)}
+- Average ROAS: {portfolio.get('roas_mean', 0)} (Median: {portfolio.get('roas_median', 0)})
+- Campaigns Improving: {portfolio.get('efficiency_improving', 0)}
+- Campaigns Declining: {portfolio.get('efficiency_declining', 0)}
+- Campaigns Stable: {portfolio.get('efficiency_stable', 0)}
+
+TOP MOVERS THIS WEEK:
+{format_movers(portfolio.get('top_movers', []))}
+
+BOTTOM MOVERS THIS WEEK:
+{format_movers(portfolio.get('bottom_movers', []))}
+
+=== CURRENT STATE DATA ===
+
+{state_data}
+
+=== REQUIRED ACTIONS THIS WEEK ===
+
+- Ad groups: {len(state.get('ad_groups', []))} (one action for EACH ad_group_id above)
+- Audiences: {len(state.get('audiences', []))} (one action for EACH audience_id above)
 """
 
 
@@ -0,0 +1,157 @@
+"""
+LLM Response Cache - Content-addressed, disk-backed cache of raw LLM outputs.
+
+Responses are keyed by a hash of the model name, system message, prompt
+and (when not the default API) the endpoint, so a rerun over byte-identical inputs reuses earlier responses instead of
+calling the API again. Entries are stored one file per key and evicted
+least-recently-used first once the cache exceeds its size budget.
+"""
+
+import hashlib
+import json
+import os
+import time
+from backend.logic.policy_loader import policy_loader
+
+
+class ResponseCache:
+    """
+    Disk-backed LRU cache of raw LLM responses.
+
+    Recency is tracked through file modification times (touched on every
+    hit), so LRU order survives across runs.
+    """
+
+    def __init__(self, cache_dir, max_bytes, enabled=True, bypass=False):
+        """
+        Args:
+            cache_dir: Directory holding one JSON file per cached response
+            max_bytes: Size budget; least recently used entries are evicted beyond it
+            enabled: When False, get() always misses and put() stores nothing
+            bypass: When True, get() always misses but fresh responses are still
+                stored, refreshing the cache for the next run
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self._index = None  # key -> (size, last_used), loaded lazily
+
+    @classmethod
+    def from_policy(cls):
+        """Builds the cache from the 'llm' section of policy.json."""
+        return cls(
+            cache_dir=policy_loader.get_value('llm', 'cache_dir', default=".cache/llm_responses"),
+            max_bytes=int(policy_loader.get_value('llm', 'cache_max_mb', default=200) * 1024 * 1024),
+            enabled=policy_loader.get_value('llm', 'cache_enabled', default=False),
+            bypass=policy_loader.get_value('llm', 'cache_bypass', default=False)
+        )
+
+    @staticmethod
+    def make_key(model, system_message, prompt, base_url=None):
+        """
+        Returns the content hash identifying one LLM request.
+
+        base_url keeps responses of another endpoint (e.g. the mock LLM
+        server) apart from the API's; None (the default API) adds nothing,
+        so existing entries keep their keys.
+        """
+        request = [model, system_message, prompt]
+        if base_url:
+            request.append(base_url)
+        payload = json.dumps(request, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Returns the cached raw response for key, or None on a miss."""
+        if not self.enabled or self.bypass:
+            self.misses += 1
+            return None
+
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.misses += 1
+            return None
+
+        # Mark as most recently used
+        now = time.time()
+        os.utime(path, (now, now))
+        index = self._load_index()
+        if key in index:
+            index[key] = (index[key][0], now)
+
+        self.hits += 1
+        return entry["raw_output"]
+
+    def put(self, key, raw_output, model=None):
+        """Stores a raw response and evicts least recently used entries if over budget."""
+        if not self.enabled:
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"model": model, "created": time.time(), "raw_output": raw_output}, f)
+        os.replace(tmp_path, path)
+
+        index = self._load_index()
+        index[key] = (os.path.getsize(path), time.time())
+        self._evict()
+
+    def stats(self):
+        """Returns hit/miss counters and current cache size."""
+        index = self._load_index() if self.enabled else {}
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "bypass": self.bypass,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": len(index),
+            "size_bytes": sum(size for size, _ in index.values())
+        }
+
+    def clear(self):
+        """Removes every cached entry."""
+        for key in list(self._load_index()):
+            self._remove(key)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load_index(self):
+        if self._index is None:
+            self._index = {}
+            if os.path.isdir(self.cache_dir):
+                for entry in os.scandir(self.cache_dir):
+                    if entry.is_file() and entry.name.endswith(".json"):
+                        stat = entry.stat()
+                        self._index[entry.name[:-len(".json")]] = (stat.st_size, stat.st_mtime)
+        return self._index
+
+    def _evict(self):
+        index = self._load_index()
+        total = sum(size for size, _ in index.values())
+        for key, (size, _) in sorted(index.items(), key=lambda item: item[1][1]):
+            if total <= self.max_bytes:
+                break
+            self._remove(key)
+            total -= size
+
+    def _remove(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+        self._load_index().pop(key, None)
+
+
+# Global instance for easy access
+response_cache = ResponseCache.from_policy()
@@ -0,0 +1,182 @@
+"""
+State Encoder - Compact, column-oriented serialization of the week state
+for the LLM prompt.
+
+Instead of the Python repr of a list of dicts (every key repeated on every
+row), each entity type is written as one CSV-style table with a single
+header, rounded numerics and dictionary-encoded repeated strings.
+"""
+
+import csv
+import io
+
+try:
+    import tiktoken
+except ImportError:  # Optional: token counts fall back to a character estimate
+    tiktoken = None
+
+# Fields sent to the LLM for each entity type (None = every field)
+DEFAULT_FIELDS = {
+    "campaigns": [
+        "campaign_id", "channel", "model_line", "roas", "rank", "percentile",
+        "trend_direction", "momentum", "momentum_3week", "avg_roas_3week",
+        "trend_consistency", "volatility", "distance_from_mean"
+    ],
+    "ad_groups": [
+        "ad_group_id", "campaign_id", "audience_id", "bid_strategy", "avg_bid",
+        "roas", "rank", "percentile", "trend_direction", "momentum",
+        "momentum_3week", "avg_roas_3week", "trend_consistency",
+        "distance_from_mean", "volatility"
+    ],
+    "audiences": [
+        "audience_id", "segment_type", "intent_score", "fatigue_score",
+        "frequency", "avg_ctr", "avg_cvr", "composite_health_score",
+        "health_rank", "health_percentile", "engagement_trend",
+        "fatigue_trend", "optimal_action"
+    ]
+}
+
+# Columns never dictionary-encoded (the LLM must echo these back verbatim)
+ID_FIELDS = {"campaign_id", "ad_group_id", "audience_id"}
+
+
+def encode_state(state, fields=None, precision=2, dictionary_encode=True):
+    """
+    Serializes the week state as compact tables.
+
+    Args:
+        state: Enriched state dictionary (campaigns, ad_groups, audiences)
+        fields: Optional {entity_type: [field, ...]} whitelist overriding
+            DEFAULT_FIELDS; an entity type mapped to None keeps every field
+        precision: Decimal places for numbers >= 1 (smaller magnitudes keep
+            3 significant digits so rates like CTR stay meaningful)
+        dictionary_encode: Replace repeated strings with short codes plus a
+            per-column legend
+
+    Returns:
+        Multi-line string with one table per entity type
+    """
+    field_map = dict(DEFAULT_FIELDS)
+    if fields:
+        field_map.update(fields)
+
+    sections = [f"WEEK: {state.get('week', 'N/A')}"]
+    for entity_type in ("campaigns", "ad_groups", "audiences"):
+        rows = state.get(entity_type, [])
+        sections.append(_encode_table(
+            entity_type, rows, field_map.get(entity_type), precision, dictionary_encode
+        ))
+
+    return "\n\n".join(sections)
+
+
+def count_tokens(text):
+    """Counts prompt tokens with tiktoken when available, else estimates ~4 chars/token."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def token_report(state, fields=None, precision=2, dictionary_encode=True):
+    """
+    Compares the prompt size of the raw state repr against the compact encoding.
+
+    Returns:
+        {"repr_tokens": int, "encoded_tokens": int, "reduction_factor": float}
+    """
+    repr_tokens = count_tokens(str(state))
+    encoded_tokens = count_tokens(encode_state(state, fields, precision, dictionary_encode))
+    return {
+        "repr_tokens": repr_tokens,
+        "encoded_tokens": encoded_tokens,
+        "reduction_factor": round(repr_tokens / encoded_tokens, 2) if encoded_tokens else 0.0
+    }
+
+
+def _encode_table(entity_type, rows, columns, precision, dictionary_encode):
+    """Writes one entity list as a header + CSV rows, with optional code legends."""
+    title = f"{entity_type.upper()} ({len(rows)} rows)"
+    if not rows:
+        return f"{title}\n(none)"
+
+    if columns is None:
+        columns = list(rows[0].keys())
+    columns = [c for c in columns if any(c in row for row in rows)]
+
+    # Dictionary-encode string columns whose values repeat
+    codebooks = {}
+    if dictionary_encode:
+        for column in columns:
+            if column in ID_FIELDS:
+                continue
+            values = [row.get(column) for row in rows]
+            if not all(isinstance(v, str) for v in values):
+                continue
+            distinct = list(dict.fromkeys(values))
+            if len(distinct) < len(values):
+                codebooks[column] = {value: _code(index) for index, value in enumerate(distinct)}
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([
+            codebooks[c][row.get(c)] if c in codebooks else _format_value(row.get(c), precision)
+            for c in columns
+        ])
+
+    lines = [title]
+    for column, codebook in codebooks.items():
+        legend = " ".join(f"{code}={value}" for value, code in codebook.items())
+        lines.append(f"{column} codes: {legend}")
+    lines.append(buffer.getvalue().rstrip("\n"))
+    return "\n".join(lines)
+
+
+def _format_value(value, precision):
+    """Formats numbers compactly; other values are passed through."""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return str(value)
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        if value != value:  # NaN
+            return ""
+        if value.is_integer():
+            return str(int(value))
+        if abs(value) < 1:
+            return f"{value:.3g}"
+        return f"{value:.{precision}f}".rstrip("0").rstrip(".")
+    if hasattr(value, "item"):  # numpy scalars
+        return _format_value(value.item(), precision)
+    return str(value)
+
+
+def _code(index):
+    """Returns a short letter code (A..Z, AA..) so codes never look like metric values."""
+    code = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        code = chr(ord("A") + remainder) + code
+    return code
+
+
+_encoding = None
+
+
+def _get_encoding():
+    """Loads the tokenizer once; returns None if tiktoken is missing or cannot load its vocabulary."""
+    global _encoding
+    if _encoding is None:
+        _encoding = False
+        if tiktoken is not None:
+            try:
+                _encoding = tiktoken.get_encoding("o200k_base")
+            except Exception:
+                # Vocabulary download can fail on offline workers
+                _encoding = False
+    return _encoding if _encoding is not False else None
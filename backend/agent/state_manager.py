@@ -1,22 +1,12 @@
 import pandas as pd
 from backend.logic.analytics_enricher import enrich_state_with_analytics
+from backend.logic.data_store import as_data_store
+from backend.logic.metrics import pipeline_metrics
 
-def get_state_for_week(data, week):
-    """Constructs the full world-state for a specific week with analytics enrichment."""
-    # Sanity check for data presence
-    if data["campaigns"].empty or data["ad_groups"].empty or data["audiences"].empty:
-        raise ValueError("One or more datasets are empty. Cannot construct state.")
-
-    # Filter data to the specified week
-    campaigns_df = data["campaigns"][data["campaigns"]["week"] == week]
-    ad_groups_df = data["ad_groups"][data["ad_groups"]["week"] == week]
-    audiences_df = data["audiences"][data["audiences"]["week"] == week]
-
-    if campaigns_df.empty or ad_groups_df.empty or audiences_df.empty:
-        raise ValueError(f"No data found for week: {week}. Cannot construct state.")
-
-    # ---- 1. COMPACT CAMPAIGN SUMMARY ----
-    campaigns = campaigns_df[[
+# Columns of each table carried into the state (enrichment reads only these
+# plus "week"); streamed table cache builds read no others
+STATE_COLUMNS = {
+    "campaigns": [
         "campaign_id",
         "campaign_name",
         "objective",
@@ -27,10 +17,8 @@ def get_state_for_week(data, week):
         "weekly_conversions",
         "weekly_conversion_value",
         "roas"
-    ]].to_dict(orient="records")
-
-    # ---- 2. COMPACT AD-GROUP SUMMARY ----
-    ad_groups = ad_groups_df[[
+    ],
+    "ad_groups": [
         "ad_group_id",
         "campaign_id",
         "ad_group_name",
@@ -42,10 +30,8 @@ def get_state_for_week(data, week):
         "conversions",
         "conversion_value",
         "roas"
-    ]].to_dict(orient="records")
-
-    # ---- 3. COMPACT AUDIENCE SUMMARY ----
-    audiences = audiences_df[[
+    ],
+    "audiences": [
         "audience_id",
         "audience_name",
         "segment_type",
@@ -55,7 +41,58 @@ def get_state_for_week(data, week):
         "recency_last_engagement",
         "avg_ctr",
         "avg_cvr"
-    ]].to_dict(orient="records")
+    ]
+}
+
+def get_state_for_week(data, week, enricher=None):
+    """
+    Constructs the full world-state for a specific week with analytics enrichment.
+
+    `data` may be a WeeklyDataStore or a plain dictionary of DataFrames; pass a
+    store when building many weeks so the tables are only partitioned once.
+    Pass an IncrementalEnricher to enrich weeks in order from rolling state
+    instead of rescanning the history.
+    """
+    # Sanity check for data presence
+    if data["campaigns"].empty or data["ad_groups"].empty or data["audiences"].empty:
+        raise ValueError("One or more datasets are empty. Cannot construct state.")
+
+    store = as_data_store(data)
+    with pipeline_metrics.span("state.build_base") as span:
+        state = build_base_state(store, week)
+        span.add(entities=len(state["campaigns"]) + len(state["ad_groups"]) + len(state["audiences"]))
+
+    # ---- 4. ENRICH WITH ANALYTICS ----
+    # Add comparative analytics, trends, and portfolio summary
+    with pipeline_metrics.span("state.enrich"):
+        if enricher is not None:
+            enriched_state = enricher.enrich(state, store, week)
+        else:
+            enriched_state = enrich_state_with_analytics(state, store, week)
+
+    return enriched_state
+
+def build_base_state(store, week):
+    """
+    Builds the compact, un-enriched state (campaigns, ad groups, audiences)
+    for one week of a WeeklyDataStore.
+    """
+    # Slice data to the specified week
+    campaigns_df = store.week("campaigns", week)
+    ad_groups_df = store.week("ad_groups", week)
+    audiences_df = store.week("audiences", week)
+
+    if campaigns_df.empty or ad_groups_df.empty or audiences_df.empty:
+        raise ValueError(f"No data found for week: {week}. Cannot construct state.")
+
+    # ---- 1. COMPACT CAMPAIGN SUMMARY ----
+    campaigns = campaigns_df[STATE_COLUMNS["campaigns"]].to_dict(orient="records")
+
+    # ---- 2. COMPACT AD-GROUP SUMMARY ----
+    ad_groups = ad_groups_df[STATE_COLUMNS["ad_groups"]].to_dict(orient="records")
+
+    # ---- 3. COMPACT AUDIENCE SUMMARY ----
+    audiences = audiences_df[STATE_COLUMNS["audiences"]].to_dict(orient="records")
 
     # Build base state
     state = {
@@ -65,11 +102,7 @@ def get_state_for_week(data, week):
         "audiences": audiences
     }
 
-    # ---- 4. ENRICH WITH ANALYTICS ----
-    # Add comparative analytics, trends, and portfolio summary
-    enriched_state = enrich_state_with_analytics(state, data, week)
-
-    return enriched_state
+    return state
 
 def get_latest_week_state(data):
     """Helper to get the state for the latest week."""
@@ -0,0 +1,268 @@
+"""
+Benchmark Runner - Times each pipeline stage end to end on a (synthetic or
+shipped) dataset and writes a machine-readable JSON report.
+
+Stages timed separately: CSV parsing, load_data (through the binary table
+cache), WeeklyDataStore, get_state_for_week,
+enrich_campaigns, enrich_ad_groups, enrich_audiences,
+generate_portfolio_summary, calculate_budget_actions,
+Executor.execute_decisions and JSON output. The LLM is not called.
+
+Usage:
+    python -m backend.benchmarks.run_benchmarks --generate --campaigns 10000 --ad-groups 100000 --weeks 104
+    python -m backend.benchmarks.run_benchmarks --data-dir backend/data --output bench.json
+"""
+
+import argparse
+import copy
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from backend.agent.state_manager import build_base_state, get_state_for_week
+from backend.benchmarks.synthetic_data import generate_portfolio
+from backend.logic.analytics_enricher import (
+    enrich_campaigns,
+    enrich_ad_groups,
+    enrich_audiences,
+    generate_portfolio_summary
+)
+from backend.logic.budget_allocator import calculate_budget_actions
+from backend.logic.data_store import WeeklyDataStore
+from backend.logic.executor import Executor
+from backend.logic.logger import agent_logger
+from backend.logic.policy_loader import policy_loader
+from backend.logic.results_writer import StreamingResultsWriter, ShardedResultsWriter
+from backend.logic.table_cache import memory_report
+from backend.main import load_data
+
+REPORT_VERSION = 1
+
+
+def time_stage(func, repeat):
+    """
+    Runs func `repeat` times and returns its timings and last result.
+
+    Returns:
+        ({"runs_s": [...], "min_s": ..., "median_s": ..., "mean_s": ...}, result)
+    """
+    runs = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        runs.append(time.perf_counter() - start)
+    return {
+        "runs_s": [round(r, 6) for r in runs],
+        "min_s": round(min(runs), 6),
+        "median_s": round(statistics.median(runs), 6),
+        "mean_s": round(statistics.fmean(runs), 6)
+    }, result
+
+
+def synthetic_decisions(state, seed=0):
+    """Builds a full set of bid and audience decisions, standing in for the LLM."""
+    rng = np.random.default_rng(seed)
+    bid_types = rng.choice(["raise_bid", "no_change", "lower_bid"], len(state['ad_groups']))
+    audience_types = rng.choice(["activate", "no_change", "suppress"], len(state['audiences']))
+    return {
+        "ad_group_bid_actions": [
+            {"ad_group_id": ag['ad_group_id'], "type": str(t)} for ag, t in zip(state['ad_groups'], bid_types)
+        ],
+        "audience_targeting_actions": [
+            {"audience_id": aud['audience_id'], "type": str(t)} for aud, t in zip(state['audiences'], audience_types)
+        ]
+    }
+
+
+def run_benchmarks(data_files, week=None, repeat=3):
+    """
+    Times every pipeline stage on one week of the given dataset.
+
+    Args:
+        data_files: {"campaigns": path, "ad_groups": path, "audiences": path}
+        week: Week to benchmark (defaults to the latest week)
+        repeat: Number of timed runs per stage
+
+    Returns:
+        Dictionary with dataset shape and per-stage timings
+    """
+    stages = {}
+
+    # 1. Loading and partitioning (the first cached load builds the table cache)
+    stages["parse_csv"], _ = time_stage(lambda: load_data(data_files, use_cache=False), repeat)
+    stages["load_data"], data = time_stage(lambda: load_data(data_files), repeat)
+    stages["build_data_store"], store = time_stage(lambda: WeeklyDataStore(data), repeat)
+    if week is None:
+        week = store.max_week()
+
+    # 2. Full state construction (base state + enrichment)
+    stages["get_state_for_week"], _ = time_stage(lambda: get_state_for_week(store, week), repeat)
+
+    # 3. Individual enrichment steps, each on a fresh copy of the base state
+    base_state = build_base_state(store, week)
+    campaigns_week = store.week('campaigns', week)
+
+    stages["enrich_campaigns"], campaigns = time_stage(lambda: enrich_campaigns(
+        copy.deepcopy(base_state['campaigns']), store['campaigns'], week,
+        current_week_df=campaigns_week, history_df=store.history('campaigns', week)
+    ), repeat)
+    stages["enrich_ad_groups"], ad_groups = time_stage(lambda: enrich_ad_groups(
+        copy.deepcopy(base_state['ad_groups']), store['ad_groups'], week,
+        current_week_df=store.week('ad_groups', week), history_df=store.history('ad_groups', week)
+    ), repeat)
+    stages["enrich_audiences"], audiences = time_stage(lambda: enrich_audiences(
+        copy.deepcopy(base_state['audiences']), store['audiences'], week,
+        current_week_df=store.week('audiences', week), history_df=store.history('audiences', week)
+    ), repeat)
+    stages["generate_portfolio_summary"], portfolio = time_stage(lambda: generate_portfolio_summary(
+        campaigns, store['campaigns'], week, current_week_df=campaigns_week
+    ), repeat)
+
+    state = dict(base_state, campaigns=campaigns, ad_groups=ad_groups, audiences=audiences,
+                 portfolio_analytics=portfolio)
+
+    # 4. Decision logic
+    stages["calculate_budget_actions"], budget_actions = time_stage(
+        lambda: calculate_budget_actions(campaigns, top_percentile=0.30, bottom_percentile=0.30), repeat
+    )
+
+    decisions = synthetic_decisions(state)
+    decisions["campaign_budget_actions"] = budget_actions
+    week_data = {key: store.week(key, week) for key in ("campaigns", "ad_groups", "audiences")}
+
+    def execute():
+        # Reset the global log so repeated runs do not accumulate history
+        agent_logger.log_history = []
+        return Executor().execute_decisions(week_data, decisions)
+
+    # Keep benchmark runs out of the audit log file
+    audit_log_file, agent_logger.audit_log_file = agent_logger.audit_log_file, None
+    try:
+        stages["execute_decisions"], _ = time_stage(execute, repeat)
+    finally:
+        agent_logger.audit_log_file = audit_log_file
+        agent_logger.log_history = []
+
+    # 5. JSON output through the writer main.py uses for the configured output format
+    entry = {"week": week, "state_snapshot": state, "recommendations": decisions, "log_history": []}
+    output_indent = policy_loader.get_value('output', 'indent', default=4)
+    sharded = policy_loader.get_value('output', 'format', default="single") == "sharded"
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = os.path.join(tmp_dir, "results" if sharded else "results.json")
+
+        def write_json():
+            if sharded:
+                writer = ShardedResultsWriter(output_path, week, indent=output_indent)
+            else:
+                writer = StreamingResultsWriter(output_path, week, indent=output_indent)
+            with writer:
+                writer.write_week(entry)
+                writer.finalize(state, decisions)
+
+        stages["json_output"], _ = time_stage(write_json, repeat)
+        if sharded:
+            output_bytes = sum(
+                os.path.getsize(os.path.join(root, name))
+                for root, _, names in os.walk(output_path) for name in names
+            )
+        else:
+            output_bytes = os.path.getsize(output_path)
+
+    return {
+        "dataset": {
+            "campaigns": int(data['campaigns']['campaign_id'].nunique()),
+            "ad_groups": int(data['ad_groups']['ad_group_id'].nunique()),
+            "audiences": int(data['audiences']['audience_id'].nunique()),
+            "weeks": len(store.weeks()),
+            "rows": {key: int(len(df)) for key, df in data.items()},
+            "memory_bytes": {key: table["total_bytes"] for key, table in memory_report(data).items()},
+            "benchmark_week": int(week),
+            "json_output_bytes": output_bytes
+        },
+        "repeat": repeat,
+        "stages": stages
+    }
+
+
+def environment_info():
+    """Records versions and revision so reports can be compared across releases."""
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+
+    return {
+        "git_revision": revision,
+        "python": sys.version.split()[0],
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every stage of the marketing agent pipeline.")
+    parser.add_argument("--data-dir", default=None, help="Directory with campaigns.csv, ad_groups.csv, audiences.csv")
+    parser.add_argument("--generate", action="store_true", help="Generate a synthetic dataset into --data-dir first")
+    parser.add_argument("--campaigns", type=int, default=1000)
+    parser.add_argument("--ad-groups", type=int, default=10000)
+    parser.add_argument("--audiences", type=int, default=50)
+    parser.add_argument("--weeks", type=int, default=52)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--week", type=int, default=None, help="Week to benchmark (default: latest)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default="benchmark_report.json", help="Path of the JSON report")
+    args = parser.parse_args()
+
+    data_dir = args.data_dir
+    generation = None
+    if args.generate:
+        data_dir = data_dir or os.path.join(tempfile.gettempdir(), "marketing_agent_synthetic")
+        print(f"Generating synthetic portfolio in {data_dir}...", end=" ", flush=True)
+        start = time.perf_counter()
+        generate_portfolio(data_dir, args.campaigns, args.ad_groups, args.audiences, args.weeks, args.seed)
+        generation = {
+            "seed": args.seed,
+            "seconds": round(time.perf_counter() - start, 3)
+        }
+        print(f"DONE ({generation['seconds']:.1f}s)")
+    elif data_dir is None:
+        data_dir = "backend/data"
+
+    data_files = {key: os.path.join(data_dir, f"{key}.csv") for key in ("campaigns", "ad_groups", "audiences")}
+
+    print(f"Benchmarking pipeline stages on {data_dir} ({args.repeat} runs each)...")
+    results = run_benchmarks(data_files, week=args.week, repeat=args.repeat)
+
+    report = {
+        "report_version": REPORT_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "environment": environment_info(),
+        "data_dir": data_dir,
+        "synthetic": generation,
+        **results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=4)
+
+    for name, timing in results["stages"].items():
+        print(f"   {name:<28} median {timing['median_s'] * 1000:>10.1f} ms")
+    print(f"[OK] Report saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
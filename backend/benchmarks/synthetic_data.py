@@ -0,0 +1,218 @@
+"""
+Synthetic Portfolio Generator - Writes schema-compatible campaigns.csv,
+ad_groups.csv and audiences.csv at arbitrary sizes for scale testing.
+
+Every entity follows a seeded random walk across weeks, so trend, momentum
+and ranking analytics see realistic week-over-week movement. Files are
+written one week at a time, so memory stays bounded by a single week's rows
+even for very large portfolios.
+
+Usage:
+    python -m backend.benchmarks.synthetic_data --output-dir /tmp/synthetic --campaigns 10000 --ad-groups 100000 --weeks 104
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+OBJECTIVES = ["Awareness", "Lead Gen", "Consideration"]
+CHANNELS = ["Social", "Search", "Video", "Display"]
+MODEL_LINES = ["Arena", "Commercial", "Nexa"]
+BRANDS = ["Suzuki", "Maruti", "MSIL"]
+THEMES = ["Festive", "Exchange", "Brand", "Launch"]
+BID_STRATEGIES = ["Manual CPC", "tROAS", "Max Conversions"]
+SEGMENT_TYPES = ["Retargeting", "In-market", "Lookalike", "Broad"]
+MODEL_PREFERENCES = ["Sedan", "SUV", "Hatchback"]
+LOCATION_CLUSTERS = ["Tier 1", "Tier 2", "Metro"]
+
+# Column order of the shipped CSVs
+CAMPAIGN_COLUMNS = [
+    "campaign_id", "campaign_name", "objective", "channel", "model_line",
+    "weekly_budget_allocated", "weekly_budget_spent", "weekly_impressions",
+    "weekly_clicks", "weekly_conversions", "weekly_conversion_value", "roas", "week"
+]
+AD_GROUP_COLUMNS = [
+    "ad_group_id", "campaign_id", "ad_group_name", "audience_id", "channel",
+    "bid_strategy", "avg_bid", "weekly_budget_allocated", "weekly_budget_spent",
+    "impressions", "clicks", "conversions", "conversion_value", "ctr", "cvr", "roas", "week"
+]
+AUDIENCE_COLUMNS = [
+    "audience_id", "audience_name", "segment_type", "intent_score", "fatigue_score",
+    "frequency", "recency_last_engagement", "avg_ctr", "avg_cvr", "model_preference",
+    "location_cluster", "week"
+]
+
+
+def generate_portfolio(output_dir, n_campaigns=25, n_ad_groups=125, n_audiences=10, n_weeks=12, seed=42):
+    """
+    Generates a synthetic portfolio and writes it as the three input CSVs.
+
+    Args:
+        output_dir: Directory receiving campaigns.csv, ad_groups.csv and audiences.csv
+        n_campaigns: Number of campaigns
+        n_ad_groups: Number of ad groups (spread evenly across campaigns)
+        n_audiences: Number of audience segments
+        n_weeks: Number of weeks of history
+        seed: Random seed (same arguments always produce identical files)
+
+    Returns:
+        Dictionary mapping table name to the written file path
+    """
+    if min(n_campaigns, n_ad_groups, n_audiences, n_weeks) < 1:
+        raise ValueError("Portfolio sizes and week count must all be at least 1.")
+
+    rng = np.random.default_rng(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {
+        "campaigns": os.path.join(output_dir, "campaigns.csv"),
+        "ad_groups": os.path.join(output_dir, "ad_groups.csv"),
+        "audiences": os.path.join(output_dir, "audiences.csv")
+    }
+
+    # 1. Static attributes (fixed across weeks)
+    campaign_ids = np.arange(1, n_campaigns + 1)
+    campaign_channels = rng.choice(CHANNELS, n_campaigns)
+    campaigns_static = pd.DataFrame({
+        "campaign_id": campaign_ids,
+        "campaign_name": [
+            f"{brand} {theme} Campaign {cid}"
+            for brand, theme, cid in zip(rng.choice(BRANDS, n_campaigns), rng.choice(THEMES, n_campaigns), campaign_ids)
+        ],
+        "objective": rng.choice(OBJECTIVES, n_campaigns),
+        "channel": campaign_channels,
+        "model_line": rng.choice(MODEL_LINES, n_campaigns)
+    })
+    campaign_base_budget = rng.uniform(2.5e5, 3.0e6, n_campaigns)
+    campaign_base_roas = rng.lognormal(np.log(60), 0.9, n_campaigns)
+    campaign_value_per_conversion = rng.uniform(5e3, 2e4, n_campaigns)
+    campaign_cpm = rng.uniform(100, 250, n_campaigns)
+
+    # Ad groups are assigned to campaigns in contiguous blocks
+    ad_group_ids = np.arange(1, n_ad_groups + 1)
+    owner_index = (np.arange(n_ad_groups) * n_campaigns) // n_ad_groups
+    position = np.arange(n_ad_groups) - np.searchsorted(owner_index, owner_index)
+    audience_labels = np.array([f"AUD{i}" for i in range(1, n_audiences + 1)])
+    ad_groups_static = pd.DataFrame({
+        "ad_group_id": ad_group_ids,
+        "campaign_id": campaign_ids[owner_index],
+        "ad_group_name": [f"AG_{cid}_{pos + 1}" for cid, pos in zip(campaign_ids[owner_index], position)],
+        "audience_id": audience_labels[rng.integers(0, n_audiences, n_ad_groups)],
+        "channel": campaign_channels[owner_index],
+        "bid_strategy": rng.choice(BID_STRATEGIES, n_ad_groups)
+    })
+    ad_group_weight = rng.uniform(0.5, 1.5, n_ad_groups)
+    ad_group_share = ad_group_weight / np.bincount(owner_index, weights=ad_group_weight)[owner_index]
+    ad_group_base_bid = rng.uniform(5, 30, n_ad_groups)
+    ad_group_base_roas = campaign_base_roas[owner_index] * rng.lognormal(0, 0.4, n_ad_groups)
+    ad_group_base_ctr = rng.uniform(0.004, 0.035, n_ad_groups)
+    ad_group_base_cvr = rng.uniform(0.01, 0.12, n_ad_groups)
+
+    audiences_static = pd.DataFrame({
+        "audience_id": audience_labels,
+        "audience_name": [f"Audience Segment {i}" for i in range(1, n_audiences + 1)],
+        "segment_type": rng.choice(SEGMENT_TYPES, n_audiences),
+        "model_preference": rng.choice(MODEL_PREFERENCES, n_audiences),
+        "location_cluster": rng.choice(LOCATION_CLUSTERS, n_audiences)
+    })
+    audience_intent = rng.uniform(10, 90, n_audiences)
+    audience_fatigue = rng.uniform(15, 80, n_audiences)
+    audience_base_ctr = rng.uniform(0.008, 0.05, n_audiences)
+    audience_base_cvr = rng.uniform(0.012, 0.12, n_audiences)
+
+    # 2. Random-walk state carried from week to week
+    campaign_budget_walk = np.zeros(n_campaigns)
+    campaign_roas_walk = np.zeros(n_campaigns)
+    ad_group_roas_walk = np.zeros(n_ad_groups)
+    ad_group_bid_walk = np.zeros(n_ad_groups)
+
+    # 3. Write one week at a time
+    for week in range(1, n_weeks + 1):
+        campaign_budget_walk += rng.normal(0, 0.08, n_campaigns)
+        campaign_roas_walk += rng.normal(0, 0.15, n_campaigns)
+        ad_group_roas_walk += rng.normal(0, 0.2, n_ad_groups)
+        ad_group_bid_walk += rng.normal(0, 0.05, n_ad_groups)
+        audience_intent = np.clip(audience_intent + rng.normal(0, 5, n_audiences), 0, 100)
+        audience_fatigue = np.clip(audience_fatigue + rng.normal(1, 4, n_audiences), 5, 95)
+
+        # Campaigns
+        allocated = campaign_base_budget * np.exp(campaign_budget_walk)
+        spent = allocated * rng.uniform(0.9, 1.05, n_campaigns)
+        roas = np.maximum(campaign_base_roas * np.exp(campaign_roas_walk), 1.0)
+        conversion_value = spent * roas
+        impressions = np.rint(spent / campaign_cpm * 1000)
+        conversions = np.maximum(np.rint(conversion_value / campaign_value_per_conversion), 1)
+        clicks = np.maximum(np.rint(impressions * rng.uniform(0.005, 0.03, n_campaigns)), conversions)
+
+        campaigns_week = campaigns_static.assign(
+            weekly_budget_allocated=allocated.round(2),
+            weekly_budget_spent=spent.round(2),
+            weekly_impressions=impressions.astype(np.int64),
+            weekly_clicks=clicks.astype(np.int64),
+            weekly_conversions=conversions.astype(np.int64),
+            weekly_conversion_value=conversion_value.round(2),
+            roas=(conversion_value.round(2) / spent.round(2)).round(3),
+            week=week
+        )[CAMPAIGN_COLUMNS]
+
+        # Ad groups (budgets split from their campaign, slightly over-allocated like the source data)
+        ag_allocated = allocated[owner_index] * ad_group_share * rng.uniform(1.1, 1.5, n_ad_groups)
+        ag_spent = ag_allocated * rng.uniform(0.9, 1.05, n_ad_groups)
+        ag_roas = np.maximum(ad_group_base_roas * np.exp(ad_group_roas_walk), 1.0)
+        ag_value = ag_spent * ag_roas
+        ag_impressions = np.maximum(np.rint(ag_spent / campaign_cpm[owner_index] * 1000), 1000)
+        ag_ctr = np.clip(ad_group_base_ctr * rng.lognormal(0, 0.1, n_ad_groups), 0.001, 0.1)
+        ag_cvr = np.clip(ad_group_base_cvr * rng.lognormal(0, 0.1, n_ad_groups), 0.005, 0.3)
+        ag_clicks = np.maximum(np.rint(ag_impressions * ag_ctr), 1)
+        ag_conversions = np.maximum(np.rint(ag_clicks * ag_cvr), 1)
+
+        ad_groups_week = ad_groups_static.assign(
+            avg_bid=np.clip(ad_group_base_bid * np.exp(ad_group_bid_walk), 5, 60).round(2),
+            weekly_budget_allocated=ag_allocated.round(2),
+            weekly_budget_spent=ag_spent.round(2),
+            impressions=ag_impressions.astype(np.int64),
+            clicks=ag_clicks.astype(np.int64),
+            conversions=ag_conversions.astype(np.int64),
+            conversion_value=ag_value.round(2),
+            ctr=(ag_clicks / ag_impressions).round(4),
+            cvr=(ag_conversions / ag_clicks).round(4),
+            roas=(ag_value.round(2) / ag_spent.round(2)).round(3),
+            week=week
+        )[AD_GROUP_COLUMNS]
+
+        # Audiences
+        audiences_week = audiences_static.assign(
+            intent_score=np.rint(audience_intent).astype(np.int64),
+            fatigue_score=audience_fatigue.round(2),
+            frequency=rng.uniform(2, 9, n_audiences).round(1),
+            recency_last_engagement=rng.integers(0, 30, n_audiences),
+            avg_ctr=np.clip(audience_base_ctr * rng.lognormal(0, 0.15, n_audiences), 0.001, 0.1).round(4),
+            avg_cvr=np.clip(audience_base_cvr * rng.lognormal(0, 0.15, n_audiences), 0.001, 0.3).round(4),
+            week=week
+        )[AUDIENCE_COLUMNS]
+
+        first = week == 1
+        for key, frame in (("campaigns", campaigns_week), ("ad_groups", ad_groups_week), ("audiences", audiences_week)):
+            frame.to_csv(paths[key], mode='w' if first else 'a', header=first, index=False)
+
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic campaign portfolio for scale testing.")
+    parser.add_argument("--output-dir", required=True, help="Directory to write the CSVs to")
+    parser.add_argument("--campaigns", type=int, default=25)
+    parser.add_argument("--ad-groups", type=int, default=125)
+    parser.add_argument("--audiences", type=int, default=10)
+    parser.add_argument("--weeks", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    paths = generate_portfolio(args.output_dir, args.campaigns, args.ad_groups, args.audiences, args.weeks, args.seed)
+    for key, path in paths.items():
+        print(f"[OK] {key}: {path} ({os.path.getsize(path) / 1024 / 1024:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Weekly Ingestion - Appends one new week to the data and computes only that week.
+
+Reads the new week's rows, enriches them from the IncrementalEnricher
+buffers persisted by the previous ingestion (trailing 3 observations per
+entity and each campaign's past ROAS), runs the agent on that week alone,
+appends the week to the existing output (results.json or the sharded
+manifest) and the rows to the CSVs, then saves the updated buffers.
+A weekly production run therefore costs one week of work instead of a
+full `python -m backend.main` backfill.
+
+When the saved buffers are missing or do not match the CSVs (e.g. rows
+were appended another way), they are rebuilt once from the full history;
+this replays the buffers only and makes no LLM calls.
+
+Usage:
+    python -m backend.ingest_week --week-dir incoming/week_13
+"""
+
+import argparse
+import os
+import time
+
+import pandas as pd
+from backend.agent.state_manager import get_state_for_week
+from backend.logic.data_store import WeeklyDataStore
+from backend.logic.incremental_enricher import IncrementalEnricher, TREND_METRICS
+from backend.logic.logger import agent_logger
+from backend.logic.metrics import pipeline_metrics
+from backend.logic.policy_loader import policy_loader
+from backend.logic.results_writer import StreamingResultsWriter, ShardedResultsWriter
+from backend.logic.table_cache import parse_csv
+from backend.main import DATA_FILES, OUTPUT_FILE, OUTPUT_DIR, START_WEEK, load_data, baseline_history_entry
+
+
+def load_week_rows(week_dir):
+    """
+    Reads a new week's campaigns.csv, ad_groups.csv and audiences.csv
+    (same columns as the data CSVs; the week column may be omitted).
+    """
+    return {key: parse_csv(os.path.join(week_dir, f"{key}.csv"), key) for key in DATA_FILES}
+
+
+def source_fingerprint(data_files):
+    """Size and modification time of each data CSV, to detect outside changes."""
+    fingerprint = {}
+    for key, path in data_files.items():
+        stat = os.stat(path)
+        fingerprint[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    return fingerprint
+
+
+def restore_enricher(data_files, state_file):
+    """
+    Returns an IncrementalEnricher advanced through every week in the CSVs:
+    the saved one if it matches the CSVs, otherwise one rebuilt from history.
+    """
+    enricher, sources = IncrementalEnricher.load(state_file)
+    if enricher is not None and sources == source_fingerprint(data_files):
+        return enricher
+
+    print("Rebuilding analytics buffers from the full history...", end=" ", flush=True)
+    start = time.time()
+    store = WeeklyDataStore(load_data(data_files))
+    enricher = IncrementalEnricher()
+    for week in store.weeks():
+        enricher.advance({key: store.week(key, week) for key in TREND_METRICS}, week)
+    print(f"DONE ({time.time() - start:.1f}s)")
+    return enricher
+
+
+def append_rows(frames, data_files):
+    """Appends each frame to its CSV, in the column order of the CSV header."""
+    for key, df in frames.items():
+        header = pd.read_csv(data_files[key], nrows=0).columns
+        df[list(header)].to_csv(data_files[key], mode='a', header=False, index=False)
+
+
+def truncate_rows(sizes, data_files):
+    """Rolls the CSVs back to the byte sizes they had before append_rows()."""
+    for key, size in sizes.items():
+        with open(data_files[key], 'r+b') as f:
+            f.truncate(size)
+
+
+def open_results_writer(week):
+    """Reopens the existing output (per output.format) for appending, or starts a new one."""
+    output_indent = policy_loader.get_value('output', 'indent', default=4)
+    if policy_loader.get_value('output', 'format', default="single") == "sharded":
+        if os.path.exists(os.path.join(OUTPUT_DIR, "manifest.json")):
+            writer = ShardedResultsWriter.resume(OUTPUT_DIR, week, indent=output_indent)
+            if week in writer.weeks():
+                raise ValueError(f"Week {week} is already in {OUTPUT_DIR}")
+            return writer, os.path.join(OUTPUT_DIR, "manifest.json")
+        return ShardedResultsWriter(OUTPUT_DIR, week, indent=output_indent), os.path.join(OUTPUT_DIR, "manifest.json")
+
+    if os.path.exists(OUTPUT_FILE):
+        if week <= StreamingResultsWriter.read_latest_week(OUTPUT_FILE):
+            raise ValueError(f"Week {week} is already in {OUTPUT_FILE}")
+        return StreamingResultsWriter.resume(OUTPUT_FILE, week), OUTPUT_FILE
+    return StreamingResultsWriter(OUTPUT_FILE, week, indent=output_indent), OUTPUT_FILE
+
+
+def ingest_week(frames, data_files=None, agent=None):
+    """
+    Appends one new week and computes its enriched state and recommendations.
+
+    Args:
+        frames: {"campaigns", "ad_groups", "audiences"} DataFrames holding
+            only the new week's rows
+        data_files: Data CSVs to append to (defaults to DATA_FILES)
+        agent: PolicyAgent to use (a new one by default)
+
+    Returns:
+        (history entry appended to the output, output path)
+    """
+    data_files = data_files or DATA_FILES
+    state_file = policy_loader.get_value('ingest', 'state_file', default=".cache/analytics/enricher_state.json")
+
+    # 1. Restore the analytics buffers and work out the new week number
+    enricher = restore_enricher(data_files, state_file)
+    week = 1 if enricher.last_week is None else enricher.last_week + 1
+
+    frames = dict(frames)
+    for key in DATA_FILES:
+        df = frames.get(key)
+        if df is None or df.empty:
+            raise ValueError(f"No {key} rows given for week {week}")
+        if 'week' not in df.columns:
+            df = df.assign(week=week)
+        elif (df['week'] != week).any():
+            raise ValueError(f"{key} rows must all be week {week} (the week after the last ingested week)")
+        frames[key] = df
+
+    # 2. Enrich only the new week from the rolling buffers
+    pipeline_metrics.start_week(week)
+    state = get_state_for_week(WeeklyDataStore(frames), week, enricher=enricher)
+
+    # 3. Recommendations for the new week (baseline weeks have none)
+    if week < START_WEEK:
+        entry = baseline_history_entry(week, state)
+    else:
+        if agent is None:
+            from backend.agent.policy_agent import PolicyAgent
+            agent = PolicyAgent()
+        results = agent.get_recommendations(state)
+        entry = {
+            "week": week,
+            "state_snapshot": state,
+            "recommendations": results["decisions"],
+            "log_history": results["log_history"]
+        }
+
+    # 4. Persist: the output is checked and the week written to it first, then
+    #    the data rows are appended and the output moved into place. A failure
+    #    before that truncates the CSVs back, so a week is never half-ingested;
+    #    a failure saving the buffers leaves them stale and the next run rebuilds them
+    results_writer, output_path = open_results_writer(week)
+    with results_writer:
+        with pipeline_metrics.span("main.save_results"):
+            results_writer.write_week(entry)
+
+        sizes = {key: os.path.getsize(data_files[key]) for key in frames}
+        try:
+            append_rows(frames, data_files)
+            with pipeline_metrics.span("main.save_results"):
+                results_writer.finalize(state, entry["recommendations"])
+        except BaseException:
+            truncate_rows(sizes, data_files)
+            raise
+
+    enricher.save(state_file, sources=source_fingerprint(data_files))
+    return entry, output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Append one new week and compute only its state and recommendations.")
+    parser.add_argument("--week-dir", required=True, help="Directory with the new week's campaigns.csv, ad_groups.csv, audiences.csv")
+    args = parser.parse_args()
+
+    start = time.time()
+    frames = load_week_rows(args.week_dir)
+    entry, output_path = ingest_week(frames)
+
+    decisions = entry["recommendations"]
+    print(f"[OK] Week {entry['week']} ingested in {time.time() - start:.1f}s")
+    print(f"   Budget actions: {len(decisions.get('campaign_budget_actions', []))} | "
+          f"Bid actions: {len(decisions.get('ad_group_bid_actions', []))} | "
+          f"Audience actions: {len(decisions.get('audience_targeting_actions', []))}")
+    print(f"[OK] Results appended to {output_path}")
+    if agent_logger.audit_log_file:
+        print(f"[OK] Audit log appended to {agent_logger.audit_log_file}")
+
+
+if __name__ == "__main__":
+    main()
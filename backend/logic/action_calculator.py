@@ -3,8 +3,19 @@ Action Calculator Module - Converts qualitative actions to quantitative changes.
 
 This module takes strategic actions (increase/decrease/no_change) and converts them
 to exact dollar/bid amounts using a 3-tier scaling system based on 3-week metrics.
+
+calculate_budget_changes/calculate_bid_changes process whole batches as
+columns; calculate_budget_change/calculate_bid_change are single-entity
+wrappers around them.
 """
 
+import numpy as np
+
+# Action types that scale a value up or down, per kind of change
+BUDGET_ACTIONS = ("increase", "decrease")
+BID_ACTIONS = ("raise_bid", "lower_bid")
+
+
 def calculate_budget_change(action_type, current_budget, campaign_metrics):
     """
     Calculates exact budget change based on action type and 3-week performance metrics.
@@ -32,47 +43,7 @@ def calculate_budget_change(action_type, current_budget, campaign_metrics):
         }
     """
 
-    if action_type == "no_change":
-        return {
-            "current": round(current_budget, 2),
-            "new": round(current_budget, 2),
-            "change_amount": 0.00,
-            "change_percent": 0.0,
-            "tier": "none"
-        }
-
-    # Extract metrics
-    momentum_3week = campaign_metrics.get('momentum_3week', 0)
-    trend_consistency = campaign_metrics.get('trend_consistency', 'stable')
-    rank = campaign_metrics.get('rank', 50)
-
-    # Determine tier and multiplier
-    if action_type == "increase":
-        tier, multiplier = _determine_increase_tier(momentum_3week, trend_consistency, rank)
-    elif action_type == "decrease":
-        tier, multiplier = _determine_decrease_tier(momentum_3week, trend_consistency, rank)
-    else:
-        # Fallback
-        return {
-            "current": round(current_budget, 2),
-            "new": round(current_budget, 2),
-            "change_amount": 0.00,
-            "change_percent": 0.0,
-            "tier": "none"
-        }
-
-    # Calculate new budget
-    new_budget = current_budget * multiplier
-    change_amount = new_budget - current_budget
-    change_percent = (multiplier - 1) * 100
-
-    return {
-        "current": round(current_budget, 2),
-        "new": round(new_budget, 2),
-        "change_amount": round(change_amount, 2),
-        "change_percent": round(change_percent, 1),
-        "tier": tier
-    }
+    return _single_change(calculate_budget_changes, action_type, current_budget, campaign_metrics)
 
 
 def calculate_bid_change(action_type, current_bid, ad_group_metrics):
@@ -102,110 +73,197 @@ def calculate_bid_change(action_type, current_bid, ad_group_metrics):
         }
     """
 
-    if action_type == "no_change":
-        return {
-            "current": round(current_bid, 2),
-            "new": round(current_bid, 2),
-            "change_amount": 0.00,
-            "change_percent": 0.0,
-            "tier": "none"
-        }
+    return _single_change(calculate_bid_changes, action_type, current_bid, ad_group_metrics)
 
-    # Extract metrics
-    momentum_3week = ad_group_metrics.get('momentum_3week', 0)
-    trend_consistency = ad_group_metrics.get('trend_consistency', 'stable')
-    rank = ad_group_metrics.get('rank', 50)
 
-    # Determine tier and multiplier (raise_bid = increase, lower_bid = decrease)
-    if action_type == "raise_bid":
-        tier, multiplier = _determine_increase_tier(momentum_3week, trend_consistency, rank)
-    elif action_type == "lower_bid":
-        tier, multiplier = _determine_decrease_tier(momentum_3week, trend_consistency, rank)
-    else:
-        # Fallback
-        return {
-            "current": round(current_bid, 2),
-            "new": round(current_bid, 2),
-            "change_amount": 0.00,
-            "change_percent": 0.0,
-            "tier": "none"
-        }
+def calculate_budget_changes(action_types, current_budgets, momentum_3week, trend_consistency, rank):
+    """
+    Batch form of calculate_budget_change: one pass over columns of inputs.
+
+    Args:
+        action_types: Sequence of "increase" / "decrease" / "no_change"
+        current_budgets: Sequence of current weekly budgets
+        momentum_3week: Sequence of 3-week momentum percentages
+        trend_consistency: Sequence of trend consistency labels
+        rank: Sequence of campaign ranks (1 = best)
+
+    Returns:
+        Columns (see calculate_changes)
+    """
 
-    # Calculate new bid
-    new_bid = current_bid * multiplier
-    change_amount = new_bid - current_bid
-    change_percent = (multiplier - 1) * 100
+    return calculate_changes(action_types, current_budgets, momentum_3week, trend_consistency, rank, BUDGET_ACTIONS)
+
+
+def calculate_bid_changes(action_types, current_bids, momentum_3week, trend_consistency, rank):
+    """
+    Batch form of calculate_bid_change ("raise_bid" / "lower_bid" / "no_change").
+
+    Returns:
+        Columns (see calculate_changes)
+    """
+
+    return calculate_changes(action_types, current_bids, momentum_3week, trend_consistency, rank, BID_ACTIONS)
+
+
+def calculate_changes(action_types, current_values, momentum_3week, trend_consistency, rank, actions=BUDGET_ACTIONS):
+    """
+    Converts qualitative actions into tiers and amounts for many entities at once.
+
+    Args:
+        action_types: Sequence of action types
+        current_values: Sequence of current budgets or bids
+        momentum_3week: Sequence of 3-week momentum percentages
+        trend_consistency: Sequence of trend consistency labels
+        rank: Sequence of ranks (1 = best)
+        actions: (increase_type, decrease_type); any other type is left
+            unchanged with tier "none"
+
+    Returns:
+        Dictionary of equal-length columns:
+        - "tier": list of "high" / "moderate" / "low" / "none"
+        - "multiplier": float array (1.0 for unchanged entities)
+        - "current", "new", "change_amount", "change_percent": lists rounded
+          like the single-entity functions (2, 2, 2 and 1 decimals)
+    """
+
+    increase_type, decrease_type = actions
+    action_types = np.asarray(action_types, dtype=object)
+    momentum_3week = np.asarray(momentum_3week, dtype=float)
+    trend_consistency = np.asarray(trend_consistency, dtype=object)
+    rank = np.asarray(rank, dtype=float)
+
+    is_increase = action_types == increase_type
+    is_decrease = action_types == decrease_type
+    changed = is_increase | is_decrease
+
+    # Determine tier and multiplier
+    increase_tiers, increase_multipliers = _increase_tiers(momentum_3week, trend_consistency, rank)
+    decrease_tiers, decrease_multipliers = _decrease_tiers(momentum_3week, trend_consistency, rank)
+    tiers = np.where(is_increase, increase_tiers, np.where(is_decrease, decrease_tiers, "none"))
+    multipliers = np.where(is_increase, increase_multipliers, np.where(is_decrease, decrease_multipliers, 1.0))
+
+    # Calculate new values
+    current_array = np.asarray(current_values, dtype=float)
+    new_values = current_array * multipliers
+    change_amounts = np.where(changed, new_values - current_array, 0.0)
+    change_percents = (multipliers - 1) * 100
+
+    # Unchanged entities keep their rounded current value as "new"
+    current = _round_values(current_values, 2)
+    new = [value if is_changed else current_value for value, is_changed, current_value in zip(
+        _round_values(new_values, 2), changed.tolist(), current
+    )]
 
     return {
-        "current": round(current_bid, 2),
-        "new": round(new_bid, 2),
-        "change_amount": round(change_amount, 2),
-        "change_percent": round(change_percent, 1),
-        "tier": tier
+        "tier": tiers.tolist(),
+        "multiplier": multipliers,
+        "current": current,
+        "new": new,
+        "change_amount": _round_values(change_amounts, 2),
+        "change_percent": _round_values(change_percents, 1)
     }
 
 
-def _determine_increase_tier(momentum_3week, trend_consistency, rank):
+def change_records(changes):
+    """Turns calculate_changes columns into the single-entity result dictionaries."""
+    return [
+        {
+            "current": current,
+            "new": new,
+            "change_amount": change_amount,
+            "change_percent": change_percent,
+            "tier": tier
+        }
+        for current, new, change_amount, change_percent, tier in zip(
+            changes["current"], changes["new"], changes["change_amount"], changes["change_percent"], changes["tier"]
+        )
+    ]
+
+
+def _single_change(batch_function, action_type, current_value, metrics):
+    changes = batch_function(
+        [action_type],
+        [current_value],
+        [metrics.get('momentum_3week', 0)],
+        [metrics.get('trend_consistency', 'stable')],
+        [metrics.get('rank', 50)]
+    )
+    return change_records(changes)[0]
+
+
+def _increase_tiers(momentum_3week, trend_consistency, rank):
     """
-    Determines the tier (high/moderate/low) for budget/bid increases.
+    Determines the tier (high/moderate/low) for budget/bid increases,
+    for arrays of entities.
 
     HIGH (20%): Consistent strong growth
     MODERATE (10%): Good growth or improving trend
     LOW (5%): Mild growth or uncertain signals
 
     Returns:
-        (tier_name, multiplier) e.g., ("high", 1.20)
+        (tiers, multipliers) arrays, e.g. ["high", ...], [1.20, ...]
     """
 
-    # HIGH TIER (20%): Strong consistent improvement
-    if trend_consistency == "consistent_improving" and momentum_3week >= 15:
-        return ("high", 1.20)
-
-    # HIGH TIER (20%): Top performer with good momentum
-    if rank <= 10 and momentum_3week >= 10:
-        return ("high", 1.20)
+    consistent = trend_consistency == "consistent_improving"
+    conditions = [
+        consistent & (momentum_3week >= 15),      # HIGH: Strong consistent improvement
+        (rank <= 10) & (momentum_3week >= 10),    # HIGH: Top performer with good momentum
+        consistent & (momentum_3week >= 5),       # MODERATE: Consistent improvement with moderate momentum
+        momentum_3week >= 10                      # MODERATE: Good momentum even if not perfectly consistent
+    ]
+    # LOW: Default for any increase action (mild positive signals, or volatile but improving)
+    tiers = np.select(conditions, ["high", "high", "moderate", "moderate"], default="low")
+    multipliers = np.select(conditions, [1.20, 1.20, 1.10, 1.10], default=1.05)
+    return tiers, multipliers
 
-    # MODERATE TIER (10%): Consistent improvement with moderate momentum
-    if trend_consistency == "consistent_improving" and momentum_3week >= 5:
-        return ("moderate", 1.10)
 
-    # MODERATE TIER (10%): Good momentum even if not perfectly consistent
-    if momentum_3week >= 10:
-        return ("moderate", 1.10)
-
-    # LOW TIER (5%): Default for any increase action
-    # (Mild positive signals, or volatile but improving)
-    return ("low", 1.05)
-
-
-def _determine_decrease_tier(momentum_3week, trend_consistency, rank):
+def _decrease_tiers(momentum_3week, trend_consistency, rank):
     """
-    Determines the tier (high/moderate/low) for budget/bid decreases.
+    Determines the tier (high/moderate/low) for budget/bid decreases,
+    for arrays of entities.
 
     HIGH (20%): Consistent strong decline
     MODERATE (10%): Notable decline or poor ranking
     LOW (5%): Mild decline or uncertain signals
 
     Returns:
-        (tier_name, multiplier) e.g., ("high", 0.80)
+        (tiers, multipliers) arrays, e.g. ["high", ...], [0.80, ...]
     """
 
-    # HIGH TIER (-20%): Strong consistent decline
-    if trend_consistency == "consistent_declining" and momentum_3week <= -15:
-        return ("high", 0.80)
+    consistent = trend_consistency == "consistent_declining"
+    conditions = [
+        consistent & (momentum_3week <= -15),     # HIGH: Strong consistent decline
+        (rank >= 100) & (momentum_3week <= -10),  # HIGH: Bottom performer with negative momentum
+        consistent & (momentum_3week <= -5),      # MODERATE: Consistent decline with moderate negative momentum
+        momentum_3week <= -10                     # MODERATE: Significant negative momentum
+    ]
+    # LOW: Default for any decrease action (mild negative signals, or volatile but declining)
+    tiers = np.select(conditions, ["high", "high", "moderate", "moderate"], default="low")
+    multipliers = np.select(conditions, [0.80, 0.80, 0.90, 0.90], default=0.95)
+    return tiers, multipliers
 
-    # HIGH TIER (-20%): Bottom performer with negative momentum
-    if rank >= 100 and momentum_3week <= -10:
-        return ("high", 0.80)
 
-    # MODERATE TIER (-10%): Consistent decline with moderate negative momentum
-    if trend_consistency == "consistent_declining" and momentum_3week <= -5:
-        return ("moderate", 0.90)
+def _round_values(values, decimals):
+    """
+    Returns [round(v, decimals) for v in values], rounding float arrays in
+    one pass.
 
-    # MODERATE TIER (-10%): Significant negative momentum
-    if momentum_3week <= -10:
-        return ("moderate", 0.90)
+    np.round scales by 10**decimals before rounding, so it can only disagree
+    with the builtin when the scaled value lies within float error of a .5
+    tie; those elements (and any non-float input) use the builtin.
+    """
 
-    # LOW TIER (-5%): Default for any decrease action
-    # (Mild negative signals, or volatile but declining)
-    return ("low", 0.95)
+    if isinstance(values, np.ndarray):
+        array = values.astype(float, copy=False)
+    elif all(type(v) is float for v in values):
+        array = np.array(values, dtype=float)
+    else:
+        return [round(v, decimals) for v in values]
+
+    scaled = array * 10.0 ** decimals
+    rounded = (np.rint(scaled) / 10.0 ** decimals).tolist()
+    with np.errstate(invalid='ignore'):
+        near_tie = np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) <= 4 * np.spacing(np.abs(scaled))
+    for i in np.flatnonzero(near_tie).tolist():
+        rounded[i] = round(float(array[i]), decimals)
+    return rounded
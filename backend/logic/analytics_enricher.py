@@ -5,6 +5,8 @@ to state data to enable intelligent, dynamic AI decision-making.
 
 import pandas as pd
 import numpy as np
+from backend.logic.data_store import as_data_store
+from backend.logic.metrics import pipeline_metrics
 
 
 def enrich_state_with_analytics(state, all_weeks_data, current_week):
@@ -13,100 +15,112 @@ def enrich_state_with_analytics(state, all_weeks_data, current_week):
 
     Args:
         state: Current week's state dictionary
-        all_weeks_data: Dictionary of all DataFrames (campaigns, ad_groups, audiences)
+        all_weeks_data: WeeklyDataStore or dictionary of all DataFrames
+            (campaigns, ad_groups, audiences)
         current_week: Current week number
 
     Returns:
         Enriched state with analytics fields added
     """
 
+    store = as_data_store(all_weeks_data)
+    campaigns_week = store.week('campaigns', current_week)
+
+    # A windowed store only holds some weeks; count weeks above median over
+    # the full history from its summary instead
+    weeks_above_median = None
+    if store.history_summary is not None:
+        weeks_above_median = store.history_summary.count_above(campaigns_week['roas'].median())
+
     # Enrich campaigns
     state['campaigns'] = enrich_campaigns(
         state['campaigns'],
-        all_weeks_data['campaigns'],
-        current_week
+        store['campaigns'],
+        current_week,
+        current_week_df=campaigns_week,
+        history_df=store.history('campaigns', current_week),
+        weeks_above_median=weeks_above_median
     )
 
     # Enrich ad groups
     state['ad_groups'] = enrich_ad_groups(
         state['ad_groups'],
-        all_weeks_data['ad_groups'],
-        current_week
+        store['ad_groups'],
+        current_week,
+        current_week_df=store.week('ad_groups', current_week),
+        history_df=store.history('ad_groups', current_week)
     )
 
     # Enrich audiences
     state['audiences'] = enrich_audiences(
         state['audiences'],
-        all_weeks_data['audiences'],
-        current_week
+        store['audiences'],
+        current_week,
+        current_week_df=store.week('audiences', current_week),
+        history_df=store.history('audiences', current_week)
     )
 
     # Add portfolio-level analytics summary
     state['portfolio_analytics'] = generate_portfolio_summary(
         state['campaigns'],
-        all_weeks_data['campaigns'],
-        current_week
+        store['campaigns'],
+        current_week,
+        current_week_df=campaigns_week
     )
 
     return state
 
 
-def enrich_campaigns(campaigns, campaigns_df, current_week):
-    """Enriches campaign data with comparative analytics."""
-
-    # Get current week data
-    current_week_df = campaigns_df[campaigns_df['week'] == current_week].copy()
-
-    # Calculate rankings and percentiles
-    current_week_df = current_week_df.sort_values('roas', ascending=False)
-    total_campaigns = len(current_week_df)
+@pipeline_metrics.timed("enrich.campaigns")
+def enrich_campaigns(campaigns, campaigns_df, current_week, current_week_df=None, history_df=None,
+                     weeks_above_median=None):
+    """
+    Enriches campaign data with comparative analytics.
 
-    # Create enrichment map
-    enrichment_map = {}
+    current_week_df and history_df (rows up to current_week) can be passed in
+    pre-sliced, e.g. from a WeeklyDataStore; otherwise they are filtered
+    from campaigns_df. weeks_above_median can be passed as a precomputed
+    {campaign_id: count} map; otherwise it is counted over campaigns_df.
+    """
 
-    # Reset index to get sequential ranking
-    current_week_df = current_week_df.reset_index(drop=True)
+    # Get current week data
+    if current_week_df is None:
+        current_week_df = campaigns_df[campaigns_df['week'] == current_week]
+    if history_df is None:
+        history_df = campaigns_df
+    median_roas = current_week_df['roas'].median()
 
-    for idx, row in current_week_df.iterrows():
-        campaign_id = row['campaign_id']
-        rank = idx + 1
-        percentile = int((1 - (rank - 1) / total_campaigns) * 100)
+    # Rank, percentile and distance from mean for every campaign in one pass
+    rankings = calculate_rankings(current_week_df, metric='roas', id_column='campaign_id')
 
-        # Calculate trend (if previous weeks exist)
-        trend_data = calculate_trend(
-            campaigns_df,
-            campaign_id,
-            current_week,
-            metric='roas'
-        )
+    # category_rank: the category sub-frame kept the full ranking's index, so
+    # the rank it resolved to is the campaign's overall rank; a campaign with
+    # a missing channel or model_line matches no category and gets 1
+    has_category = current_week_df['channel'].notna() & current_week_df['model_line'].notna()
+    uncategorized = set(current_week_df.loc[~has_category, 'campaign_id'].tolist())
 
-        # Calculate distance from mean
-        mean_roas = current_week_df['roas'].mean()
-        distance_from_mean = row['roas'] - mean_roas
+    # Calculate weeks above median (over every loaded week) in one pass
+    if weeks_above_median is None:
+        weeks_above_median = count_weeks_above(campaigns_df, median_roas, metric='roas', id_column='campaign_id')
 
-        # Calculate category rank (by channel + model_line)
-        category_df = current_week_df[
-            (current_week_df['channel'] == row['channel']) &
-            (current_week_df['model_line'] == row['model_line'])
-        ].sort_values('roas', ascending=False)
-        category_rank = (category_df['campaign_id'] == campaign_id).idxmax() + 1 if len(category_df) > 0 else 1
-
-        # Calculate weeks above median
-        historical_data = campaigns_df[campaigns_df['campaign_id'] == campaign_id]
-        median_roas = campaigns_df[campaigns_df['week'] == current_week]['roas'].median()
-        weeks_above_median = len(historical_data[historical_data['roas'] > median_roas])
+    # Calculate trends for all campaigns in one pass
+    trends = calculate_trends(history_df, current_week, metric='roas', id_column='campaign_id')
 
+    # Create enrichment map
+    enrichment_map = {}
+    for campaign_id, ranking in rankings.items():
+        trend_data = trends[campaign_id]
         enrichment_map[campaign_id] = {
-            'rank': rank,
-            'percentile': percentile,
+            'rank': ranking['rank'],
+            'percentile': ranking['percentile'],
             'trend_direction': trend_data['direction'],
             'momentum': trend_data['momentum'],  # 1-week momentum
             'momentum_3week': trend_data['momentum_3week'],  # 3-week momentum
             'avg_roas_3week': trend_data['avg_3week'],  # 3-week rolling average
             'trend_consistency': trend_data['trend_consistency'],  # Trend stability
-            'weeks_above_median': weeks_above_median,
-            'distance_from_mean': round(distance_from_mean, 2),
-            'category_rank': category_rank,
+            'weeks_above_median': weeks_above_median.get(campaign_id, 0),
+            'distance_from_mean': ranking['distance_from_mean'],
+            'category_rank': 1 if campaign_id in uncategorized else ranking['rank'],
             'volatility': trend_data['volatility']
         }
 
@@ -121,45 +135,38 @@ def enrich_campaigns(campaigns, campaigns_df, current_week):
     return enriched_campaigns
 
 
-def enrich_ad_groups(ad_groups, ad_groups_df, current_week):
-    """Enriches ad group data with comparative analytics."""
+@pipeline_metrics.timed("enrich.ad_groups")
+def enrich_ad_groups(ad_groups, ad_groups_df, current_week, current_week_df=None, history_df=None):
+    """
+    Enriches ad group data with comparative analytics.
+
+    Accepts pre-sliced current_week_df/history_df like enrich_campaigns.
+    """
 
     # Get current week data
-    current_week_df = ad_groups_df[ad_groups_df['week'] == current_week].copy()
+    if current_week_df is None:
+        current_week_df = ad_groups_df[ad_groups_df['week'] == current_week]
+    if history_df is None:
+        history_df = ad_groups_df
 
     # Calculate rankings by ROAS
-    current_week_df = current_week_df.sort_values('roas', ascending=False).reset_index(drop=True)
-    total_ad_groups = len(current_week_df)
+    rankings = calculate_rankings(current_week_df, metric='roas', id_column='ad_group_id')
 
-    enrichment_map = {}
-
-    for idx, row in current_week_df.iterrows():
-        ad_group_id = row['ad_group_id']
-        rank = idx + 1
-        percentile = int((1 - (rank - 1) / total_ad_groups) * 100)
-
-        # Calculate trend
-        trend_data = calculate_trend(
-            ad_groups_df,
-            ad_group_id,
-            current_week,
-            metric='roas',
-            id_column='ad_group_id'
-        )
-
-        # Distance from mean
-        mean_roas = current_week_df['roas'].mean()
-        distance_from_mean = row['roas'] - mean_roas
+    # Calculate trends for all ad groups in one pass
+    trends = calculate_trends(history_df, current_week, metric='roas', id_column='ad_group_id')
 
+    enrichment_map = {}
+    for ad_group_id, ranking in rankings.items():
+        trend_data = trends[ad_group_id]
         enrichment_map[ad_group_id] = {
-            'rank': rank,
-            'percentile': percentile,
+            'rank': ranking['rank'],
+            'percentile': ranking['percentile'],
             'trend_direction': trend_data['direction'],
             'momentum': trend_data['momentum'],  # 1-week momentum
             'momentum_3week': trend_data['momentum_3week'],  # 3-week momentum
             'avg_roas_3week': trend_data['avg_3week'],  # 3-week rolling average
             'trend_consistency': trend_data['trend_consistency'],  # Trend stability
-            'distance_from_mean': round(distance_from_mean, 2),
+            'distance_from_mean': ranking['distance_from_mean'],
             'volatility': trend_data['volatility']
         }
 
@@ -174,11 +181,20 @@ def enrich_ad_groups(ad_groups, ad_groups_df, current_week):
     return enriched_ad_groups
 
 
-def enrich_audiences(audiences, audiences_df, current_week):
-    """Enriches audience data with composite health scores and rankings."""
+@pipeline_metrics.timed("enrich.audiences")
+def enrich_audiences(audiences, audiences_df, current_week, current_week_df=None, history_df=None):
+    """
+    Enriches audience data with composite health scores and rankings.
+
+    Accepts pre-sliced current_week_df/history_df like enrich_campaigns.
+    """
 
     # Get current week data
-    current_week_df = audiences_df[audiences_df['week'] == current_week].copy()
+    if current_week_df is None:
+        current_week_df = audiences_df[audiences_df['week'] == current_week]
+    if history_df is None:
+        history_df = audiences_df
+    current_week_df = current_week_df.copy()
 
     # Calculate composite health score for each audience
     current_week_df['composite_health_score'] = (
@@ -189,33 +205,17 @@ def enrich_audiences(audiences, audiences_df, current_week):
         (current_week_df['frequency'] * 2)
     )
 
-    # Sort by health score
-    current_week_df = current_week_df.sort_values('composite_health_score', ascending=False).reset_index(drop=True)
+    # Rank by health score
+    rankings = calculate_rankings(current_week_df, metric='composite_health_score', id_column='audience_id')
     total_audiences = len(current_week_df)
 
-    enrichment_map = {}
-
-    for idx, row in current_week_df.iterrows():
-        audience_id = row['audience_id']
-        rank = idx + 1
-        percentile = int((1 - (rank - 1) / total_audiences) * 100)
-
-        # Calculate CTR/CVR trends
-        ctr_trend = calculate_trend(
-            audiences_df,
-            audience_id,
-            current_week,
-            metric='avg_ctr',
-            id_column='audience_id'
-        )
+    # Calculate CTR/fatigue trends for all audiences in one pass
+    ctr_trends = calculate_trends(history_df, current_week, metric='avg_ctr', id_column='audience_id')
+    fatigue_trends = calculate_trends(history_df, current_week, metric='fatigue_score', id_column='audience_id')
 
-        fatigue_trend = calculate_trend(
-            audiences_df,
-            audience_id,
-            current_week,
-            metric='fatigue_score',
-            id_column='audience_id'
-        )
+    enrichment_map = {}
+    for audience_id, ranking in rankings.items():
+        rank = ranking['rank']
 
         # Determine optimal action based on relative ranking
         if rank <= total_audiences * 0.30:
@@ -226,11 +226,11 @@ def enrich_audiences(audiences, audiences_df, current_week):
             optimal_action = 'no_change'
 
         enrichment_map[audience_id] = {
-            'composite_health_score': round(row['composite_health_score'], 2),
+            'composite_health_score': ranking['value'],
             'health_rank': rank,
-            'health_percentile': percentile,
-            'engagement_trend': ctr_trend['direction'],
-            'fatigue_trend': fatigue_trend['direction'],
+            'health_percentile': ranking['percentile'],
+            'engagement_trend': ctr_trends[audience_id]['direction'],
+            'fatigue_trend': fatigue_trends[audience_id]['direction'],
             'optimal_action': optimal_action
         }
 
@@ -245,107 +245,200 @@ def enrich_audiences(audiences, audiences_df, current_week):
     return enriched_audiences
 
 
+def calculate_rankings(df, metric='roas', id_column='campaign_id'):
+    """
+    Ranks one week's entities by a metric, highest first, in a single pass.
+
+    Ties keep the order of a descending sort_values on the metric, and the
+    mean is taken over the sorted column, exactly as the per-row loops did.
+
+    Args:
+        df: Current week's rows
+        metric: Metric column to rank by
+        id_column: Entity identifier column
+
+    Returns:
+        Dictionary mapping entity_id to {'rank', 'percentile', 'value',
+        'distance_from_mean'}, in rank order; 'value' and 'distance_from_mean'
+        are rounded to 2 decimals
+    """
+
+    ranked = df.sort_values(metric, ascending=False)
+    total = len(ranked)
+    mean = ranked[metric].mean()
+
+    ranks = np.arange(1, total + 1)
+    percentiles = ((1 - (ranks - 1) / total) * 100).astype(int)
+
+    return {
+        entity_id: {
+            'rank': rank,
+            'percentile': percentile,
+            'value': round(value, 2),
+            'distance_from_mean': round(value - mean, 2)
+        }
+        for entity_id, rank, percentile, value in zip(
+            ranked[id_column].tolist(), ranks.tolist(), percentiles.tolist(), ranked[metric].tolist()
+        )
+    }
+
+
+def count_weeks_above(df, threshold, metric='roas', id_column='campaign_id'):
+    """
+    Counts, per entity, the rows whose metric is strictly above threshold.
+
+    Returns:
+        Dictionary mapping entity_id to its count (entities with none are omitted)
+    """
+
+    above = df.loc[df[metric] > threshold, id_column]
+    return {entity_id: int(count) for entity_id, count in above.value_counts(sort=False).items()}
+
+
 def calculate_trend(df, entity_id, current_week, metric='roas', id_column='campaign_id'):
     """
     Calculates trend direction and momentum for a given entity.
     Now includes both 1-week and 3-week analysis for more stable insights.
 
+    Single-entity wrapper around calculate_trends; prefer the batched
+    function when trends are needed for a whole week.
+
     Returns:
         Dictionary with 'direction', 'momentum', 'momentum_3week', 'avg_3week',
         'volatility', and 'trend_consistency'
     """
 
-    # Get historical data up to current week
-    entity_data = df[
-        (df[id_column] == entity_id) &
-        (df['week'] <= current_week)
-    ].sort_values('week')
+    entity_df = df[df[id_column] == entity_id]
+    trends = calculate_trends(entity_df, current_week, metric=metric, id_column=id_column)
 
-    if len(entity_data) < 2:
+    if entity_id not in trends:
         return {
             'direction': 'stable',
             'momentum': 0.0,
             'momentum_3week': 0.0,
-            'avg_3week': entity_data[metric].iloc[0] if len(entity_data) == 1 else 0.0,
+            'avg_3week': 0.0,
             'volatility': 0.0,
             'trend_consistency': 'insufficient_data'
         }
 
-    # 1-WEEK MOMENTUM: Compare current week vs previous week
-    recent_values = entity_data[metric].tail(2).values
-    momentum_1week = 0.0
+    return trends[entity_id]
+
 
-    if len(recent_values) == 2 and recent_values[0] != 0:
-        momentum_1week = ((recent_values[1] - recent_values[0]) / abs(recent_values[0])) * 100
+def calculate_trends(df, current_week, metric='roas', id_column='campaign_id'):
+    """
+    Calculates trend direction and momentum for every entity at once.
 
-    # 3-WEEK MOMENTUM: Compare current week vs 3 weeks ago (if available)
-    momentum_3week = 0.0
-    avg_3week = 0.0
-    trend_consistency = 'stable'
+    The history is filtered and week-sorted a single time, the last three
+    observations of each entity are lined up with groupby/shift, and all
+    trend metrics are then computed column-wise. Values are identical to
+    calling calculate_trend once per entity.
 
-    if len(entity_data) >= 3:
-        # Get last 3 weeks of data
-        last_3_weeks = entity_data[metric].tail(3).values
-        avg_3week = np.mean(last_3_weeks)
+    Args:
+        df: Full history DataFrame (all weeks)
+        current_week: Current week number (later weeks are ignored)
+        metric: Metric column to analyse
+        id_column: Entity identifier column
 
-        # 3-week momentum: current vs 3 weeks ago
-        if last_3_weeks[0] != 0:
-            momentum_3week = ((last_3_weeks[2] - last_3_weeks[0]) / abs(last_3_weeks[0])) * 100
+    Returns:
+        Dictionary mapping entity_id to a trend dictionary with 'direction',
+        'momentum', 'momentum_3week', 'avg_3week', 'volatility', and
+        'trend_consistency'
+    """
 
-        # Trend consistency: Are all 3 weeks moving in the same direction?
-        week1_to_2 = last_3_weeks[1] - last_3_weeks[0]
-        week2_to_3 = last_3_weeks[2] - last_3_weeks[1]
+    # Keep only the last 3 observations of each entity, in week order
+    history = df.loc[df['week'] <= current_week, [id_column, 'week', metric]]
+    history = history.sort_values('week', kind='stable')
+    history = history.groupby(id_column, sort=False).tail(3)
 
-        if week1_to_2 > 0 and week2_to_3 > 0:
-            trend_consistency = 'consistent_improving'
-        elif week1_to_2 < 0 and week2_to_3 < 0:
-            trend_consistency = 'consistent_declining'
-        else:
-            trend_consistency = 'volatile'
-    elif len(entity_data) == 2:
-        # Only 2 weeks available - use those 2 for average
-        avg_3week = np.mean(entity_data[metric].tail(2).values)
-        momentum_3week = momentum_1week  # Fallback to 1-week
-        trend_consistency = 'limited_data'
-    else:
-        avg_3week = entity_data[metric].iloc[0]
-        trend_consistency = 'insufficient_data'
-
-    # Determine overall direction based on 3-week momentum (more stable)
-    if len(entity_data) >= 3:
-        # Use 3-week momentum for direction if we have enough data
-        if momentum_3week > 5:
-            direction = 'improving'
-        elif momentum_3week < -5:
-            direction = 'declining'
-        else:
-            direction = 'stable'
-    else:
-        # Fallback to 1-week momentum
-        if momentum_1week > 5:
-            direction = 'improving'
-        elif momentum_1week < -5:
-            direction = 'declining'
-        else:
-            direction = 'stable'
+    grouped = history.groupby(id_column, sort=False)[metric]
+    history = history.assign(
+        prev_1=grouped.shift(1),
+        prev_2=grouped.shift(2),
+        count=grouped.transform('size')
+    )
+    latest = history.groupby(id_column, sort=False).tail(1)
 
-    # Calculate volatility (standard deviation of last 3 weeks if available)
-    if len(entity_data) >= 3:
-        volatility = np.std(entity_data[metric].tail(3).values)
-    else:
-        volatility = entity_data[metric].std() if len(entity_data) >= 2 else 0.0
+    if latest.empty:
+        return {}
 
-    return {
-        'direction': direction,
-        'momentum': round(momentum_1week, 2),  # 1-week momentum
-        'momentum_3week': round(momentum_3week, 2),  # 3-week momentum
-        'avg_3week': round(avg_3week, 2),  # Rolling 3-week average
-        'volatility': round(volatility, 2),
-        'trend_consistency': trend_consistency
-    }
+    current = latest[metric].to_numpy(dtype=float)
+    prev_1 = latest['prev_1'].to_numpy(dtype=float)
+    prev_2 = latest['prev_2'].to_numpy(dtype=float)
+    count = latest['count'].to_numpy()
+
+    has_2 = count >= 2
+    has_3 = count >= 3
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # 1-WEEK MOMENTUM: Compare current week vs previous week
+        momentum_1week = np.where(
+            has_2 & (prev_1 != 0),
+            ((current - prev_1) / np.abs(prev_1)) * 100,
+            0.0
+        )
+
+        # 3-WEEK MOMENTUM: Compare current week vs 3 weeks ago, falling back to 1-week
+        momentum_3week = np.where(
+            has_3,
+            np.where(prev_2 != 0, ((current - prev_2) / np.abs(prev_2)) * 100, 0.0),
+            np.where(has_2, momentum_1week, 0.0)
+        )
+
+    # Rolling average over the available (up to 3) weeks
+    mean_3 = (prev_2 + prev_1 + current) / 3
+    mean_2 = (prev_1 + current) / 2
+    avg_3week = np.where(has_3, mean_3, np.where(has_2, mean_2, current))
+
+    # Volatility: population std over 3 weeks, sample std over 2 weeks
+    std_3 = np.sqrt(((prev_2 - mean_3) ** 2 + (prev_1 - mean_3) ** 2 + (current - mean_3) ** 2) / 3)
+    std_2 = np.sqrt(((mean_2 - prev_1) ** 2 + (mean_2 - current) ** 2) / 1)
+    volatility = np.where(has_3, std_3, np.where(has_2, std_2, 0.0))
+
+    # Trend consistency: Are all 3 weeks moving in the same direction?
+    week1_to_2 = prev_1 - prev_2
+    week2_to_3 = current - prev_1
+    trend_consistency = np.select(
+        [
+            has_3 & (week1_to_2 > 0) & (week2_to_3 > 0),
+            has_3 & (week1_to_2 < 0) & (week2_to_3 < 0),
+            has_3,
+            has_2
+        ],
+        ['consistent_improving', 'consistent_declining', 'volatile', 'limited_data'],
+        default='insufficient_data'
+    )
+
+    # Direction uses 3-week momentum when available (more stable), else 1-week
+    signal = np.where(has_3, momentum_3week, momentum_1week)
+    direction = np.select([signal > 5, signal < -5], ['improving', 'declining'], default='stable')
+
+    # Single observations keep their raw value as the average (not rounded)
+    avg_3week = np.where(has_2, np.round(avg_3week, 2), avg_3week)
+
+    trends = {}
+    for entity_id, dir_, mom, mom_3, avg, vol, consistency in zip(
+        latest[id_column].tolist(),
+        direction.tolist(),
+        np.round(momentum_1week, 2).tolist(),
+        np.round(momentum_3week, 2).tolist(),
+        avg_3week.tolist(),
+        np.round(volatility, 2).tolist(),
+        trend_consistency.tolist()
+    ):
+        trends[entity_id] = {
+            'direction': dir_,
+            'momentum': mom,  # 1-week momentum
+            'momentum_3week': mom_3,  # 3-week momentum
+            'avg_3week': avg,  # Rolling 3-week average
+            'volatility': vol,
+            'trend_consistency': consistency
+        }
+
+    return trends
 
 
-def generate_portfolio_summary(campaigns, campaigns_df, current_week):
+@pipeline_metrics.timed("enrich.portfolio_summary")
+def generate_portfolio_summary(campaigns, campaigns_df, current_week, current_week_df=None):
     """
     Generates portfolio-level analytics summary.
 
@@ -353,13 +446,15 @@ def generate_portfolio_summary(campaigns, campaigns_df, current_week):
         campaigns: Enriched campaigns list for current week
         campaigns_df: Full campaigns DataFrame
         current_week: Current week number
+        current_week_df: Optional pre-sliced current week rows
 
     Returns:
         Dictionary with portfolio analytics
     """
 
     # Current week statistics
-    current_week_df = campaigns_df[campaigns_df['week'] == current_week]
+    if current_week_df is None:
+        current_week_df = campaigns_df[campaigns_df['week'] == current_week]
 
     roas_values = current_week_df['roas'].values
     mean_roas = np.mean(roas_values)
@@ -3,9 +3,66 @@ Budget Allocation Logic - Intelligent campaign budget reallocation
 based on ROAS performance, trends, momentum, and relative ranking.
 """
 
-from backend.logic.action_calculator import calculate_budget_change
-
-def calculate_budget_actions(campaigns, top_percentile=0.30, bottom_percentile=0.30):
+import numpy as np
+from backend.logic.action_calculator import calculate_budget_changes, _round_values
+from backend.logic.metrics import pipeline_metrics
+
+# Budget rules in priority order: (action, reason). Reasons are rendered from
+# the campaign's rank, percentile, roas, momentum and distance from the mean,
+# and only once an action is actually built.
+BUDGET_RULES = [
+    # CASE 1: STRONG POSITIVE MOMENTUM (>15%) - Capitalize on rising stars
+    ("increase", lambda rank, percentile, roas, momentum, distance: (
+         f"This campaign demonstrates exceptional momentum with {momentum:.1f}% performance acceleration, "
+         f"currently ranking #{rank} ({percentile}th percentile) with a ROAS of {roas:.2f}. "
+         "The strong growth trajectory warrants aggressive budget scaling to capitalize on this sustained upward trend.")),
+    # CASE 2: STRONG NEGATIVE MOMENTUM (<-15%) - Cut losses quickly
+    ("decrease", lambda rank, percentile, roas, momentum, distance: (
+         f"This campaign exhibits a sharp performance decline of {momentum:.1f}%, deteriorating to rank #{rank} with a ROAS of {roas:.2f}. "
+         "The persistent downward trend necessitates a defensive budget reduction to limit capital exposure and reallocate resources to higher-performing campaigns.")),
+    # CASE 3: TOP TIER PERFORMERS (top 30% by rank) - improving / declining / stable
+    ("increase", lambda rank, percentile, roas, momentum, distance: (
+         f"As an elite performer ascending to rank #{rank} ({percentile}th percentile), this campaign shows improving momentum of +{momentum:.1f}% with a ROAS of {roas:.2f}. "
+         "The sustainable growth trajectory demonstrates consistent efficiency gains, justifying scaled investment to maximize returns from this top-tier asset.")),
+    ("no_change", lambda rank, percentile, roas, momentum, distance: (
+         f"While maintaining a premium rank #{rank} position, this campaign exhibits declining momentum of {momentum:.1f}% with a ROAS of {roas:.2f}. "
+         "Stability verification is required before additional capital allocation to ensure the decline is temporary rather than systemic.")),
+    ("increase", lambda rank, percentile, roas, momentum, distance: (
+         f"This campaign maintains consistent top-tier performance at rank #{rank} ({percentile}th percentile) with a stable ROAS of {roas:.2f}. "
+         "The reliable efficiency profile and proven track record support continued growth investment to compound strong returns.")),
+    # CASE 4: BOTTOM TIER PERFORMERS (bottom 30% by rank) - recovering / declining / stagnant
+    ("no_change", lambda rank, percentile, roas, momentum, distance: (
+         f"Despite lower-tier positioning at rank #{rank}, this campaign shows promising recovery momentum of +{momentum:.1f}% with a ROAS of {roas:.2f}. "
+         "The emerging positive trend warrants an observation period to confirm sustainability before committing additional budget or implementing reductions.")),
+    ("decrease", lambda rank, percentile, roas, momentum, distance: (
+         f"This underperforming campaign ranks #{rank} with a deteriorating trend of {momentum:.1f}% and a ROAS of {roas:.2f}. "
+         "Budget reduction is necessary to limit inefficient spend and reallocate capital toward campaigns demonstrating stronger efficiency and growth potential.")),
+    ("decrease", lambda rank, percentile, roas, momentum, distance: (
+         f"This campaign exhibits persistent bottom-tier performance at rank #{rank} with a ROAS of {roas:.2f} and stagnant trajectory. "
+         "Strategic budget reallocation to higher-performing campaigns will optimize overall portfolio efficiency and maximize return on advertising spend.")),
+    # CASE 5: MIDDLE TIER (40% in the middle) - more dynamic, uses trends
+    ("increase", lambda rank, percentile, roas, momentum, distance: (
+         f"This campaign represents an emerging mid-tier opportunity at rank #{rank}, displaying robust momentum of +{momentum:.1f}% with a ROAS of {roas:.2f}. "
+         "The performance acceleration signals potential for tier elevation, justifying proactive investment to capitalize on this upward trajectory before market saturation.")),
+    ("no_change", lambda rank, percentile, roas, momentum, distance: (
+         f"Positioned at mid-tier rank #{rank}, this campaign exhibits positive momentum of +{momentum:.1f}% with a ROAS of {roas:.2f}. "
+         "The constructive trend development warrants sustained budget allocation while monitoring progression to determine if the improvement solidifies into a sustained uptrend.")),
+    ("decrease", lambda rank, percentile, roas, momentum, distance: (
+         f"This mid-tier campaign at rank #{rank} is experiencing a sharp efficiency decline of {momentum:.1f}% with a ROAS of {roas:.2f}. "
+         "The performance deterioration requires a defensive budget reduction to preserve capital and prevent further erosion of returns.")),
+    ("no_change", lambda rank, percentile, roas, momentum, distance: (
+         f"This mid-tier campaign ranks #{rank} and performs {distance:+.1f} points above the portfolio average with a ROAS of {roas:.2f}. "
+         "The above-average stability and consistent performance support maintaining current budget allocation to preserve this advantageous market position.")),
+    ("no_change", lambda rank, percentile, roas, momentum, distance: (
+         f"This campaign maintains balanced mid-tier performance at rank #{rank} with a stable ROAS of {roas:.2f}. "
+         "The equilibrium efficiency profile supports current budget allocation while monitoring for performance inflection points that may warrant strategic adjustment."))
+]
+
+BUDGET_RULE_ACTIONS = np.array([action for action, _ in BUDGET_RULES])
+
+
+@pipeline_metrics.timed("budget.calculate_actions")
+def calculate_budget_actions(campaigns, top_percentile=0.30, bottom_percentile=0.30, include_reasons=True):
     """
     Calculates budget reallocation recommendations using intelligent trend-based logic.
 
@@ -16,10 +73,16 @@ def calculate_budget_actions(campaigns, top_percentile=0.30, bottom_percentile=0
     - Relative ranking and percentile
     - Volatility (performance stability)
 
+    The decision rules and budget tiers are evaluated over arrays for all
+    campaigns at once; results are identical to calling
+    determine_budget_action and calculate_budget_change per campaign.
+
     Args:
         campaigns: List of enriched campaign dictionaries with analytics fields
         top_percentile: Percentage of top performers to increase (default 30%)
         bottom_percentile: Percentage of bottom performers to decrease (default 30%)
+        include_reasons: When False, actions are returned without the
+            rendered "reason" text
 
     Returns:
         List of budget action dictionaries with campaign_id, type, and reason
@@ -32,59 +95,115 @@ def calculate_budget_actions(campaigns, top_percentile=0.30, bottom_percentile=0
     campaigns_sorted = sorted(campaigns, key=lambda x: x.get('roas', 0), reverse=True)
 
     total_campaigns = len(campaigns_sorted)
-    budget_actions = []
 
-    for i, campaign in enumerate(campaigns_sorted):
-        campaign_id = campaign.get('campaign_id')
-        campaign_name = campaign.get('campaign_name', 'Unknown')
-        roas = campaign.get('roas', 0)
-        rank = campaign.get('rank', i + 1)
-        percentile = campaign.get('percentile', 0)
-        trend_direction = campaign.get('trend_direction', 'stable')
-        momentum = campaign.get('momentum', 0.0)
-        distance_from_mean = campaign.get('distance_from_mean', 0)
-
-        # INTELLIGENT DECISION LOGIC - Context-aware budget allocation
-        action_type, reason = determine_budget_action(
-            rank=rank,
-            total_campaigns=total_campaigns,
-            roas=roas,
-            trend_direction=trend_direction,
-            momentum=momentum,
-            percentile=percentile,
-            distance_from_mean=distance_from_mean,
-            campaign_name=campaign_name,
-            top_percentile=top_percentile,
-            bottom_percentile=bottom_percentile
-        )
-
-        # Calculate quantitative budget change using 3-tier system
-        current_budget = campaign.get('weekly_budget_spent', 0)
-        budget_change = calculate_budget_change(
-            action_type,
-            current_budget,
-            {
-                'momentum_3week': campaign.get('momentum_3week', 0),
-                'trend_consistency': campaign.get('trend_consistency', 'stable'),
-                'rank': rank
-            }
-        )
-
-        budget_actions.append({
-            "campaign_id": campaign_id,
-            "campaign_name": campaign_name,
-            "type": action_type,
-            "reason": reason,
-            "roas": round(roas, 2),
-            "rank": rank,
-            "trend_direction": trend_direction,
-            "momentum": round(momentum, 2),
-            "budget_change": budget_change  # Add quantitative change details
-        })
+    # 1. Gather rule inputs (raw values are kept for the output fields)
+    roas = [c.get('roas', 0) for c in campaigns_sorted]
+    ranks = [c.get('rank', i + 1) for i, c in enumerate(campaigns_sorted)]
+    percentiles = [c.get('percentile', 0) for c in campaigns_sorted]
+    trend_directions = [c.get('trend_direction', 'stable') for c in campaigns_sorted]
+    momentum = [c.get('momentum', 0.0) for c in campaigns_sorted]
+    distances = [c.get('distance_from_mean', 0) for c in campaigns_sorted]
+    current_budgets = [c.get('weekly_budget_spent', 0) for c in campaigns_sorted]
+
+    # 2. INTELLIGENT DECISION LOGIC - Context-aware budget allocation
+    rules = _select_budget_rules(
+        rank=np.array(ranks),
+        total_campaigns=total_campaigns,
+        trend_direction=np.array(trend_directions, dtype=object),
+        momentum=np.array(momentum, dtype=float),
+        distance_from_mean=np.array(distances, dtype=float),
+        top_percentile=top_percentile,
+        bottom_percentile=bottom_percentile
+    )
+    action_types = BUDGET_RULE_ACTIONS[rules]
+
+    # 3. Calculate quantitative budget changes using the 3-tier system
+    changes = calculate_budget_changes(
+        action_types,
+        current_budgets,
+        [c.get('momentum_3week', 0) for c in campaigns_sorted],
+        [c.get('trend_consistency', 'stable') for c in campaigns_sorted],
+        ranks
+    )
+
+    columns = zip(
+        campaigns_sorted,
+        rules.tolist(),
+        action_types.tolist(),
+        changes["tier"],
+        changes["current"],
+        changes["new"],
+        changes["change_amount"],
+        changes["change_percent"],
+        _round_values(roas, 2),
+        _round_values(momentum, 2),
+        roas, ranks, percentiles, trend_directions, momentum, distances
+    )
+
+    # 4. Build the actions (reason text is only rendered here)
+    budget_actions = []
+    for (campaign, rule, action_type, tier, current, new_budget, change_amount, change_percent,
+         rounded_roas, rounded_momentum, campaign_roas, rank, percentile, trend_direction,
+         campaign_momentum, distance) in columns:
+        budget_change = {
+            "current": current,
+            "new": new_budget,
+            "change_amount": change_amount,
+            "change_percent": change_percent,
+            "tier": tier
+        }
+
+        action = {
+            "campaign_id": campaign.get('campaign_id'),
+            "campaign_name": campaign.get('campaign_name', 'Unknown'),
+            "type": action_type
+        }
+        if include_reasons:
+            action["reason"] = BUDGET_RULES[rule][1](rank, percentile, campaign_roas, campaign_momentum, distance)
+        action["roas"] = rounded_roas
+        action["rank"] = rank
+        action["trend_direction"] = trend_direction
+        action["momentum"] = rounded_momentum
+        action["budget_change"] = budget_change  # Add quantitative change details
+        budget_actions.append(action)
 
     return budget_actions
 
 
+def _select_budget_rules(rank, total_campaigns, trend_direction, momentum, distance_from_mean,
+                         top_percentile, bottom_percentile):
+    """
+    Evaluates the CASE 1-5 rules of determine_budget_action over arrays.
+
+    Returns:
+        Int array of indices into BUDGET_RULES (first matching rule per campaign)
+    """
+
+    top_threshold = int(total_campaigns * top_percentile)
+    bottom_threshold = int(total_campaigns * (1 - bottom_percentile))
+
+    improving = trend_direction == 'improving'
+    declining = trend_direction == 'declining'
+    top_tier = rank <= top_threshold
+    bottom_tier = rank >= bottom_threshold
+
+    conditions = [
+        momentum > 15,                                  # CASE 1
+        momentum < -15,                                 # CASE 2
+        top_tier & improving,                           # CASE 3
+        top_tier & declining,
+        top_tier,
+        bottom_tier & improving & (momentum > 5),       # CASE 4
+        bottom_tier & (declining | (momentum < -5)),
+        bottom_tier,
+        improving & (momentum > 10),                    # CASE 5
+        improving & (momentum > 5),
+        declining & (momentum < -10),
+        distance_from_mean > 10
+    ]
+    return np.select(conditions, np.arange(len(conditions)), default=len(BUDGET_RULES) - 1)
+
+
 def determine_budget_action(rank, total_campaigns, roas, trend_direction, momentum,
                             percentile, distance_from_mean, campaign_name,
                             top_percentile, bottom_percentile):
@@ -96,89 +215,21 @@ def determine_budget_action(rank, total_campaigns, roas, trend_direction, moment
     2. Improving trends in mid-tier campaigns get opportunities
     3. Declining trends in top-tier campaigns get cautious treatment
     4. Extreme performers get adjusted based on sustainability
-    """
 
-    top_threshold = int(total_campaigns * top_percentile)
-    bottom_threshold = int(total_campaigns * (1 - bottom_percentile))
-
-    # CASE 1: STRONG POSITIVE MOMENTUM (>15%) - Capitalize on rising stars
-    if momentum > 15:
-        return "increase", (
-            f"This campaign demonstrates exceptional momentum with {momentum:.1f}% performance acceleration, "
-            f"currently ranking #{rank} ({percentile}th percentile) with a ROAS of {roas:.2f}. "
-            f"The strong growth trajectory warrants aggressive budget scaling to capitalize on this sustained upward trend."
-        )
+    Single-campaign form of the rules in BUDGET_RULES; calculate_budget_actions
+    evaluates them for all campaigns at once.
+    """
 
-    # CASE 2: STRONG NEGATIVE MOMENTUM (<-15%) - Cut losses quickly
-    if momentum < -15:
-        return "decrease", (
-            f"This campaign exhibits a sharp performance decline of {momentum:.1f}%, deteriorating to rank #{rank} with a ROAS of {roas:.2f}. "
-            f"The persistent downward trend necessitates a defensive budget reduction to limit capital exposure and reallocate resources to higher-performing campaigns."
-        )
-
-    # CASE 3: TOP TIER PERFORMERS (top 30% by rank)
-    if rank <= top_threshold:
-        if trend_direction == 'improving':
-            return "increase", (
-                f"As an elite performer ascending to rank #{rank} ({percentile}th percentile), this campaign shows improving momentum of +{momentum:.1f}% with a ROAS of {roas:.2f}. "
-                f"The sustainable growth trajectory demonstrates consistent efficiency gains, justifying scaled investment to maximize returns from this top-tier asset."
-            )
-        elif trend_direction == 'declining':
-            return "no_change", (
-                f"While maintaining a premium rank #{rank} position, this campaign exhibits declining momentum of {momentum:.1f}% with a ROAS of {roas:.2f}. "
-                f"Stability verification is required before additional capital allocation to ensure the decline is temporary rather than systemic."
-            )
-        else:
-            return "increase", (
-                f"This campaign maintains consistent top-tier performance at rank #{rank} ({percentile}th percentile) with a stable ROAS of {roas:.2f}. "
-                f"The reliable efficiency profile and proven track record support continued growth investment to compound strong returns."
-            )
-
-    # CASE 4: BOTTOM TIER PERFORMERS (bottom 30% by rank)
-    if rank >= bottom_threshold:
-        if trend_direction == 'improving' and momentum > 5:
-            return "no_change", (
-                f"Despite lower-tier positioning at rank #{rank}, this campaign shows promising recovery momentum of +{momentum:.1f}% with a ROAS of {roas:.2f}. "
-                f"The emerging positive trend warrants an observation period to confirm sustainability before committing additional budget or implementing reductions."
-            )
-        elif trend_direction == 'declining' or momentum < -5:
-            return "decrease", (
-                f"This underperforming campaign ranks #{rank} with a deteriorating trend of {momentum:.1f}% and a ROAS of {roas:.2f}. "
-                f"Budget reduction is necessary to limit inefficient spend and reallocate capital toward campaigns demonstrating stronger efficiency and growth potential."
-            )
-        else:
-            return "decrease", (
-                f"This campaign exhibits persistent bottom-tier performance at rank #{rank} with a ROAS of {roas:.2f} and stagnant trajectory. "
-                f"Strategic budget reallocation to higher-performing campaigns will optimize overall portfolio efficiency and maximize return on advertising spend."
-            )
-
-    # CASE 5: MIDDLE TIER (40% in the middle)
-    # More dynamic - use trends to make decisions
-    if trend_direction == 'improving' and momentum > 10:
-        return "increase", (
-            f"This campaign represents an emerging mid-tier opportunity at rank #{rank}, displaying robust momentum of +{momentum:.1f}% with a ROAS of {roas:.2f}. "
-            f"The performance acceleration signals potential for tier elevation, justifying proactive investment to capitalize on this upward trajectory before market saturation."
-        )
-    elif trend_direction == 'improving' and momentum > 5:
-        return "no_change", (
-            f"Positioned at mid-tier rank #{rank}, this campaign exhibits positive momentum of +{momentum:.1f}% with a ROAS of {roas:.2f}. "
-            f"The constructive trend development warrants sustained budget allocation while monitoring progression to determine if the improvement solidifies into a sustained uptrend."
-        )
-    elif trend_direction == 'declining' and momentum < -10:
-        return "decrease", (
-            f"This mid-tier campaign at rank #{rank} is experiencing a sharp efficiency decline of {momentum:.1f}% with a ROAS of {roas:.2f}. "
-            f"The performance deterioration requires a defensive budget reduction to preserve capital and prevent further erosion of returns."
-        )
-    elif distance_from_mean > 10:
-        return "no_change", (
-            f"This mid-tier campaign ranks #{rank} and performs {distance_from_mean:+.1f} points above the portfolio average with a ROAS of {roas:.2f}. "
-            f"The above-average stability and consistent performance support maintaining current budget allocation to preserve this advantageous market position."
-        )
-    else:
-        return "no_change", (
-            f"This campaign maintains balanced mid-tier performance at rank #{rank} with a stable ROAS of {roas:.2f}. "
-            f"The equilibrium efficiency profile supports current budget allocation while monitoring for performance inflection points that may warrant strategic adjustment."
-        )
+    rule = int(_select_budget_rules(
+        rank=np.array([rank]),
+        total_campaigns=total_campaigns,
+        trend_direction=np.array([trend_direction], dtype=object),
+        momentum=np.array([momentum], dtype=float),
+        distance_from_mean=np.array([distance_from_mean], dtype=float),
+        top_percentile=top_percentile,
+        bottom_percentile=bottom_percentile
+    )[0])
+    return BUDGET_RULES[rule][0], BUDGET_RULES[rule][1](rank, percentile, roas, momentum, distance_from_mean)
 
 
 def get_budget_summary(budget_actions):
@@ -0,0 +1,110 @@
+"""
+Week Checkpoints - Finished weeks of the recommendation loop, kept on disk
+so an interrupted run can resume where it stopped.
+
+Each week is written atomically as soon as it finishes: its history entry
+(state snapshot, recommendations and that week's audit log step) plus an
+input key, a hash of the enriched state, the policy settings that shape the
+decisions and the model name. `python -m backend.main --resume` reuses a
+week's checkpoint while its key still matches, so a failure late in a long
+backfill only costs the weeks that had not finished.
+"""
+
+import hashlib
+import json
+import os
+
+from backend.logic.policy_loader import policy_loader
+from backend.logic.results_writer import NumpyEncoder
+
+CHECKPOINT_VERSION = 1
+
+# Policy settings that change a week's recommendations for the same state
+DECISION_SETTINGS = (
+    ("budget",),
+    ("bid",),
+    ("audience",),
+    ("prompt",),
+    ("llm", "base_url"),
+    ("llm", "bid_shard_size"),
+    ("logging", "trace_mode")
+)
+
+
+class CheckpointStore:
+    """
+    One JSON file per finished week (week_N.json) in checkpoint_dir.
+
+    Files are written to a temporary name and renamed into place, so a run
+    killed mid-write never leaves a truncated checkpoint behind.
+    """
+
+    def __init__(self, checkpoint_dir, enabled=True):
+        """
+        Args:
+            checkpoint_dir: Directory holding the week checkpoints
+            enabled: When False, save() stores nothing and load() always misses
+        """
+        self.checkpoint_dir = checkpoint_dir
+        self.enabled = enabled
+
+    @classmethod
+    def from_policy(cls):
+        """Builds the store from the 'checkpoints' section of policy.json."""
+        return cls(
+            checkpoint_dir=policy_loader.get_value('checkpoints', 'dir', default=".cache/checkpoints"),
+            enabled=policy_loader.get_value('checkpoints', 'enabled', default=False)
+        )
+
+    def input_key(self, state, model=None):
+        """Returns the hash of everything a week's recommendations are computed from (None when disabled)."""
+        if not self.enabled:
+            return None
+        settings = {".".join(path): policy_loader.get_value(*path) for path in DECISION_SETTINGS}
+        payload = json.dumps([CHECKPOINT_VERSION, model, settings, state], cls=NumpyEncoder, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def save(self, entry, key):
+        """
+        Stores a finished week.
+
+        Args:
+            entry: The week's history entry (week, state_snapshot, recommendations, log_history)
+            key: input_key() of the week's state
+        """
+        if not self.enabled:
+            return
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        path = self._path(entry["week"])
+        tmp_path = f"{path}.partial"
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                "checkpoint_version": CHECKPOINT_VERSION,
+                "week": int(entry["week"]),
+                "input_key": key,
+                "entry": entry
+            }, f, cls=NumpyEncoder)
+        os.replace(tmp_path, path)
+
+    def load(self, week, key):
+        """
+        Returns the checkpointed history entry of a week, or None when there
+        is none or it was computed from different inputs.
+        """
+        if not self.enabled:
+            return None
+        try:
+            with open(self._path(week), 'r') as f:
+                checkpoint = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if checkpoint.get("checkpoint_version") != CHECKPOINT_VERSION or checkpoint.get("input_key") != key:
+            return None
+        return checkpoint.get("entry")
+
+    def _path(self, week):
+        return os.path.join(self.checkpoint_dir, f"week_{int(week)}.json")
+
+
+# Global instance for easy access
+checkpoint_store = CheckpointStore.from_policy()
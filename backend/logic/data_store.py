@@ -0,0 +1,135 @@
+"""
+Weekly Data Store - Week-partitioned, in-memory view over the campaign,
+ad group and audience tables.
+
+Each table is sorted by week once at load time and the row range of every
+week is recorded, so week and history lookups are positional slices
+instead of boolean masks over the full history.
+"""
+
+from bisect import bisect_right
+
+import numpy as np
+
+
+class WeeklyDataStore:
+    """
+    Read-only, week-indexed container for the agent's input tables.
+
+    Behaves like the plain data dictionary returned by load_data()
+    (store["campaigns"] returns the full table), and additionally hands out
+    week slices and history-up-to-week slices in O(1).
+
+    A store built from a week window (main.load_window) only holds those
+    weeks plus the earlier rows trend analysis needs; its history_summary
+    then answers weeks_above_median over the full history.
+    """
+
+    def __init__(self, data, history_summary=None):
+        """
+        Args:
+            data: Dictionary of DataFrames (campaigns, ad_groups, audiences)
+            history_summary: Optional HistorySummary of every week's campaign ROAS
+        """
+        self.history_summary = history_summary
+        self._tables = {}
+        self._week_bounds = {}
+        self._weeks = {}
+
+        for key, df in data.items():
+            if df.empty or 'week' not in df.columns:
+                self._tables[key] = df
+                self._week_bounds[key] = {}
+                self._weeks[key] = []
+                continue
+
+            # Stable sort keeps the source order of rows within each week,
+            # so week slices list entities exactly as the CSVs do
+            table = df.sort_values('week', kind='stable').reset_index(drop=True)
+            weeks = table['week'].to_numpy()
+            unique_weeks, starts = np.unique(weeks, return_index=True)
+            stops = np.append(starts[1:], len(table))
+
+            self._tables[key] = table
+            self._week_bounds[key] = {
+                int(week): (int(start), int(stop))
+                for week, start, stop in zip(unique_weeks, starts, stops)
+            }
+            self._weeks[key] = list(self._week_bounds[key])
+
+    def __getitem__(self, key):
+        return self._tables[key]
+
+    def __contains__(self, key):
+        return key in self._tables
+
+    def keys(self):
+        return self._tables.keys()
+
+    def items(self):
+        return self._tables.items()
+
+    def get(self, key, default=None):
+        return self._tables.get(key, default)
+
+    def weeks(self, key="campaigns"):
+        """Returns the sorted list of weeks present in a table."""
+        return self._weeks.get(key, [])
+
+    def max_week(self, key="campaigns"):
+        """Returns the latest week present in a table (None if empty)."""
+        weeks = self.weeks(key)
+        return weeks[-1] if weeks else None
+
+    def week(self, key, week):
+        """Returns the rows of a single week (empty DataFrame if absent)."""
+        bounds = self._week_bounds[key].get(int(week))
+        if bounds is None:
+            return self._tables[key].iloc[0:0]
+        return self._tables[key].iloc[bounds[0]:bounds[1]]
+
+    def history(self, key, end_week):
+        """Returns all rows up to and including end_week."""
+        weeks = self.weeks(key)
+        last = bisect_right(weeks, end_week) - 1
+        if last < 0:
+            return self._tables[key].iloc[0:0]
+        return self._tables[key].iloc[:self._week_bounds[key][weeks[last]][1]]
+
+
+class HistorySummary:
+    """
+    One metric of every entity over every week of a table, grouped by entity
+    (read from the table cache's window index).
+    """
+
+    def __init__(self, ids, offsets, values):
+        """
+        Args:
+            ids: Unique entity ids
+            offsets: Start of each entity's segment in values
+            values: Metric values, grouped by entity in the order of ids
+        """
+        self.ids = ids
+        self.offsets = offsets
+        self.values = values
+
+    def count_above(self, threshold):
+        """
+        Counts, per entity, the weeks whose value is strictly above threshold
+        (same result as analytics_enricher.count_weeks_above on the full table).
+
+        Returns:
+            Dictionary mapping entity_id to its count (entities with none are omitted)
+        """
+        if len(self.ids) == 0:
+            return {}
+        counts = np.add.reduceat(self.values > threshold, self.offsets, dtype=np.int64)
+        return {entity_id: count for entity_id, count in zip(self.ids.tolist(), counts.tolist()) if count}
+
+
+def as_data_store(data):
+    """Wraps a data dictionary in a WeeklyDataStore (no-op if already one)."""
+    if isinstance(data, WeeklyDataStore):
+        return data
+    return WeeklyDataStore(data)
@@ -26,38 +26,35 @@ class Executor:
         min_budget = policy_loader.get_value('budget', 'min_budget', default=100.0)
         max_cap_factor = policy_loader.get_value('budget', 'max_increase_cap_factor', default=1.30)
         
-        # 2. Rank campaigns by ROAS
+        # 2. Rank campaigns by ROAS (positions into campaigns_df, best first)
         # Campaigns with NaN ROAS are treated as low-performing (pushed to the bottom)
-        ranked_campaigns = campaigns_df.sort_values(by='roas', ascending=False, na_position='last')
+        order = campaigns_df['roas'].reset_index(drop=True).sort_values(ascending=False, na_position='last').index.to_numpy()
         
         # 3. Determine split point (top 50% vs bottom 50%)
-        split_point = len(ranked_campaigns) // 2
-        
-        # 4. Apply actions
-        for i, (campaign_id, row) in enumerate(ranked_campaigns.iterrows()):
-            current_budget = row['weekly_budget_allocated']
-            action_type = ""
-            new_budget = current_budget
-
-            if i < split_point:
-                # Top 50%: Increase Budget
-                action_type = "increase_budget"
-                new_budget = current_budget * (1 + increase_factor)
-                # Constraint: Cap increase
-                max_budget = current_budget * max_cap_factor
-                new_budget = min(new_budget, max_budget)
-            else:
-                # Bottom 50%: Decrease Budget
-                action_type = "decrease_budget"
-                new_budget = current_budget * (1 - decrease_factor)
-                # Constraint: Minimum budget
-                new_budget = max(new_budget, min_budget)
-            
-            # 5. Apply and Log
-            if new_budget != current_budget:
-                campaigns_df.loc[campaign_id, 'weekly_budget_allocated'] = new_budget
-                agent_logger.log_numeric_change(campaign_id, 'weekly_budget_allocated', current_budget, new_budget)
-                agent_logger.log_action(action_type, campaign_id, {"old_budget": current_budget, "new_budget": new_budget})
+        split_point = len(order) // 2
+        is_top = np.zeros(len(order), dtype=bool)
+        is_top[order[:split_point]] = True
+        
+        # 4. Compute every new budget at once
+        current_budget = campaigns_df['weekly_budget_allocated'].to_numpy(dtype=float)
+        with np.errstate(invalid='ignore'):
+            # Top 50%: Increase Budget, capped at max_cap_factor
+            increased = np.minimum(current_budget * (1 + increase_factor), current_budget * max_cap_factor)
+            # Bottom 50%: Decrease Budget, floored at min_budget
+            decreased = np.maximum(current_budget * (1 - decrease_factor), min_budget)
+        new_budget = np.where(is_top, increased, decreased)
+        
+        # 5. Apply and Log (in ranking order, NaN budgets count as changed)
+        changed = new_budget != current_budget
+        if changed.any():
+            campaigns_df['weekly_budget_allocated'] = np.where(changed, new_budget, current_budget)
+            logged = order[changed[order]]
+            campaign_ids = campaigns_df.index.to_numpy()[logged]
+            agent_logger.log_numeric_changes(campaign_ids, 'weekly_budget_allocated', current_budget[logged], new_budget[logged])
+            agent_logger.log_actions(
+                np.where(is_top[logged], "increase_budget", "decrease_budget"), campaign_ids,
+                {"old_budget": current_budget[logged], "new_budget": new_budget[logged]}
+            )
                 
         return campaigns_df.reset_index()
 
@@ -70,42 +67,54 @@ class Executor:
         decrease_factor = policy_loader.get_value('bid', 'decrease_factor', default=0.10)
         min_cpc = policy_loader.get_value('bid', 'min_cpc', default=0.5)
         
-        for action in decisions.get("ad_group_bid_actions", []):
-            ad_group_id = action["ad_group_id"]
-            action_type = action["type"]
-            
-            if ad_group_id in ad_groups_df.index:
-                current_bid = ad_groups_df.loc[ad_group_id, 'avg_bid']
-                new_bid = current_bid
-                
-                if action_type == "raise_bid":
-                    new_bid = current_bid * (1 + increase_factor)
-                
-                elif action_type == "lower_bid":
-                    new_bid = current_bid * (1 - decrease_factor)
-                    # Constraint: Enforce minimum bid
-                    new_bid = max(new_bid, min_cpc)
-                
-                if new_bid != current_bid:
-                    ad_groups_df.loc[ad_group_id, 'avg_bid'] = new_bid
-                    agent_logger.log_numeric_change(ad_group_id, 'avg_bid', current_bid, new_bid)
-                    agent_logger.log_action(action_type, ad_group_id, {"old_bid": current_bid, "new_bid": new_bid})
+        # 1. Join the decisions onto the ad groups (unknown ids are skipped)
+        actions = _decision_frame(decisions.get("ad_group_bid_actions", []), "ad_group_id")
+        actions["row"] = ad_groups_df.index.get_indexer(pd.Index(actions["ad_group_id"]))
+        actions = actions[actions["row"] >= 0]
+        if actions.empty:
+            return ad_groups_df.reset_index()
+        
+        bids = ad_groups_df['avg_bid'].to_numpy(dtype=float, copy=True)
+        raise_bid = (actions["type"] == "raise_bid").to_numpy()
+        lower_bid = (actions["type"] == "lower_bid").to_numpy()
+        rows = actions["row"].to_numpy()
+        
+        # 2. Apply the actions; repeated actions on one ad group compound, so
+        #    the n-th action of every ad group is applied in round n
+        occurrence = actions.groupby("row", sort=False).cumcount().to_numpy()
+        old_bid = np.empty(len(actions))
+        new_bid = np.empty(len(actions))
+        for n in range(occurrence.max() + 1):
+            batch = occurrence == n
+            current_bid = bids[rows[batch]]
+            with np.errstate(invalid='ignore'):
+                updated = np.where(raise_bid[batch], current_bid * (1 + increase_factor), current_bid)
+                # Constraint: Enforce minimum bid
+                updated = np.where(lower_bid[batch], np.maximum(current_bid * (1 - decrease_factor), min_cpc), updated)
+            old_bid[batch] = current_bid
+            new_bid[batch] = updated
+            bids[rows[batch]] = updated
+        
+        # 3. Write back and log every change in decision order
+        changed = new_bid != old_bid
+        if changed.any():
+            ad_groups_df['avg_bid'] = bids
+            logged = actions[changed]
+            agent_logger.log_numeric_changes(logged["ad_group_id"], 'avg_bid', old_bid[changed], new_bid[changed])
+            agent_logger.log_actions(logged["type"], logged["ad_group_id"], {"old_bid": old_bid[changed], "new_bid": new_bid[changed]})
                     
         return ad_groups_df.reset_index()
 
     def _apply_audience_suppression(self, audiences_df, decisions):
         """Applies audience suppression/activation actions."""
         
-        for action in decisions.get("audience_targeting_actions", []):
-            audience_id = action["audience_id"]
-            action_type = action["type"]
-            
-            if action_type == "suppress":
-                # For simplicity, we'll just mark the audience for suppression
-                if audience_id in audiences_df['audience_id'].values:
-                    # In a real system, this would update a suppression flag in the DB
-                    # Here, we log the action and assume the prompt builder uses this logic
-                    agent_logger.log_action(action_type, audience_id)
+        actions = _decision_frame(decisions.get("audience_targeting_actions", []), "audience_id")
+        
+        # For simplicity, we'll just mark the audience for suppression
+        # In a real system, this would update a suppression flag in the DB
+        # Here, we log the action and assume the prompt builder uses this logic
+        suppressed = actions[(actions["type"] == "suppress") & actions["audience_id"].isin(audiences_df['audience_id'])]
+        agent_logger.log_actions("suppress", suppressed["audience_id"])
             
         # The executor does not modify the audience dataframe for suppression in this version,
         # as the logic is handled by the prompt builder/LLM based on the state.
@@ -210,8 +219,8 @@ class Executor:
         # 5. Log final performance metrics (simulated) and end step
         # For this version, we log the new budgets/bids as the key change
         agent_logger.log_final_performance({
-            "campaigns_modified": optimized_campaigns_df[['campaign_id', 'weekly_budget_allocated']].to_dict(orient='records'),
-            "ad_groups_modified": optimized_ad_groups_df[['ad_group_id', 'avg_bid']].to_dict(orient='records')
+            "campaigns_modified": _records(optimized_campaigns_df, 'campaign_id', 'weekly_budget_allocated'),
+            "ad_groups_modified": _records(optimized_ad_groups_df, 'ad_group_id', 'avg_bid')
         })
         agent_logger.end_step()
         
@@ -221,4 +230,20 @@ class Executor:
             "ad_groups": optimized_ad_groups_df,
             "audiences": optimized_audiences_df,
             "latest_week": current_week # Use current_week
-        }
\ No newline at end of file
+        }
+
+
+def _decision_frame(actions, id_column):
+    """Builds a frame of (id_column, type) from a list of LLM action dicts."""
+    return pd.DataFrame({
+        id_column: pd.Series([action[id_column] for action in actions], dtype=object),
+        "type": pd.Series([action["type"] for action in actions], dtype=object)
+    })
+
+
+def _records(df, id_column, value_column):
+    """Same as df[[id_column, value_column]].to_dict(orient='records'), built column-wise."""
+    return [
+        {id_column: entity_id, value_column: value}
+        for entity_id, value in zip(df[id_column].tolist(), df[value_column].tolist())
+    ]
@@ -0,0 +1,200 @@
+"""
+Incremental Enrichment Module - Week-over-week analytics enrichment that
+carries rolling state forward instead of rescanning the full history.
+
+Produces the same enriched-state shape as enrich_state_with_analytics, but
+each week only touches that week's rows plus small per-entity buffers, so
+the cost of a step does not grow with the length of the history.
+"""
+
+import json
+import os
+from bisect import bisect_right, insort
+
+import pandas as pd
+from backend.logic.analytics_enricher import (
+    enrich_campaigns,
+    enrich_ad_groups,
+    enrich_audiences,
+    generate_portfolio_summary
+)
+from backend.logic.data_store import as_data_store
+
+# Entity id column and trend metrics tracked for each table
+TREND_METRICS = {
+    "campaigns": ("campaign_id", ["roas"]),
+    "ad_groups": ("ad_group_id", ["roas"]),
+    "audiences": ("audience_id", ["avg_ctr", "fatigue_score"])
+}
+
+# Trend analysis only ever looks at the last 3 observations of an entity
+TRAILING_WEEKS = 3
+
+# Version of the saved buffer format (see IncrementalEnricher.save)
+STATE_VERSION = 1
+
+
+class IncrementalEnricher:
+    """
+    Enriches weekly states in order, keeping per-entity rolling buffers:
+    - the last 3 observations of every trend metric (momentum, averages,
+      volatility and consistency are computed from these alone)
+    - every campaign's past ROAS values, kept sorted, so weeks_above_median
+      is a binary search against the current week's median
+
+    Note: weeks_above_median counts the weeks seen so far. The batch
+    enrich_state_with_analytics counts over every loaded week, including
+    weeks after current_week, so the two only agree on the latest week.
+    """
+
+    def __init__(self):
+        self.last_week = None
+        self._trailing = {}
+        self._roas_history = {}
+
+    def save(self, path, sources=None):
+        """
+        Writes the rolling buffers to a JSON file (temporary file + rename),
+        so a later process can continue with the next week.
+
+        Args:
+            path: Output file
+            sources: Optional fingerprint of the input data the buffers were
+                built from, returned again by load()
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        payload = {
+            "state_version": STATE_VERSION,
+            "last_week": self.last_week,
+            "sources": sources,
+            "trailing": {key: {column: df[column].tolist() for column in df.columns} for key, df in self._trailing.items()},
+            # JSON object keys are strings, so campaign ids are kept in pairs
+            "roas_history": [[campaign_id, values] for campaign_id, values in self._roas_history.items()]
+        }
+        tmp_path = f"{path}.partial"
+        with open(tmp_path, 'w') as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Restores an enricher written by save().
+
+        Returns:
+            (enricher, sources), or (None, None) if the file is missing,
+            unreadable or from another format version
+        """
+        try:
+            with open(path) as f:
+                payload = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None, None
+        if payload.get("state_version") != STATE_VERSION:
+            return None, None
+
+        enricher = cls()
+        enricher.last_week = payload["last_week"]
+        enricher._trailing = {key: pd.DataFrame(columns) for key, columns in payload["trailing"].items()}
+        # Sorted without NaN (buffers saved before NaN values were skipped may hold some)
+        enricher._roas_history = {
+            campaign_id: sorted(value for value in values if value == value)
+            for campaign_id, values in payload["roas_history"]
+        }
+        return enricher, payload.get("sources")
+
+    def advance(self, week_frames, week):
+        """
+        Folds one week's rows into the rolling buffers.
+
+        Args:
+            week_frames: Dictionary of single-week DataFrames (campaigns, ad_groups, audiences)
+            week: Week number of the rows (must be later than the last week seen)
+        """
+        if self.last_week is not None and week <= self.last_week:
+            raise ValueError(f"Week {week} already processed (last week: {self.last_week}). Weeks must be fed in order.")
+
+        for key, (id_column, metrics) in TREND_METRICS.items():
+            rows = week_frames[key][[id_column, 'week'] + metrics]
+            previous = self._trailing.get(key)
+            if previous is not None:
+                rows = pd.concat([previous, rows], ignore_index=True)
+            self._trailing[key] = rows.groupby(id_column, sort=False).tail(TRAILING_WEEKS)
+
+        # NaN would break the sort order bisect relies on, and never counts
+        # as above the median in the batch path either
+        campaigns_df = week_frames['campaigns']
+        for campaign_id, roas in zip(campaigns_df['campaign_id'].tolist(), campaigns_df['roas'].tolist()):
+            if roas == roas:
+                insort(self._roas_history.setdefault(campaign_id, []), roas)
+
+        self.last_week = week
+
+    def enrich(self, state, all_weeks_data, current_week):
+        """
+        Enriches the current week's state, advancing the buffers through any
+        weeks not yet seen up to and including current_week.
+
+        Args:
+            state: Current week's state dictionary
+            all_weeks_data: WeeklyDataStore or dictionary of all DataFrames
+            current_week: Current week number
+
+        Returns:
+            Enriched state with analytics fields added
+        """
+        store = as_data_store(all_weeks_data)
+
+        for week in store.weeks('campaigns'):
+            if (self.last_week is None or week > self.last_week) and week <= current_week:
+                self.advance({key: store.week(key, week) for key in TREND_METRICS}, week)
+
+        if self.last_week != current_week:
+            raise ValueError(f"Cannot enrich week {current_week} after week {self.last_week}. Weeks must be fed in order.")
+
+        campaigns_df = store.week('campaigns', current_week)
+        ad_groups_df = store.week('ad_groups', current_week)
+        audiences_df = store.week('audiences', current_week)
+
+        # Weeks above median: count of past values strictly above this week's median
+        median_roas = campaigns_df['roas'].median()
+        weeks_above_median = {}
+        for campaign_id in campaigns_df['campaign_id'].tolist():
+            history = self._roas_history.get(campaign_id, [])
+            weeks_above_median[campaign_id] = len(history) - bisect_right(history, median_roas)
+
+        state['campaigns'] = enrich_campaigns(
+            state['campaigns'],
+            campaigns_df,
+            current_week,
+            current_week_df=campaigns_df,
+            history_df=self._trailing['campaigns'],
+            weeks_above_median=weeks_above_median
+        )
+
+        state['ad_groups'] = enrich_ad_groups(
+            state['ad_groups'],
+            ad_groups_df,
+            current_week,
+            current_week_df=ad_groups_df,
+            history_df=self._trailing['ad_groups']
+        )
+
+        state['audiences'] = enrich_audiences(
+            state['audiences'],
+            audiences_df,
+            current_week,
+            current_week_df=audiences_df,
+            history_df=self._trailing['audiences']
+        )
+
+        state['portfolio_analytics'] = generate_portfolio_summary(
+            state['campaigns'],
+            campaigns_df,
+            current_week,
+            current_week_df=campaigns_df
+        )
+
+        return state
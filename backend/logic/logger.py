@@ -1,4 +1,5 @@
 import json
+import os
 from datetime import datetime
 from backend.logic.policy_loader import policy_loader
 
@@ -6,12 +7,25 @@ class AgentLogger:
     """
     Handles structured logging for the agent's run cycle.
     Logs are stored in a list and can be retrieved as a structured object.
+    Each finished step is also appended to the audit log file (JSON Lines),
+    so the full trail is written once instead of being re-embedded per week.
     """
     def __init__(self):
         self.log_history = []
         self.trace_mode = policy_loader.get_value('logging', 'trace_mode', default=False)
+        self.audit_log_file = policy_loader.get_value('logging', 'audit_log_file', default=None)
         self.current_step_log = {}
 
+    def reset(self):
+        """Clears the in-memory history and truncates the audit log file for a new run."""
+        self.log_history = []
+        self.current_step_log = {}
+        if self.audit_log_file:
+            directory = os.path.dirname(self.audit_log_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            open(self.audit_log_file, 'w').close()
+
     def start_step(self, week):
         """Initializes the log for a new simulation step."""
         self.current_step_log = {
@@ -55,18 +69,85 @@ class AgentLogger:
                 "new": new_value
             }
 
+    def log_actions(self, action_types, target_ids, details=None):
+        """
+        Records many actions at once (same entries as repeated log_action calls).
+
+        Args:
+            action_types: One action type for every target, or a sequence aligned with target_ids
+            target_ids: Sequence of target ids
+            details: Optional {key: sequence aligned with target_ids} added to every entry
+        """
+        if not self.trace_mode:
+            return
+        target_ids = _to_list(target_ids)
+        if isinstance(action_types, str):
+            action_types = [action_types] * len(target_ids)
+        else:
+            action_types = _to_list(action_types)
+        columns = {key: _to_list(values) for key, values in (details or {}).items()}
+
+        entries = self.current_step_log["actions_executed"]
+        for i, (action_type, target_id) in enumerate(zip(action_types, target_ids)):
+            log_entry = {"type": action_type, "target_id": target_id}
+            for key, values in columns.items():
+                log_entry[key] = values[i]
+            entries.append(log_entry)
+
+    def log_numeric_changes(self, target_ids, field, old_values, new_values):
+        """Records a numeric modification of one field for many targets at once."""
+        if not self.trace_mode:
+            return
+        modifications = self.current_step_log["numeric_modifications"]
+        for target_id, old_value, new_value in zip(_to_list(target_ids), _to_list(old_values), _to_list(new_values)):
+            modifications[f"{target_id}_{field}"] = {
+                "field": field,
+                "old": old_value,
+                "new": new_value
+            }
+
     def log_final_performance(self, metrics):
         """Records the final simulated performance metrics."""
         self.current_step_log["final_performance_metrics"] = metrics
         
     def end_step(self):
-        """Finalizes the current step log and adds it to history."""
+        """Finalizes the current step log, adds it to history and appends it to the audit log file."""
         self.log_history.append(self.current_step_log)
+        if self.audit_log_file:
+            directory = os.path.dirname(self.audit_log_file)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.audit_log_file, 'a') as f:
+                f.write(json.dumps(self.current_step_log, default=_to_json) + "\n")
         self.current_step_log = {}
 
+    def replay_steps(self, steps):
+        """Re-records finished steps (e.g. restored from a checkpoint) in the history and the audit log file."""
+        for step in steps:
+            self.current_step_log = step
+            self.end_step()
+
     def get_history(self):
         """Returns the full log history."""
         return self.log_history
 
+    def get_last_step(self):
+        """Returns the most recently finished step as a one-entry list (empty if none)."""
+        return self.log_history[-1:]
+
+
+def _to_list(values):
+    """Converts arrays/Series/Index to a list of plain Python values."""
+    if hasattr(values, "tolist"):
+        return values.tolist()
+    return list(values)
+
+
+def _to_json(obj):
+    """Converts numpy scalars/arrays in log entries to plain Python values."""
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    return str(obj)
+
 # Global instance for easy access
 agent_logger = AgentLogger()
\ No newline at end of file
@@ -0,0 +1,189 @@
+"""
+Pipeline Metrics - Lightweight span timers for the agent pipeline.
+
+Each span records wall time, CPU time, entity counts and (for LLM calls)
+prompt/completion tokens. Spans are aggregated per stage name, written to a
+per-run metrics file and printed as a summary table. When disabled, span()
+hands back a shared no-op object, so instrumented code pays one attribute
+check per call.
+"""
+
+import functools
+import json
+import os
+import time
+from datetime import datetime, timezone
+from backend.logic.policy_loader import policy_loader
+
+# Counters every stage reports (missing ones stay 0)
+COUNTERS = ("entities", "prompt_tokens", "completion_tokens", "calls")
+
+
+class _NullSpan:
+    """Returned by span() when metrics are disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def add(self, **counts):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """One timed execution of a stage."""
+
+    def __init__(self, recorder, name, counts):
+        self.recorder = recorder
+        self.name = name
+        self.counts = counts
+
+    def __enter__(self):
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.recorder._record(
+            self.name,
+            time.perf_counter() - self._wall_start,
+            time.process_time() - self._cpu_start,
+            self.counts,
+            failed=exc_type is not None
+        )
+        return False
+
+    def add(self, **counts):
+        """Adds to this span's counters (e.g. tokens once a response arrives)."""
+        for key, value in counts.items():
+            self.counts[key] = self.counts.get(key, 0) + (value or 0)
+
+
+class PipelineMetrics:
+    """
+    Collects per-stage timings for one run.
+
+    Usage:
+        with pipeline_metrics.span("agent.parse", entities=len(ad_groups)) as span:
+            ...
+            span.add(prompt_tokens=usage.prompt_tokens)
+    """
+
+    def __init__(self, enabled=False, output_file=None):
+        self.enabled = enabled
+        self.output_file = output_file
+        self.reset()
+
+    @classmethod
+    def from_policy(cls):
+        """Builds the recorder from the 'metrics' section of policy.json."""
+        return cls(
+            enabled=policy_loader.get_value('metrics', 'enabled', default=False),
+            output_file=policy_loader.get_value('metrics', 'output_file', default="metrics/run_metrics.json")
+        )
+
+    def reset(self):
+        """Clears all recorded spans and starts a new run."""
+        self.started = datetime.now(timezone.utc).isoformat()
+        self.current_week = None
+        self.stages = {}
+        self.spans = []
+
+    def start_week(self, week):
+        """Tags subsequent spans with the week being processed."""
+        self.current_week = int(week)
+
+    def span(self, name, **counts):
+        """Returns a context manager timing one execution of a stage."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return Span(self, name, dict(counts))
+
+    def timed(self, name, count_arg=0):
+        """
+        Decorator timing every call of a function as a stage.
+
+        Args:
+            name: Stage name
+            count_arg: Index of the positional argument whose len() is recorded
+                as the entity count (None to skip)
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                entities = len(args[count_arg]) if count_arg is not None and len(args) > count_arg else 0
+                with Span(self, name, {"entities": entities}):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _record(self, name, wall_s, cpu_s, counts, failed=False):
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = {"count": 0, "failed": 0, "wall_s": 0.0, "cpu_s": 0.0, "max_wall_s": 0.0}
+            stage.update({key: 0 for key in COUNTERS})
+        stage["count"] += 1
+        stage["failed"] += int(failed)
+        stage["wall_s"] += wall_s
+        stage["cpu_s"] += cpu_s
+        stage["max_wall_s"] = max(stage["max_wall_s"], wall_s)
+        for key, value in counts.items():
+            stage[key] = stage.get(key, 0) + value
+
+        self.spans.append({
+            "stage": name,
+            "week": self.current_week,
+            "wall_s": round(wall_s, 6),
+            "cpu_s": round(cpu_s, 6),
+            **counts,
+            **({"failed": True} if failed else {})
+        })
+
+    def summary(self):
+        """Returns per-stage totals with mean latency and entity throughput."""
+        summary = {}
+        for name, stage in self.stages.items():
+            summary[name] = {
+                **{key: round(value, 6) if isinstance(value, float) else value for key, value in stage.items()},
+                "mean_wall_s": round(stage["wall_s"] / stage["count"], 6),
+                "entities_per_s": round(stage["entities"] / stage["wall_s"], 1) if stage["wall_s"] > 0 else 0.0
+            }
+        return summary
+
+    def save(self, path=None):
+        """Writes the run's summary and individual spans as JSON; returns the path."""
+        path = path or self.output_file
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({
+                "started": self.started,
+                "finished": datetime.now(timezone.utc).isoformat(),
+                "stages": self.summary(),
+                "spans": self.spans
+            }, f, indent=4)
+        return path
+
+    def format_table(self):
+        """Renders the per-stage summary as a fixed-width text table."""
+        header = f"{'Stage':<30}{'Calls':>7}{'Wall (s)':>11}{'CPU (s)':>10}{'Mean (ms)':>11}{'Entities':>10}{'Tokens in/out':>17}"
+        lines = [header, "-" * len(header)]
+        for name, stage in self.summary().items():
+            tokens = f"{stage['prompt_tokens']}/{stage['completion_tokens']}" if stage['prompt_tokens'] or stage['completion_tokens'] else "-"
+            lines.append(
+                f"{name:<30}{stage['count']:>7}{stage['wall_s']:>11.3f}{stage['cpu_s']:>10.3f}"
+                f"{stage['mean_wall_s'] * 1000:>11.1f}{stage['entities']:>10}{tokens:>17}"
+            )
+        return "\n".join(lines)
+
+
+# Global instance for easy access
+pipeline_metrics = PipelineMetrics.from_policy()
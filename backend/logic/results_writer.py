@@ -0,0 +1,402 @@
+"""
+Streaming Results Writers - Write the run's output one week at a time.
+
+Each week's history entry is serialized and flushed as soon as it is
+complete, so memory stays bounded by a single week and a crash keeps every
+finished week on disk. StreamingResultsWriter produces the single
+results.json; ShardedResultsWriter produces a manifest plus one file per
+week for the dashboard to load lazily.
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+
+
+class NumpyEncoder(json.JSONEncoder):
+    """Custom encoder for numpy data types."""
+    def default(self, obj):
+        if isinstance(obj, (np.integer, np.floating, np.bool_)):
+            return obj.item()
+        if isinstance(obj, np.ndarray):
+            return obj.tolist()
+        return super(NumpyEncoder, self).default(obj)
+
+
+class StreamingResultsWriter:
+    """
+    Streams {"latest_week", "campaign_history": [...], "final_state_snapshot",
+    "final_recommendations"} to disk.
+
+    With indent=4 the file is byte-identical to json.dump(..., indent=4) of
+    the full structure; indent=None writes compact JSON with one history
+    entry per line.
+
+    Usage:
+        with StreamingResultsWriter(path, latest_week) as writer:
+            for entry in weeks:
+                writer.write_week(entry)
+            writer.finalize(final_state_snapshot, final_recommendations)
+    """
+
+    def __init__(self, path, latest_week, indent=4):
+        """
+        Args:
+            path: Final output path (e.g. frontend/results.json)
+            latest_week: Value of the top-level latest_week field
+            indent: Spaces per indentation level, or None for compact output
+        """
+        self.path = path
+        self.partial_path = f"{path}.partial"
+        self.indent = indent
+        self.weeks_written = 0
+        self.finalized = False
+        self._has_entries = False
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.partial_path, 'w')
+        self._write_field("latest_week", latest_week, first=True)
+        self._file.write(self._separator() + self._key("campaign_history") + "[")
+
+    @classmethod
+    def resume(cls, path, latest_week):
+        """
+        Reopens a finalized results file so more weeks can be appended.
+
+        The existing history entries are copied byte for byte (not parsed)
+        into a new .partial file, so the cost does not depend on how much
+        JSON they hold; the closing fields are written again by finalize().
+        The file's own indentation is kept.
+
+        Args:
+            path: Existing results file written by this class
+            latest_week: New value of the top-level latest_week field
+        """
+        with open(path, 'rb') as f:
+            head = f.read(4096).decode('utf-8')
+            indent = None
+            if head.startswith("{\n"):
+                indent = len(head[2:]) - len(head[2:].lstrip(" "))
+
+            writer = cls.__new__(cls)
+            writer.indent = indent
+            start_token = (writer._key("campaign_history") + "[").encode('utf-8')
+            end_token = (writer._separator() + writer._key("final_state_snapshot")).encode('utf-8')
+            start = head.encode('utf-8').find(start_token)
+            end = _rfind_in_file(f, end_token)
+            if start < 0 or end < 0:
+                raise ValueError(f"{path} is not a finalized results file")
+            start += len(start_token)
+
+            # The history ends with "\n<pad>]" after entries, or directly "]"
+            closing = f"\n{writer._pad(1)}]".encode('utf-8')
+            has_entries = end - start > 1
+            stop = end - len(closing) if has_entries else end - 1
+
+            writer = cls(path, latest_week, indent=indent)
+            writer._file.flush()
+            f.seek(start)
+            remaining = stop - start
+            while remaining > 0:
+                chunk = f.read(min(remaining, 1 << 20))
+                writer._file.buffer.write(chunk)
+                remaining -= len(chunk)
+            writer._has_entries = has_entries
+        return writer
+
+    @staticmethod
+    def read_latest_week(path):
+        """Returns the latest_week field of an existing results file (read from its first bytes only)."""
+        with open(path, 'rb') as f:
+            head = f.read(4096).decode('utf-8', errors='ignore')
+        key = head.find(json.dumps("latest_week"))
+        if key < 0:
+            raise ValueError(f"{path} is not a results file")
+        value, _ = json.JSONDecoder().raw_decode(head[head.index(":", key) + 1:].lstrip())
+        return value
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # On failure the .partial file is kept with every completed week
+        self.close()
+        return False
+
+    def write_week(self, entry):
+        """Appends one week's history entry and flushes it to disk."""
+        text = self._dumps(entry, depth=2)
+        prefix = "," if self._has_entries else ""
+        self._file.write(f"{prefix}\n{self._pad(2)}{text}")
+        self._file.flush()
+        self.weeks_written += 1
+        self._has_entries = True
+
+    def finalize(self, final_state_snapshot, final_recommendations):
+        """Writes the closing fields and moves the file into place."""
+        if self._has_entries:
+            self._file.write(f"\n{self._pad(1)}]")
+        else:
+            self._file.write("]")
+        self._write_field("final_state_snapshot", final_state_snapshot)
+        self._write_field("final_recommendations", final_recommendations)
+        self._file.write("\n}" if self.indent is not None else "}")
+        self._file.close()
+        os.replace(self.partial_path, self.path)
+        self.finalized = True
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def _write_field(self, key, value, first=False):
+        if first:
+            self._file.write("{" + ("\n" if self.indent is not None else ""))
+        else:
+            self._file.write(self._separator())
+        self._file.write(self._key(key) + self._dumps(value, depth=1))
+
+    def _key(self, key):
+        return f"{self._pad(1)}{json.dumps(key)}: "
+
+    def _separator(self):
+        return ",\n" if self.indent is not None else ", "
+
+    def _pad(self, depth):
+        return " " * (self.indent * depth) if self.indent is not None else ""
+
+    def _dumps(self, value, depth):
+        """Serializes value as it would appear nested `depth` levels deep."""
+        text = json.dumps(value, indent=self.indent, cls=NumpyEncoder)
+        if self.indent is None or depth == 0:
+            return text
+        return text.replace("\n", "\n" + self._pad(depth))
+
+
+class ShardedResultsWriter:
+    """
+    Writes the run as one JSON file per week plus a small manifest, so the
+    dashboard can render from the manifest and fetch weeks on demand.
+
+    Layout of output_dir:
+        manifest.json   latest week, one entry per week (shard file, entity
+                        and action counts, summary KPIs)
+        series.json     per-campaign ROAS/CVR across weeks for the charts
+        weeks/week_N.json   the full campaign_history entry for week N
+
+    The final_state_snapshot/final_recommendations of results.json are the
+    last week's shard (manifest "final_week"). Shared interface with
+    StreamingResultsWriter: write_week(), finalize(), close().
+
+    Like the single file's .partial, a new run is written to a staging
+    directory (<output_dir>.partial) that replaces output_dir only in
+    finalize(), so a failed run never touches the last good output.
+    """
+
+    MANIFEST_VERSION = 1
+
+    def __init__(self, output_dir, latest_week, indent=None, staged=True):
+        """
+        Args:
+            output_dir: Directory receiving the manifest and week shards
+            latest_week: Value of the manifest's latest_week field
+            indent: Indentation of the week shards (None = compact)
+            staged: Write to <output_dir>.partial and publish it in finalize();
+                when False (resume), new shards go straight into output_dir
+                and only finalize() writes its manifest
+        """
+        self.output_dir = output_dir
+        self.partial_path = f"{output_dir}.partial" if staged else output_dir
+        self.staged = staged
+        self.latest_week = latest_week
+        self.indent = indent
+        self.weeks_written = 0
+        self.finalized = False
+        self._weeks = []
+        self._series = {}
+
+        if staged:
+            shutil.rmtree(self.partial_path, ignore_errors=True)
+        os.makedirs(os.path.join(self.partial_path, "weeks"), exist_ok=True)
+
+    @classmethod
+    def resume(cls, output_dir, latest_week, indent=None):
+        """
+        Reopens a finalized output directory so more weeks can be appended.
+
+        Only the manifest and series are read back; existing week shards are
+        left untouched, and the manifest is only rewritten by finalize(), so
+        a failure leaves the output exactly as it was.
+        """
+        with open(os.path.join(output_dir, "manifest.json")) as f:
+            manifest = json.load(f)
+        with open(os.path.join(output_dir, manifest.get("series_file", "series.json"))) as f:
+            series = json.load(f)
+
+        writer = cls(output_dir, latest_week, indent=indent, staged=False)
+        writer._weeks = manifest["weeks"]
+        writer._series = {campaign["campaign_id"]: campaign for campaign in series["campaigns"]}
+        return writer
+
+    def weeks(self):
+        """Returns the weeks recorded in the manifest so far."""
+        return [w["week"] for w in self._weeks]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def write_week(self, entry):
+        """Writes one week's shard and records its manifest and chart data."""
+        week = int(entry["week"])
+        shard = f"weeks/week_{week}.json"
+        self._write_json(shard, entry, indent=self.indent)
+
+        state = entry["state_snapshot"]
+        self._weeks.append({
+            "week": week,
+            "file": shard,
+            "counts": {key: len(state.get(key, [])) for key in ("campaigns", "ad_groups", "audiences")},
+            "actions": _action_counts(entry["recommendations"]),
+            "kpis": _week_kpis(state.get("campaigns", []))
+        })
+
+        # Chart series, padded with None where a campaign is missing that week
+        index = len(self._weeks) - 1
+        for campaign in state.get("campaigns", []):
+            series = self._series.get(campaign["campaign_id"])
+            if series is None:
+                series = self._series[campaign["campaign_id"]] = {
+                    "campaign_id": campaign["campaign_id"],
+                    "campaign_name": campaign.get("campaign_name"),
+                    "roas": [],
+                    "cvr": []
+                }
+            padding = index - len(series["roas"])
+            series["roas"].extend([None] * padding)
+            series["cvr"].extend([None] * padding)
+            series["roas"].append(campaign.get("roas"))
+            spent = campaign.get("weekly_budget_spent") or 0
+            conversions = campaign.get("weekly_conversions") or 0
+            series["cvr"].append((conversions / spent) * 100 if spent > 0 else 0)
+
+        self.weeks_written += 1
+
+    def finalize(self, final_state_snapshot=None, final_recommendations=None):
+        """
+        Writes the series and the manifest (last, so readers only ever see
+        a manifest whose shards exist).
+
+        The final state and recommendations are the last week's shard; the
+        arguments are accepted for interface compatibility.
+        """
+        self._write_index(complete=True)
+        if self.staged:
+            # Swap the staged run in; the previous output is removed only after
+            previous = f"{self.output_dir}.previous.partial"
+            shutil.rmtree(previous, ignore_errors=True)
+            if os.path.exists(self.output_dir):
+                os.replace(self.output_dir, previous)
+            os.replace(self.partial_path, self.output_dir)
+            shutil.rmtree(previous, ignore_errors=True)
+        self.finalized = True
+
+    def close(self):
+        # After a failure, index the weeks that completed in the staging
+        # directory only; the published output is left as it was
+        if not self.finalized and self.weeks_written and self.staged:
+            self._write_index(complete=False)
+
+    def _write_index(self, complete):
+        for series in self._series.values():
+            padding = len(self._weeks) - len(series["roas"])
+            series["roas"].extend([None] * padding)
+            series["cvr"].extend([None] * padding)
+
+        self._write_json("series.json", {
+            "weeks": [w["week"] for w in self._weeks],
+            "campaigns": list(self._series.values())
+        })
+        self._write_json("manifest.json", {
+            "manifest_version": self.MANIFEST_VERSION,
+            "complete": complete,
+            "latest_week": self.latest_week,
+            "final_week": self._weeks[-1]["week"] if self._weeks else None,
+            "series_file": "series.json",
+            "weeks": self._weeks
+        })
+
+    def _write_json(self, relative_path, value, indent=None):
+        """Writes a JSON file atomically (temporary file + rename)."""
+        path = os.path.join(self.partial_path, relative_path)
+        tmp_path = f"{path}.partial"
+        with open(tmp_path, 'w') as f:
+            json.dump(value, f, indent=indent, cls=NumpyEncoder)
+        os.replace(tmp_path, path)
+
+
+def remove_output(path):
+    """
+    Removes a results file or sharded output directory, so the output of the
+    other output.format cannot shadow a fresh run in the dashboard.
+    """
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def _rfind_in_file(f, token, block_size=1 << 20):
+    """Returns the offset of the last occurrence of token in a binary file (-1 if absent)."""
+    f.seek(0, os.SEEK_END)
+    position = f.tell()
+    tail = b""
+    while position > 0:
+        read_from = max(0, position - block_size)
+        f.seek(read_from)
+        # Keep len(token) - 1 bytes of the previous block for matches across blocks
+        data = f.read(position - read_from) + tail[:len(token) - 1]
+        index = data.rfind(token)
+        if index >= 0:
+            return read_from + index
+        tail = data
+        position = read_from
+    return -1
+
+
+def _action_counts(recommendations):
+    """Counts recommendation types the way main.py's progress line does."""
+    def count(key, action_type):
+        return sum(1 for a in recommendations.get(key, []) if a.get('type') == action_type)
+
+    return {
+        "budget_increase": count("campaign_budget_actions", "increase"),
+        "budget_decrease": count("campaign_budget_actions", "decrease"),
+        "bid_raise": count("ad_group_bid_actions", "raise_bid"),
+        "bid_lower": count("ad_group_bid_actions", "lower_bid"),
+        "audience_activate": count("audience_targeting_actions", "activate"),
+        "audience_suppress": count("audience_targeting_actions", "suppress")
+    }
+
+
+def _week_kpis(campaigns):
+    """Portfolio totals for one week's campaigns."""
+    budget = sum(c.get("weekly_budget_allocated") or 0 for c in campaigns)
+    spent = sum(c.get("weekly_budget_spent") or 0 for c in campaigns)
+    value = sum(c.get("weekly_conversion_value") or 0 for c in campaigns)
+    roas_values = [c["roas"] for c in campaigns if c.get("roas") is not None]
+    return {
+        "total_budget_allocated": round(float(budget), 2),
+        "total_budget_spent": round(float(spent), 2),
+        "total_conversions": int(sum(c.get("weekly_conversions") or 0 for c in campaigns)),
+        "total_conversion_value": round(float(value), 2),
+        "portfolio_roas": round(float(value / spent), 3) if spent else None,
+        "avg_campaign_roas": round(float(sum(roas_values) / len(roas_values)), 3) if roas_values else None
+    }
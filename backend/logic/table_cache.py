@@ -0,0 +1,949 @@
+"""
+Table Cache - Columnar binary cache of the input CSVs.
+
+Each CSV is parsed once with an explicit dtype schema and stored as one .npy
+file per column (string and categorical columns dictionary-encoded as codes +
+categories), so later runs load the arrays directly instead of re-parsing
+text. An entry is reused only while the source file's size and modification
+time (or, with validate = "hash", its SHA-256) still match the ones recorded
+when it was built; otherwise it is rebuilt from the CSV.
+
+With lean dtypes enabled, repeated strings load as categoricals and integer
+columns as int32 where their values fit (see LEAN_SCHEMAS). Rows still
+convert to plain Python str/int/float through to_dict(orient="records").
+
+Entries of week-sorted CSVs also carry a window index, so load_window() can
+memory-map just the rows of a week range:
+- the row range of every week
+- per row, the week of the entity's second previous observation, i.e. how
+  far back trend analysis reaches from that row
+- for campaigns, every week's ROAS grouped by campaign, so
+  weeks_above_median can still count over the full history
+
+With streaming enabled, entries are built from the CSV chunk by chunk
+instead of from one full parse: only the columns the state uses
+(state_manager.STATE_COLUMNS) are read, and rows are appended to per-week
+part files as they arrive, then laid out in week order. Building and
+windowed loading then hold one chunk or one week at a time (plus the ROAS
+summary as compact code/value arrays), so histories larger than memory can
+be processed (unsorted CSVs included).
+
+Usage:
+    python -m backend.logic.table_cache                  # build missing/stale entries
+    python -m backend.logic.table_cache --rebuild        # force a rebuild from the CSVs
+    python -m backend.logic.table_cache --memory-report  # default vs lean dtype memory per column
+    python -m backend.logic.table_cache --clear
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+import pandas as pd
+from backend.logic.data_store import HistorySummary
+from backend.logic.policy_loader import policy_loader
+
+CACHE_VERSION = 2
+
+# Declared column types of the input tables (columns not listed are inferred)
+TABLE_SCHEMAS = {
+    "campaigns": {
+        "campaign_id": "int64", "campaign_name": "str", "objective": "str", "channel": "str",
+        "model_line": "str", "weekly_budget_allocated": "float64", "weekly_budget_spent": "float64",
+        "weekly_impressions": "int64", "weekly_clicks": "int64", "weekly_conversions": "int64",
+        "weekly_conversion_value": "float64", "roas": "float64", "week": "int64"
+    },
+    "ad_groups": {
+        "ad_group_id": "int64", "campaign_id": "int64", "ad_group_name": "str", "audience_id": "str",
+        "channel": "str", "bid_strategy": "str", "avg_bid": "float64", "weekly_budget_allocated": "float64",
+        "weekly_budget_spent": "float64", "impressions": "int64", "clicks": "int64", "conversions": "int64",
+        "conversion_value": "float64", "ctr": "float64", "cvr": "float64", "roas": "float64", "week": "int64"
+    },
+    "audiences": {
+        "audience_id": "str", "audience_name": "str", "segment_type": "str", "intent_score": "int64",
+        "fatigue_score": "float64", "frequency": "float64", "recency_last_engagement": "int64",
+        "avg_ctr": "float64", "avg_cvr": "float64", "model_preference": "str",
+        "location_cluster": "str", "week": "int64"
+    }
+}
+
+# Memory-lean column types applied on load. Floats stay float64: budgets,
+# conversion values and ratios carry more significant digits than float32
+# holds, and would no longer round-trip to the same JSON values.
+LEAN_SCHEMAS = {
+    "campaigns": {
+        "campaign_id": "int32", "campaign_name": "category", "objective": "category", "channel": "category",
+        "model_line": "category", "weekly_impressions": "int32", "weekly_clicks": "int32",
+        "weekly_conversions": "int32", "week": "int32"
+    },
+    "ad_groups": {
+        "ad_group_id": "int32", "campaign_id": "int32", "ad_group_name": "category", "audience_id": "category",
+        "channel": "category", "bid_strategy": "category", "impressions": "int32", "clicks": "int32",
+        "conversions": "int32", "week": "int32"
+    },
+    "audiences": {
+        "audience_id": "category", "audience_name": "category", "segment_type": "category",
+        "intent_score": "int32", "recency_last_engagement": "int32", "model_preference": "category",
+        "location_cluster": "category", "week": "int32"
+    }
+}
+
+# Strings with more distinct values than this share of rows stay plain strings
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+VALIDATION_MODES = ("mtime", "hash")
+
+# Entity column of each table, for the trend lookback of windowed loads
+ENTITY_COLUMNS = {"campaigns": "campaign_id", "ad_groups": "ad_group_id", "audiences": "audience_id"}
+
+# (id column, metric) kept for every week in the window index, for
+# aggregates that span the full history (weeks_above_median)
+SUMMARY_METRICS = {"campaigns": ("campaign_id", "roas")}
+
+# Observations before the current one that trend analysis uses (tail(3))
+LOOKBACK_OBSERVATIONS = 2
+
+# Rows per chunk when a CSV is read in pieces (streamed builds, window scans)
+SCAN_CHUNK_ROWS = 200_000
+
+
+class TableCache:
+    """
+    Disk-backed cache of parsed CSV tables, one directory per source file.
+
+    Every entry directory holds meta.json (source fingerprint and column
+    schema) plus the column arrays. meta.json is written last and entries are
+    swapped in with a rename, so a half-written entry is never loaded.
+    """
+
+    def __init__(self, cache_dir, enabled=True, validate="mtime", lean_dtypes=False,
+                 streaming=False, chunk_rows=SCAN_CHUNK_ROWS):
+        """
+        Args:
+            cache_dir: Directory holding one entry per cached CSV
+            enabled: When False, load() always parses the CSV and stores nothing
+            validate: "mtime" compares source size + modification time;
+                "hash" additionally requires a matching SHA-256 of the file
+            lean_dtypes: Apply LEAN_SCHEMAS (categoricals, int32) to loaded tables
+            streaming: Build entries chunk by chunk from the state's columns
+                only, instead of parsing each CSV in full
+            chunk_rows: Rows per chunk when a CSV is read in pieces
+        """
+        if validate not in VALIDATION_MODES:
+            raise ValueError(f"Unknown table cache validation mode '{validate}'. Expected one of {VALIDATION_MODES}.")
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+        self.validate = validate
+        self.lean_dtypes = lean_dtypes
+        self.streaming = streaming
+        self.chunk_rows = chunk_rows
+        self.hits = 0
+        self.misses = 0
+        self._hashes = {}
+
+    @classmethod
+    def from_policy(cls):
+        """Builds the cache from the 'data_cache' section of policy.json."""
+        return cls(
+            cache_dir=policy_loader.get_value('data_cache', 'cache_dir', default=".cache/tables"),
+            enabled=policy_loader.get_value('data_cache', 'enabled', default=False),
+            validate=policy_loader.get_value('data_cache', 'validate', default="mtime"),
+            lean_dtypes=policy_loader.get_value('data_cache', 'lean_dtypes', default=False),
+            streaming=policy_loader.get_value('data_cache', 'streaming', default=False),
+            chunk_rows=policy_loader.get_value('data_cache', 'chunk_rows', default=SCAN_CHUNK_ROWS)
+        )
+
+    def load(self, path, table=None):
+        """
+        Returns the CSV at path as a DataFrame, from the cache when it is fresh.
+
+        Args:
+            path: Source CSV path
+            table: Schema name (defaults to the file name without extension)
+
+        Raises:
+            FileNotFoundError: If the source CSV does not exist
+        """
+        table = table or os.path.splitext(os.path.basename(path))[0]
+        if not self.enabled:
+            return self._parse(path, table)
+
+        fingerprint = self._fingerprint(path)
+        entry_dir = self._entry_dir(path)
+        meta = self._read_meta(entry_dir)
+        if meta is not None and self._is_fresh(meta, fingerprint, path):
+            try:
+                df = self._read_entry(entry_dir, meta, table)
+                self.hits += 1
+                return df
+            except (OSError, ValueError, KeyError):
+                pass  # Damaged entry: fall through and rebuild it
+
+        df = self._build(entry_dir, path, table, fingerprint)
+        if df is None:
+            df = self._read_entry(entry_dir, self._read_meta(entry_dir), table)
+        return df
+
+    def load_window(self, path, start_week, end_week, table=None):
+        """
+        Loads the rows of weeks start_week..end_week plus, for every entity
+        in them, its last LOOKBACK_OBSERVATIONS rows from earlier weeks
+        (what trend analysis needs), instead of the whole history.
+
+        Through the cache's window index only those rows are read; otherwise
+        (cache disabled or a CSV not sorted by week) the CSV is filtered
+        chunk by chunk.
+
+        Returns:
+            (DataFrame, HistorySummary or None) - the summary covers every
+            week of the file, for tables listed in SUMMARY_METRICS
+
+        Raises:
+            FileNotFoundError: If the source CSV does not exist
+        """
+        table = table or os.path.splitext(os.path.basename(path))[0]
+        entry_dir, meta = self._indexed_entry(path, table)
+        if meta is not None:
+            try:
+                df = _read_window(entry_dir, meta, start_week, end_week)
+                return self._lean_on_read(df, meta, table), _read_summary(entry_dir, meta)
+            except (OSError, ValueError, KeyError):
+                pass  # Damaged index: filter the CSV instead
+
+        df, summary = _scan_window(path, table, start_week, end_week, self.chunk_rows)
+        return (apply_lean_schema(df, table) if self.lean_dtypes else df), summary
+
+    def weeks(self, path, table=None):
+        """Returns the sorted weeks present in a CSV, from the window index when available."""
+        table = table or os.path.splitext(os.path.basename(path))[0]
+        _, meta = self._indexed_entry(path, table)
+        if meta is not None:
+            return [week for week, _, _ in meta["window_index"]["week_bounds"]]
+
+        weeks = set()
+        for chunk in pd.read_csv(path, usecols=['week'], chunksize=self.chunk_rows):
+            weeks.update(chunk['week'].dropna().astype(int).unique().tolist())
+        return sorted(weeks)
+
+    def rebuild(self, path, table=None):
+        """Drops any cached entry for path and builds it again from the CSV."""
+        self.remove(path)
+        return self.load(path, table)
+
+    def remove(self, path):
+        """Removes the cached entry for one source file."""
+        shutil.rmtree(self._entry_dir(path), ignore_errors=True)
+
+    def clear(self):
+        """Removes every cached table."""
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def stats(self):
+        """Returns hit/miss counters and current cache size."""
+        size = 0
+        if os.path.isdir(self.cache_dir):
+            for root, _, files in os.walk(self.cache_dir):
+                size += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+        return {
+            "enabled": self.enabled,
+            "validate": self.validate,
+            "hits": self.hits,
+            "misses": self.misses,
+            "size_bytes": size
+        }
+
+    def _parse(self, path, table):
+        df = parse_csv(path, table)
+        return apply_lean_schema(df, table) if self.lean_dtypes else df
+
+    def _build(self, entry_dir, path, table, fingerprint):
+        """
+        Builds the entry of a CSV (streamed when enabled and the file allows).
+
+        Returns:
+            The parsed DataFrame when the build parsed the whole file, else
+            None (the table is then only on disk)
+        """
+        self.misses += 1
+        if self.streaming and self._write_streamed_entry(entry_dir, path, table, fingerprint):
+            return None
+        df = self._parse(path, table)
+        self._write_entry(entry_dir, df, path, table, fingerprint)
+        return df
+
+    def _read_entry(self, entry_dir, meta, table):
+        return self._lean_on_read(_read_columns(entry_dir, meta["columns"]), meta, table)
+
+    def _lean_on_read(self, df, meta, table):
+        # Streamed entries store the parsed types; lean types need the whole
+        # table to choose, so they are applied to what is read
+        if meta.get("usecols") and self.lean_dtypes:
+            return apply_lean_schema(df, table)
+        return df
+
+    def _indexed_entry(self, path, table):
+        """
+        Returns (entry_dir, meta) of a fresh entry with a week index, building
+        the entry first if needed; (None, None) when there is none.
+        """
+        if not self.enabled:
+            return None, None
+        fingerprint = self._fingerprint(path)
+        entry_dir = self._entry_dir(path)
+        meta = self._read_meta(entry_dir)
+        if meta is None or not self._is_fresh(meta, fingerprint, path):
+            # One pass over the CSV to build the entry; later windows only read their rows
+            self._build(entry_dir, path, table, fingerprint)
+            meta = self._read_meta(entry_dir)
+            if meta is None or not self._is_fresh(meta, fingerprint, path):
+                return None, None
+        if not (meta.get("window_index") or {}).get("week_bounds"):
+            return None, None
+        return entry_dir, meta
+
+    def _entry_dir(self, path):
+        # Name entries after the file and its absolute path, so equally named
+        # CSVs in different directories (e.g. synthetic datasets) do not collide
+        stem = os.path.splitext(os.path.basename(path))[0]
+        digest = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:12]
+        return os.path.join(self.cache_dir, f"{stem}-{digest}")
+
+    def _fingerprint(self, path):
+        stat = os.stat(path)
+        fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        if self.validate == "hash":
+            # Hashed once per process while size and mtime are unchanged, so
+            # week-by-week windowed loads do not re-read the whole file
+            key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+            if key not in self._hashes:
+                self._hashes[key] = _file_hash(path)
+            fingerprint["sha256"] = self._hashes[key]
+        return fingerprint
+
+    def _is_fresh(self, meta, fingerprint, path):
+        if meta.get("cache_version") != CACHE_VERSION:
+            return False
+        if meta.get("source") != os.path.abspath(path):
+            return False
+        if meta.get("lean_dtypes", False) != self.lean_dtypes:
+            return False
+        if meta.get("streaming", False) != self.streaming:
+            return False
+        source = meta.get("fingerprint", {})
+        if source.get("size") != fingerprint["size"]:
+            return False
+        if self.validate == "hash":
+            return source.get("sha256") == fingerprint["sha256"]
+        return source.get("mtime_ns") == fingerprint["mtime_ns"]
+
+    @staticmethod
+    def _read_meta(entry_dir):
+        try:
+            with open(os.path.join(entry_dir, "meta.json"), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write_entry(self, entry_dir, df, path, table, fingerprint):
+        columns = _column_schema(df)
+        if columns is None:
+            return  # Column types without a binary layout: keep parsing the CSV
+
+        if "sha256" not in fingerprint:
+            fingerprint = dict(fingerprint, sha256=_file_hash(path))
+
+        tmp_dir = f"{entry_dir}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        try:
+            for i, (name, column) in enumerate(zip(df.columns, columns)):
+                values = df[name]
+                if column["encoding"] == "dictionary":
+                    categorical = values.array if isinstance(values.dtype, pd.CategoricalDtype) else pd.Categorical(values)
+                    np.save(os.path.join(tmp_dir, f"{i}.codes.npy"), categorical.codes, allow_pickle=False)
+                    np.save(os.path.join(tmp_dir, f"{i}.categories.npy"),
+                            categorical.categories.to_numpy(dtype=str), allow_pickle=False)
+                else:
+                    np.save(os.path.join(tmp_dir, f"{i}.npy"), values.to_numpy(), allow_pickle=False)
+            window_index = _write_window_index(tmp_dir, df, table)
+
+            with open(os.path.join(tmp_dir, "meta.json"), 'w', encoding='utf-8') as f:
+                json.dump({
+                    "cache_version": CACHE_VERSION,
+                    "source": os.path.abspath(path),
+                    "table": table,
+                    "rows": len(df),
+                    "lean_dtypes": self.lean_dtypes,
+                    "streaming": self.streaming,
+                    "usecols": None,
+                    "fingerprint": fingerprint,
+                    "columns": columns,
+                    "window_index": window_index
+                }, f, indent=4)
+
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(tmp_dir, entry_dir)
+        except OSError as e:
+            # The cache is an optimization only; a read-only or full disk must not fail the run
+            print(f"[WARN] Could not cache {path}: {e}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+    def _write_streamed_entry(self, entry_dir, path, table, fingerprint):
+        """
+        Builds an entry from the CSV chunk by chunk (see the module docstring).
+
+        Returns:
+            True once the entry is written; False if the file does not fit the
+            streamed layout (a column outside the declared schema, or values
+            that do not match it), in which case it should be parsed in full
+        """
+        from backend.agent.state_manager import STATE_COLUMNS
+
+        header = pd.read_csv(path, nrows=0).columns
+        schema = TABLE_SCHEMAS.get(table, {})
+        wanted = set(STATE_COLUMNS.get(table, header)) | {"week"}
+        usecols = [str(column) for column in header if column in wanted]
+        if "week" not in usecols or any(column not in schema for column in usecols):
+            return False
+        dtypes = {column: schema[column] for column in usecols}
+
+        if "sha256" not in fingerprint:
+            fingerprint = dict(fingerprint, sha256=_file_hash(path))
+
+        tmp_dir = f"{entry_dir}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        parts_dir = os.path.join(tmp_dir, "parts")
+        os.makedirs(parts_dir)
+        try:
+            # 1. Append each chunk's rows to one part file per (week, column)
+            dictionaries = {column: _Dictionary() for column in usecols if dtypes[column] == "str"}
+            part_dtypes = {}
+            week_rows = {}
+            summary = None
+            summary_columns = SUMMARY_METRICS.get(table)
+            if summary_columns and set(summary_columns) <= set(usecols):
+                summary = _SummaryAccumulator()
+
+            for chunk in pd.read_csv(path, usecols=usecols, dtype=dtypes, chunksize=self.chunk_rows):
+                if summary is not None:
+                    summary.add(chunk[summary_columns[0]], chunk[summary_columns[1]])
+                # Stable sort keeps the file order of rows within each week
+                order = np.argsort(chunk['week'].to_numpy(), kind='stable')
+                weeks = chunk['week'].to_numpy()[order]
+                chunk_weeks, starts = np.unique(weeks, return_index=True)
+                stops = np.append(starts[1:], len(weeks))
+                for i, column in enumerate(usecols):
+                    if column in dictionaries:
+                        values = dictionaries[column].encode(chunk[column])[order]
+                    else:
+                        values = chunk[column].to_numpy()[order]
+                    part_dtypes[column] = values.dtype
+                    for week, start, stop in zip(chunk_weeks.tolist(), starts, stops):
+                        with open(os.path.join(parts_dir, f"{week}.{i}.bin"), 'ab') as f:
+                            values[start:stop].tofile(f)
+                for week, start, stop in zip(chunk_weeks.tolist(), starts, stops):
+                    week_rows[week] = week_rows.get(week, 0) + int(stop - start)
+
+            if not week_rows:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                return False
+
+            # 2. Lay the parts out in week order, one .npy file per column
+            bounds = []
+            for week in sorted(week_rows):
+                start = bounds[-1][2] if bounds else 0
+                bounds.append([week, start, start + week_rows[week]])
+            total = bounds[-1][2]
+
+            columns = []
+            for i, column in enumerate(usecols):
+                if column in dictionaries:
+                    file_name = f"{i}.codes.npy"
+                    np.save(os.path.join(tmp_dir, f"{i}.categories.npy"),
+                            dictionaries[column].categories(), allow_pickle=False)
+                    columns.append({"name": column, "dtype": dtypes[column], "encoding": "dictionary"})
+                else:
+                    file_name = f"{i}.npy"
+                    columns.append({"name": column, "dtype": str(part_dtypes[column]), "encoding": "plain"})
+                values = np.lib.format.open_memmap(os.path.join(tmp_dir, file_name), mode='w+',
+                                                   dtype=part_dtypes[column], shape=(total,))
+                for week, start, stop in bounds:
+                    values[start:stop] = np.fromfile(os.path.join(parts_dir, f"{week}.{i}.bin"), dtype=part_dtypes[column])
+                values.flush()
+                del values
+
+            # 3. Window index: lookback weeks per row, then the history summary
+            window_index = {"week_bounds": bounds}
+            entity = ENTITY_COLUMNS.get(table)
+            if entity in usecols:
+                i = usecols.index(entity)
+                lookback = np.lib.format.open_memmap(os.path.join(tmp_dir, "window.lookback.npy"), mode='w+',
+                                                     dtype=np.int64, shape=(total,))
+                tracker = _LookbackTracker(encoded=entity in dictionaries)
+                for week, start, stop in bounds:
+                    ids = np.fromfile(os.path.join(parts_dir, f"{week}.{i}.bin"), dtype=part_dtypes[entity])
+                    lookback[start:stop] = tracker.advance(ids, week)
+                lookback.flush()
+                del lookback
+                window_index["entity_column"] = entity
+
+            if summary is not None:
+                id_column, metric = summary_columns
+                ids, offsets, values = summary.arrays()
+                np.save(os.path.join(tmp_dir, "window.summary_ids.npy"), ids, allow_pickle=False)
+                np.save(os.path.join(tmp_dir, "window.summary_offsets.npy"), offsets, allow_pickle=False)
+                np.save(os.path.join(tmp_dir, "window.summary_values.npy"), values, allow_pickle=False)
+                window_index["summary"] = {"id_column": id_column, "metric": metric}
+
+            shutil.rmtree(parts_dir)
+            with open(os.path.join(tmp_dir, "meta.json"), 'w', encoding='utf-8') as f:
+                json.dump({
+                    "cache_version": CACHE_VERSION,
+                    "source": os.path.abspath(path),
+                    "table": table,
+                    "rows": total,
+                    "lean_dtypes": self.lean_dtypes,
+                    "streaming": self.streaming,
+                    "usecols": usecols,
+                    "fingerprint": fingerprint,
+                    "columns": columns,
+                    "window_index": window_index
+                }, f, indent=4)
+
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(tmp_dir, entry_dir)
+            return True
+        except (ValueError, TypeError) as e:
+            print(f"[WARN] {path} cannot be streamed with the declared schema ({e}); parsing it in full")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return False
+        except OSError as e:
+            # As in _write_entry: fall back to parsing rather than failing the run
+            print(f"[WARN] Could not cache {path}: {e}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return False
+
+
+def parse_csv(path, table=None):
+    """
+    Parses a CSV with the declared schema of its table.
+
+    Columns the schema does not list are inferred. If the declared types do
+    not fit the file (e.g. missing values in an integer column), the whole
+    file is parsed with pandas' inference instead.
+    """
+    schema = TABLE_SCHEMAS.get(table or os.path.splitext(os.path.basename(path))[0])
+    if not schema:
+        return pd.read_csv(path)
+
+    header = pd.read_csv(path, nrows=0).columns
+    dtypes = {column: schema[column] for column in header if column in schema}
+    try:
+        return pd.read_csv(path, dtype=dtypes)
+    except (ValueError, TypeError) as e:
+        print(f"[WARN] {path} does not match the declared schema ({e}); inferring column types")
+        return pd.read_csv(path)
+
+
+def apply_lean_schema(df, table):
+    """
+    Converts a table to the memory-lean types of LEAN_SCHEMAS.
+
+    int32 is only used when every value fits, and strings only become
+    categoricals when they repeat (see CATEGORY_MAX_UNIQUE_RATIO); other
+    columns keep their parsed type.
+    """
+    schema = LEAN_SCHEMAS.get(table, {})
+    int32 = np.iinfo(np.int32)
+    converted = {}
+    for column, dtype in schema.items():
+        if column not in df.columns:
+            continue
+        values = df[column]
+        if dtype == "category":
+            if values.nunique() <= CATEGORY_MAX_UNIQUE_RATIO * len(values):
+                converted[column] = values.astype("category")
+        elif dtype == "int32":
+            if values.dtype.kind == "i" and (values.empty or (values.min() >= int32.min and values.max() <= int32.max)):
+                converted[column] = values.astype(np.int32)
+    return df.assign(**converted) if converted else df
+
+
+def memory_report(data):
+    """
+    Returns the deep memory usage of each table and column.
+
+    Args:
+        data: Dictionary of DataFrames
+
+    Returns:
+        {table: {"total_bytes": int, "columns": {column: {"dtype", "bytes"}}}}
+    """
+    report = {}
+    for key, df in data.items():
+        usage = df.memory_usage(deep=True, index=False)
+        report[key] = {
+            "total_bytes": int(usage.sum()),
+            "columns": {column: {"dtype": str(df[column].dtype), "bytes": int(usage[column])} for column in df.columns}
+        }
+    return report
+
+
+def _column_schema(df):
+    """Returns the stored layout of every column, or None if one has no binary form."""
+    columns = []
+    for name in df.columns:
+        dtype = df[name].dtype
+        if isinstance(dtype, (pd.StringDtype, pd.CategoricalDtype)):
+            encoding = "dictionary"
+        elif isinstance(dtype, np.dtype) and dtype.kind in "iufb":
+            encoding = "plain"
+        else:
+            return None
+        columns.append({"name": str(name), "dtype": str(dtype), "encoding": encoding})
+    return columns
+
+
+def _read_columns(entry_dir, columns, rows=None):
+    """
+    Rebuilds a DataFrame from its stored column arrays.
+
+    Args:
+        rows: Optional row positions to read; the arrays are then
+            memory-mapped so only those rows are loaded
+    """
+    mmap_mode = None if rows is None else 'r'
+
+    def load(name):
+        values = np.load(os.path.join(entry_dir, name), mmap_mode=mmap_mode, allow_pickle=False)
+        return values if rows is None else values[rows]
+
+    data = {}
+    for i, column in enumerate(columns):
+        if column["encoding"] == "dictionary":
+            codes = load(f"{i}.codes.npy")
+            categories = np.load(os.path.join(entry_dir, f"{i}.categories.npy"), allow_pickle=False)
+            values = pd.Categorical.from_codes(codes, pd.Index(categories, dtype="str"))
+            data[column["name"]] = values if column["dtype"] == "category" else pd.Series(values).astype(column["dtype"])
+        else:
+            data[column["name"]] = load(f"{i}.npy")
+    return pd.DataFrame(data)
+
+
+def _write_window_index(entry_dir, df, table):
+    """
+    Writes the window index of a table (see the module docstring) and
+    returns its meta.json section; week_bounds is None unless the rows are
+    sorted by week.
+    """
+    if 'week' not in df.columns or df['week'].isna().any():
+        return None
+    weeks = df['week'].to_numpy()
+    if len(weeks) and np.any(weeks[1:] < weeks[:-1]):
+        return {"week_bounds": None}
+
+    unique_weeks, starts = np.unique(weeks, return_index=True)
+    stops = np.append(starts[1:], len(weeks))
+    index = {"week_bounds": [[int(w), int(a), int(b)] for w, a, b in zip(unique_weeks, starts, stops)]}
+
+    # Week of each row's second previous observation (first if it has one,
+    # else its own week); rows are in week order, so shift follows the weeks
+    entity = ENTITY_COLUMNS.get(table)
+    if entity in df.columns:
+        grouped = df.groupby(entity, sort=False)['week']
+        lookback = df['week']
+        for n in range(1, LOOKBACK_OBSERVATIONS + 1):
+            lookback = grouped.shift(n).fillna(lookback)
+        np.save(os.path.join(entry_dir, "window.lookback.npy"), lookback.to_numpy(dtype=np.int64), allow_pickle=False)
+        index["entity_column"] = entity
+
+    if table in SUMMARY_METRICS and set(SUMMARY_METRICS[table]) <= set(df.columns):
+        id_column, metric = SUMMARY_METRICS[table]
+        ids, offsets, values = _summary_arrays(df[id_column], df[metric])
+        np.save(os.path.join(entry_dir, "window.summary_ids.npy"), ids, allow_pickle=False)
+        np.save(os.path.join(entry_dir, "window.summary_offsets.npy"), offsets, allow_pickle=False)
+        np.save(os.path.join(entry_dir, "window.summary_values.npy"), values, allow_pickle=False)
+        index["summary"] = {"id_column": id_column, "metric": metric}
+    return index
+
+
+def _summary_arrays(ids, values):
+    """Groups a metric by entity: (unique ids, segment offsets, values in segment order)."""
+    codes, uniques = pd.factorize(ids, sort=True)
+    keep = codes >= 0
+    codes = codes[keep]
+    order = np.argsort(codes, kind='stable')
+    offsets = np.searchsorted(codes[order], np.arange(len(uniques)))
+    unique_ids = np.asarray(uniques)
+    if unique_ids.dtype.kind not in "iuf":
+        unique_ids = unique_ids.astype(str)
+    return unique_ids, offsets, values.to_numpy(dtype=float)[keep][order]
+
+
+def _read_window(entry_dir, meta, start_week, end_week):
+    """Reads the rows of a week range plus their lookback rows through the window index."""
+    index = meta["window_index"]
+    bounds = index["week_bounds"]
+    weeks = [week for week, _, _ in bounds]
+    first = bisect_left(weeks, start_week)
+    last = bisect_right(weeks, end_week) - 1
+    if first > last:
+        return _read_columns(entry_dir, meta["columns"], rows=np.array([], dtype=np.int64))
+    start, stop = bounds[first][1], bounds[last][2]
+
+    rows = np.arange(start, stop)
+    if index.get("entity_column") and start > 0:
+        lookback = np.load(os.path.join(entry_dir, "window.lookback.npy"), mmap_mode='r')[start:stop]
+        reaches_back = lookback < weeks[first]
+        if reaches_back.any():
+            # Rows of earlier weeks that belong to those entities, last 2 each
+            earliest = bisect_left(weeks, int(lookback[reaches_back].min()))
+            entity_position = next(i for i, column in enumerate(meta["columns"]) if column["name"] == index["entity_column"])
+            entity_ids = _read_columns(entry_dir, [meta["columns"][entity_position]], rows=np.arange(bounds[earliest][1], stop))
+            entity_ids = entity_ids.iloc[:, 0].reset_index(drop=True)
+            split = start - bounds[earliest][1]
+            wanted = entity_ids.iloc[split:][reaches_back].unique()
+            earlier = entity_ids.iloc[:split]
+            earlier = earlier[earlier.isin(wanted)]
+            picked = earlier.groupby(earlier, sort=False, observed=True).tail(LOOKBACK_OBSERVATIONS).index.to_numpy()
+            rows = np.concatenate([np.sort(picked) + bounds[earliest][1], rows])
+    return _read_columns(entry_dir, meta["columns"], rows=rows)
+
+
+def _read_summary(entry_dir, meta):
+    """Loads the HistorySummary of an entry (None for tables without one)."""
+    summary = (meta.get("window_index") or {}).get("summary")
+    if summary is None:
+        return None
+    return HistorySummary(
+        np.load(os.path.join(entry_dir, "window.summary_ids.npy"), allow_pickle=False),
+        np.load(os.path.join(entry_dir, "window.summary_offsets.npy"), allow_pickle=False),
+        np.load(os.path.join(entry_dir, "window.summary_values.npy"), allow_pickle=False)
+    )
+
+
+def _scan_window(path, table, start_week, end_week, chunk_rows=SCAN_CHUNK_ROWS):
+    """
+    Filters a week range plus lookback rows out of the CSV chunk by chunk,
+    so only the window (and small per-entity buffers) is ever held in memory.
+
+    Returns:
+        (DataFrame, HistorySummary or None), like TableCache.load_window
+    """
+    schema = TABLE_SCHEMAS.get(table)
+    header = pd.read_csv(path, nrows=0).columns
+    if 'week' not in header:
+        raise ValueError(f"{path} has no week column; it cannot be loaded by week")
+    dtypes = {column: schema[column] for column in header if column in schema} if schema else None
+    try:
+        return _filter_chunks(path, table, start_week, end_week, dtypes, chunk_rows)
+    except (ValueError, TypeError) as e:
+        if dtypes is None:
+            raise
+        print(f"[WARN] {path} does not match the declared schema ({e}); inferring column types")
+        return _filter_chunks(path, table, start_week, end_week, None, chunk_rows)
+
+
+def _filter_chunks(path, table, start_week, end_week, dtypes, chunk_rows):
+    entity = ENTITY_COLUMNS.get(table)
+    summary_columns = SUMMARY_METRICS.get(table)
+    window_parts = []
+    earlier = None
+    summary = None
+
+    for chunk in pd.read_csv(path, dtype=dtypes, chunksize=chunk_rows):
+        weeks = chunk['week']
+        window_parts.append(chunk[(weeks >= start_week) & (weeks <= end_week)])
+        if entity in chunk.columns:
+            # Keep only each entity's latest rows before the window
+            before = chunk[weeks < start_week]
+            if not before.empty:
+                earlier = before if earlier is None else pd.concat([earlier, before])
+                earlier = earlier.sort_values('week', kind='stable').groupby(entity, sort=False).tail(LOOKBACK_OBSERVATIONS)
+        if summary_columns and set(summary_columns) <= set(chunk.columns):
+            summary = summary or _SummaryAccumulator()
+            summary.add(chunk[summary_columns[0]], chunk[summary_columns[1]])
+
+    window = pd.concat(window_parts, ignore_index=True) if window_parts else pd.read_csv(path, dtype=dtypes, nrows=0)
+    if earlier is not None:
+        earlier = earlier[earlier[entity].isin(window[entity].unique())]
+        window = pd.concat([earlier, window], ignore_index=True)
+
+    if summary is not None:
+        summary = HistorySummary(*summary.arrays())
+    return window, summary
+
+
+class _Dictionary:
+    """Growing value -> code mapping, to encode a column one chunk at a time."""
+
+    def __init__(self):
+        self._values = None
+
+    def encode(self, values):
+        """Returns int32 codes of values (-1 for missing), adding unseen values."""
+        values = pd.Series(values).reset_index(drop=True)
+        codes = self._values.get_indexer(values) if self._values is not None else np.full(len(values), -1)
+        new = (codes < 0) & values.notna().to_numpy()
+        if new.any():
+            unseen = pd.Index(values[new].unique())
+            self._values = unseen if self._values is None else self._values.append(unseen)
+            codes[new] = self._values.get_indexer(values[new])
+        return codes.astype(np.int32)
+
+    def categories(self):
+        if self._values is None:
+            return np.array([], dtype=str)
+        return self._values.to_numpy(dtype=str)
+
+    def uniques(self):
+        """Returns the distinct values in code order, with their original dtype."""
+        if self._values is None:
+            return np.array([])
+        return self._values.to_numpy()
+
+
+class _SummaryAccumulator:
+    """
+    (entity, value) pairs of the history summary, added one chunk at a time
+    into compact code/value arrays, so a streamed build keeps 12 bytes per
+    row instead of every chunk's rows.
+    """
+
+    def __init__(self):
+        self._ids = _Dictionary()
+        self._codes = np.empty(0, dtype=np.int32)
+        self._values = np.empty(0, dtype=float)
+        self._rows = 0
+
+    def add(self, ids, values):
+        """Records one chunk's ids and metric values (rows with a missing id are skipped)."""
+        codes = self._ids.encode(ids)
+        values = pd.Series(values).to_numpy(dtype=float)
+        keep = codes >= 0
+        codes, values = codes[keep], values[keep]
+
+        end = self._rows + len(codes)
+        if end > len(self._codes):
+            # Grow geometrically so appending stays amortized O(rows)
+            capacity = max(end, 2 * len(self._codes))
+            self._codes = np.concatenate([self._codes[:self._rows], np.empty(capacity - self._rows, dtype=np.int32)])
+            self._values = np.concatenate([self._values[:self._rows], np.empty(capacity - self._rows, dtype=float)])
+        self._codes[self._rows:end] = codes
+        self._values[self._rows:end] = values
+        self._rows = end
+
+    def arrays(self):
+        """Returns (unique ids, segment offsets, values in segment order), like _summary_arrays."""
+        uniques = self._ids.uniques()
+        sorter = np.argsort(uniques, kind='stable')
+        rank = np.empty(len(uniques), dtype=np.int64)
+        rank[sorter] = np.arange(len(uniques))
+
+        codes = rank[self._codes[:self._rows]]
+        order = np.argsort(codes, kind='stable')
+        offsets = np.searchsorted(codes[order], np.arange(len(uniques)))
+        unique_ids = uniques[sorter]
+        if unique_ids.dtype.kind not in "iuf":
+            unique_ids = unique_ids.astype(str)
+        return unique_ids, offsets, self._values[:self._rows][order]
+
+
+class _LookbackTracker:
+    """
+    Week of each entity's last two observations, advanced week by week, to
+    compute the lookback column without holding the table.
+    """
+
+    def __init__(self, encoded):
+        """
+        Args:
+            encoded: True when ids are already dictionary codes (-1 = missing)
+        """
+        self._ids = None if encoded else _Dictionary()
+        self._last = np.full(0, -1, dtype=np.int64)
+        self._second_last = np.full(0, -1, dtype=np.int64)
+
+    def advance(self, ids, week):
+        """Returns the lookback weeks of one week's rows (in row order) and records them."""
+        positions = ids.astype(np.int64) if self._ids is None else self._ids.encode(ids).astype(np.int64)
+        size = int(positions.max()) + 1 if len(positions) else 0
+        if size > len(self._last):
+            grow = size - len(self._last)
+            self._last = np.append(self._last, np.full(grow, -1, dtype=np.int64))
+            self._second_last = np.append(self._second_last, np.full(grow, -1, dtype=np.int64))
+
+        # Second previous observation, else the previous one, else this week
+        lookback = np.full(len(positions), week, dtype=np.int64)
+        valid = positions >= 0
+        # An entity listed twice in a week looks back to its own earlier row
+        occurrence = pd.Series(positions).groupby(positions).cumcount().to_numpy()
+        for n in range(int(occurrence.max()) + 1 if len(positions) else 0):
+            rows = valid & (occurrence == n)
+            p = positions[rows]
+            lookback[rows] = np.where(self._second_last[p] >= 0, self._second_last[p],
+                                      np.where(self._last[p] >= 0, self._last[p], week))
+            self._second_last[p] = self._last[p]
+            self._last[p] = week
+        return lookback
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Global instance for easy access
+table_cache = TableCache.from_policy()
+
+
+def main():
+    from backend.main import DATA_FILES
+
+    parser = argparse.ArgumentParser(description="Build or clear the binary cache of the input CSVs.")
+    parser.add_argument("paths", nargs="*", help="CSV files to cache (default: the agent's input files)")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild entries even if they are fresh")
+    parser.add_argument("--clear", action="store_true", help="Remove the whole cache and exit")
+    parser.add_argument("--memory-report", action="store_true",
+                        help="Compare memory of default and lean dtypes per column and exit")
+    args = parser.parse_args()
+
+    paths = args.paths or list(DATA_FILES.values())
+    if args.memory_report:
+        for path in paths:
+            table = os.path.splitext(os.path.basename(path))[0]
+            default = parse_csv(path, table)
+            before = memory_report({table: default})[table]
+            after = memory_report({table: apply_lean_schema(default, table)})[table]
+            print(f"{path}: {before['total_bytes'] / 1024 / 1024:.2f} MB -> {after['total_bytes'] / 1024 / 1024:.2f} MB")
+            for column, usage in after["columns"].items():
+                old_usage = before["columns"][column]
+                print(f"   {column:<28}{old_usage['dtype']:>9} {old_usage['bytes']:>12,} -> {usage['dtype']:>9} {usage['bytes']:>12,}")
+        return
+
+    cache = TableCache(table_cache.cache_dir, enabled=True, validate=table_cache.validate,
+                       lean_dtypes=table_cache.lean_dtypes, streaming=table_cache.streaming,
+                       chunk_rows=table_cache.chunk_rows)
+    if args.clear:
+        cache.clear()
+        print(f"[OK] Cleared {cache.cache_dir}")
+        return
+
+    for path in paths:
+        misses = cache.misses
+        df = cache.rebuild(path) if args.rebuild else cache.load(path)
+        status = "built" if cache.misses > misses else "fresh"
+        print(f"[OK] {path}: {len(df)} rows ({status})")
+    print(f"[OK] Cache size: {cache.stats()['size_bytes'] / 1024 / 1024:.1f} MB in {cache.cache_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,15 @@
-import pandas as pd
 from pathlib import Path
+from backend.logic.table_cache import table_cache
 
 def load_all_data():
     """
-    Loads the 3 final datasets used by the agent.
+    Loads the 3 final datasets used by the agent (through the table cache).
     """
     base = Path("backend/data")
 
-    campaigns = pd.read_csv(base / "campaigns.csv")
-    ad_groups = pd.read_csv(base / "ad_groups.csv")
-    audiences = pd.read_csv(base / "audiences.csv")
+    campaigns = table_cache.load(base / "campaigns.csv", "campaigns")
+    ad_groups = table_cache.load(base / "ad_groups.csv", "ad_groups")
+    audiences = table_cache.load(base / "audiences.csv", "audiences")
 
     return {
         "campaigns": campaigns,
@@ -1,11 +1,18 @@
-import json
+import argparse
 import pandas as pd
 import os
-import numpy as np # Import numpy for type checking
 import time
 from backend.agent.policy_agent import PolicyAgent
+from backend.config import MODEL_NAME
 from backend.logic.logger import agent_logger
 from backend.agent.state_manager import get_latest_week_state, get_state_for_week
+from backend.logic.checkpoints import checkpoint_store
+from backend.logic.data_store import WeeklyDataStore
+from backend.logic.incremental_enricher import IncrementalEnricher
+from backend.logic.policy_loader import policy_loader
+from backend.logic.metrics import pipeline_metrics
+from backend.logic.results_writer import StreamingResultsWriter, ShardedResultsWriter, remove_output
+from backend.logic.table_cache import table_cache, parse_csv, memory_report
 
 # --- Configuration ---
 DATA_FILES = {
@@ -14,93 +21,270 @@ DATA_FILES = {
     "audiences": "backend/data/audiences.csv"
 }
 OUTPUT_FILE = "frontend/results.json"
+OUTPUT_DIR = "frontend/results"  # Manifest + per-week shards (output.format = "sharded")
+START_WEEK = 3  # Recommendations start from week 3 (3 weeks of history for trend analysis)
 
-def load_data():
-    """Loads all CSV data into a dictionary of DataFrames."""
+def load_data(data_files=None, use_cache=True):
+    """
+    Loads all CSV data into a dictionary of DataFrames (DATA_FILES unless given other paths).
+
+    Tables come from the binary table cache while their CSVs are unchanged;
+    use_cache=False always parses the CSVs.
+    """
     data = {}
-    for key, path in DATA_FILES.items():
+    for key, path in (data_files or DATA_FILES).items():
         try:
             # Read all data, not just the latest week, as agent.run() handles filtering
-            data[key] = pd.read_csv(path)
+            data[key] = table_cache.load(path, key) if use_cache else parse_csv(path, key)
         except FileNotFoundError:
             print(f"Error: Data file not found at {path}")
             data[key] = pd.DataFrame()
     return data
 
-class NumpyEncoder(json.JSONEncoder):
-    """Custom encoder for numpy data types."""
-    def default(self, obj):
-        if isinstance(obj, (np.integer, np.floating, np.bool_)):
-            return obj.item()
-        if isinstance(obj, np.ndarray):
-            return obj.tolist()
-        return super(NumpyEncoder, self).default(obj)
-
-def run_agent_and_save_results():
-    """Runs the agent and saves the structured output to a JSON file."""
+def load_window(start_week, end_week, data_files=None):
+    """
+    Loads only weeks start_week..end_week (plus the earlier rows trend
+    analysis needs) into a WeeklyDataStore whose history_summary keeps
+    weeks_above_median exact over the full history.
+    """
+    data = {}
+    history_summary = None
+    for key, path in (data_files or DATA_FILES).items():
+        try:
+            data[key], summary = table_cache.load_window(path, start_week, end_week, key)
+            history_summary = history_summary or summary
+        except FileNotFoundError:
+            print(f"Error: Data file not found at {path}")
+            data[key] = pd.DataFrame()
+    return WeeklyDataStore(data, history_summary=history_summary)
+
+def baseline_history_entry(week, state):
+    """History entry for a week before START_WEEK (state only, no recommendations)."""
+    return {
+        "week": week,
+        "state_snapshot": state,
+        "recommendations": {
+            "campaign_budget_actions": [],
+            "ad_group_bid_actions": [],
+            "audience_targeting_actions": [],
+            "explanation": f"Week {week}: Baseline data collection - insufficient historical data for 3-week trend analysis. Recommendations start from week {START_WEEK}."
+        },
+        "log_history": []
+    }
+
+def week_history_entry(week, state, results):
+    """History entry for a recommendation week (state snapshot, decisions and its audit log step)."""
+    return {
+        "week": week,
+        "state_snapshot": state,
+        "recommendations": results["decisions"],
+        "log_history": results["log_history"]
+    }
+
+def restore_week(entry):
+    """
+    Returns a checkpointed week's {"decisions", "log_history"}, re-recording
+    its audit log step.
+    """
+    agent_logger.replay_steps(entry["log_history"])
+    return {"decisions": entry["recommendations"], "log_history": entry["log_history"]}
+
+def checkpoint_fetched_weeks(agent, week_results):
+    """
+    Checkpoints the concurrently fetched weeks after a failed one, so that
+    --resume only has to request the weeks that actually failed.
+
+    Args:
+        agent: The PolicyAgent that fetched the responses
+        week_results: (state, input_key, checkpoint, fetched) tuples of the remaining weeks
+    """
+    if not checkpoint_store.enabled:
+        return
+    for state, input_key, checkpoint, fetched in week_results:
+        if checkpoint is not None or isinstance(fetched[1], Exception):
+            continue
+        try:
+            results = agent.get_recommendations(state, raw_outputs=fetched[1], prompts=fetched[0])
+        except Exception:
+            continue  # Invalid output: requested again on resume
+        checkpoint_store.save(week_history_entry(state["week"], state, results), input_key)
+
+def run_agent_and_save_results(resume=False):
+    """
+    Runs the agent and saves the structured output to a JSON file.
+
+    With resume=True, weeks whose checkpoint matches their inputs are taken
+    from the checkpoint instead of calling the agent again.
+    """
     print("=" * 80)
     print("MARUTI SUZUKI AI MARKETING AGENT - INTELLIGENT OPTIMIZATION RUN")
     print("=" * 80)
 
     # 1. Load data
     print("\nLoading campaign data...")
-    data = load_data()
-    max_week = data["campaigns"]["week"].max()
+    pipeline_metrics.reset()
+    agent_logger.reset()  # Fresh audit trail for this run
+    # Optionally load only the latest weeks instead of the whole history, or
+    # (streaming) keep the tables on disk and load one week at a time
+    window_weeks = policy_loader.get_value('data_window', 'weeks', default=None)
+    streaming = table_cache.streaming and table_cache.enabled
+    first_week = 1
+    data = None
+    with pipeline_metrics.span("main.load_data") as span:
+        if window_weeks or streaming:
+            # Builds the campaigns cache entry if needed (chunk by chunk when streaming)
+            available_weeks = table_cache.weeks(DATA_FILES["campaigns"], "campaigns")
+            if window_weeks:
+                first_week = available_weeks[-min(window_weeks, len(available_weeks))]
+            else:
+                first_week = available_weeks[0]
+        if streaming:
+            store = None
+            max_week = available_weeks[-1]
+        else:
+            if window_weeks:
+                store = load_window(first_week, available_weeks[-1])
+                data = {key: store[key] for key in store.keys()}
+            else:
+                data = load_data()
+                store = WeeklyDataStore(data)  # Partition tables by week once for all state lookups
+            span.add(entities=sum(len(df) for df in data.values()))
+            max_week = data["campaigns"]["week"].max()
     print(f"[OK] Data loaded successfully")
-    print(f"[OK] Total campaigns: {len(data['campaigns']['campaign_id'].unique())}")
-    print(f"[OK] Total ad groups: {len(data['ad_groups']['ad_group_id'].unique())}")
-    print(f"[OK] Total audiences: {len(data['audiences']['audience_id'].unique())}")
+    if window_weeks:
+        print(f"[OK] Loaded window: weeks {first_week}-{max_week} (data_window.weeks = {window_weeks})")
+    if streaming:
+        print(f"[OK] Streaming weeks {first_week}-{max_week} from {table_cache.cache_dir} (one week in memory at a time)")
+    else:
+        memory_mb = sum(table["total_bytes"] for table in memory_report(data).values()) / 1024 / 1024
+        print(f"[OK] In-memory size: {memory_mb:.2f} MB ({'lean' if table_cache.lean_dtypes else 'default'} dtypes)")
+        print(f"[OK] Total campaigns: {len(data['campaigns']['campaign_id'].unique())}")
+        print(f"[OK] Total ad groups: {len(data['ad_groups']['ad_group_id'].unique())}")
+        print(f"[OK] Total audiences: {len(data['audiences']['audience_id'].unique())}")
     print(f"[OK] Weeks to process: {max_week}")
 
+    def week_store(week):
+        """Data to build a week's state from: the shared store, or (streaming) just that week."""
+        if not streaming:
+            return store
+        with pipeline_metrics.span("main.load_data") as span:
+            week_data = load_window(week, week)
+            span.add(entities=sum(len(week_data[key]) for key in week_data.keys()))
+        return week_data
+
     # 2. Run the simulation starting from week 3 (requires 3 weeks of data for trend analysis)
-    START_WEEK = 3  # Start from week 3 to have 3 weeks of historical data
-    print(f"\nStarting AI-powered analysis for weeks {START_WEEK}-{max_week}...")
-    print(f"[INFO] Skipping weeks 1-2 (insufficient historical data for 3-week trend analysis)")
+    baseline_weeks = range(first_week, START_WEEK)
+    recommendation_weeks = range(max(first_week, START_WEEK), max_week + 1)
+    print(f"\nStarting AI-powered analysis for weeks {recommendation_weeks.start}-{max_week}...")
+    if baseline_weeks:
+        print(f"[INFO] Skipping weeks 1-2 (insufficient historical data for 3-week trend analysis)")
+    if resume:
+        if checkpoint_store.enabled:
+            print(f"[INFO] Resuming: weeks with unchanged inputs are taken from {checkpoint_store.checkpoint_dir}")
+        else:
+            print(f"[WARN] Nothing to resume from: checkpoints are disabled in policy.json")
     print("-" * 80)
 
     agent = PolicyAgent()
+
+    # Optionally carry analytics forward week-over-week instead of rescanning history
+    enricher = None
+    if policy_loader.get_value('analytics', 'incremental_enrichment', default=False):
+        enricher = IncrementalEnricher()
+
+    results_writer = None
     try:
-        campaign_history = []
         total_start_time = time.time()
 
+        # Each week's entry is streamed to disk as soon as it completes, either
+        # into the single results.json or as a manifest plus one file per week
+        # (the other format's output is removed once this run is published)
+        output_indent = policy_loader.get_value('output', 'indent', default=4)
+        if policy_loader.get_value('output', 'format', default="single") == "sharded":
+            results_writer = ShardedResultsWriter(OUTPUT_DIR, max_week, indent=output_indent)
+            output_path = os.path.join(OUTPUT_DIR, "manifest.json")
+            stale_output = OUTPUT_FILE
+        else:
+            results_writer = StreamingResultsWriter(OUTPUT_FILE, max_week, indent=output_indent)
+            output_path = OUTPUT_FILE
+            stale_output = OUTPUT_DIR
+
         # Store weeks 1-2 state snapshots without recommendations
-        print(f"\nCollecting baseline data for weeks 1-2...")
-        for week in range(1, START_WEEK):
-            baseline_state = get_state_for_week(data, week)
-            history_entry = {
-                "week": week,
-                "state_snapshot": baseline_state,
-                "recommendations": {
-                    "campaign_budget_actions": [],
-                    "ad_group_bid_actions": [],
-                    "audience_targeting_actions": [],
-                    "explanation": f"Week {week}: Baseline data collection - insufficient historical data for 3-week trend analysis. Recommendations start from week {START_WEEK}."
-                },
-                "log_history": []
-            }
-            campaign_history.append(history_entry)
+        if baseline_weeks:
+            print(f"\nCollecting baseline data for weeks 1-2...")
+        for week in baseline_weeks:
+            pipeline_metrics.start_week(week)
+            baseline_state = get_state_for_week(week_store(week), week, enricher=enricher)
+            history_entry = baseline_history_entry(week, baseline_state)
+            with pipeline_metrics.span("main.save_results"):
+                results_writer.write_week(history_entry)
             print(f"   Week {week}: Baseline collected (no recommendations)")
 
+        # Recommendation-only: no week depends on an earlier week's decisions,
+        # so the LLM requests for all weeks can optionally run concurrently
+        concurrent_results = None
+        if policy_loader.get_value('llm', 'concurrent_weeks', default=False):
+            max_concurrency = agent.max_concurrency
+            print(f"\nRequesting weeks {recommendation_weeks.start}-{max_week} concurrently (up to {max_concurrency} in flight)...", end=" ", flush=True)
+            week_states = [get_state_for_week(week_store(week), week, enricher=enricher) for week in recommendation_weeks]
+            input_keys = [checkpoint_store.input_key(state, MODEL_NAME) for state in week_states]
+            checkpoints = [
+                checkpoint_store.load(state["week"], key) if resume else None
+                for state, key in zip(week_states, input_keys)
+            ]
+            # Only the LLM responses are fetched here; parsing and audit logging
+            # (or replaying a checkpoint's log step) happen in week order below
+            pending = [state for state, checkpoint in zip(week_states, checkpoints) if checkpoint is None]
+            responses = iter(agent.fetch_raw_outputs_for_weeks(pending, max_concurrency=max_concurrency) if pending else [])
+            concurrent_results = [
+                (state, key, checkpoint, next(responses) if checkpoint is None else None)
+                for state, key, checkpoint in zip(week_states, input_keys, checkpoints)
+            ]
+            print(f"DONE ({time.time() - total_start_time:.1f}s)")
+
         # The loop runs from week 3 up to the max_week (12)
-        for week in range(START_WEEK, max_week + 1):
+        for i, week in enumerate(recommendation_weeks):
             week_start_time = time.time()
+            pipeline_metrics.start_week(week)
             print(f"\nProcessing Week {week}/{max_week}...", end=" ", flush=True)
 
-            # a. Get the performance state for the current week
-            current_week_state = get_state_for_week(data, week)
+            if concurrent_results is not None:
+                # a/b. State and LLM responses were already fetched concurrently (or checkpointed)
+                current_week_state, input_key, checkpoint, fetched = concurrent_results[i]
+                restored = checkpoint is not None
+                if restored:
+                    results = restore_week(checkpoint)
+                else:
+                    prompts, raw_outputs = fetched
+                    try:
+                        if isinstance(raw_outputs, Exception):
+                            raise raw_outputs
+                        results = agent.get_recommendations(current_week_state, raw_outputs=raw_outputs, prompts=prompts)
+                    except Exception:
+                        # A failed request or invalid response stops the run here, after
+                        # the earlier weeks were saved and the later completed ones checkpointed
+                        checkpoint_fetched_weeks(agent, concurrent_results[i + 1:])
+                        raise
+            else:
+                # a. Get the performance state for the current week
+                current_week_state = get_state_for_week(week_store(week), week, enricher=enricher)
+                input_key = checkpoint_store.input_key(current_week_state, MODEL_NAME)
 
-            # b. Run the agent's single step logic to get recommendations
-            # We pass None for data_for_execution as no execution is performed
-            results = agent.get_recommendations(current_week_state)
+                # b. Reuse the week's checkpoint when resuming with unchanged inputs,
+                # otherwise run the agent's single step logic to get recommendations
+                checkpoint = checkpoint_store.load(week, input_key) if resume else None
+                restored = checkpoint is not None
+                if restored:
+                    results = restore_week(checkpoint)
+                else:
+                    results = agent.get_recommendations(current_week_state)
 
             # c. Collect the historical snapshot of the state and recommendations
-            history_entry = {
-                "week": week,
-                "state_snapshot": current_week_state,
-                "recommendations": results["decisions"],
-                "log_history": results["log_history"]
-            }
-            campaign_history.append(history_entry)
+            history_entry = week_history_entry(week, current_week_state, results)
+            with pipeline_metrics.span("main.save_results"):
+                results_writer.write_week(history_entry)
+                if not restored:
+                    checkpoint_store.save(history_entry, input_key)
 
             # d. Show completion with summary
             budget_actions = results["decisions"].get("campaign_budget_actions", [])
@@ -117,7 +301,7 @@ def run_agent_and_save_results():
             week_elapsed = time.time() - week_start_time
             total_elapsed = time.time() - total_start_time
 
-            print(f"DONE ({week_elapsed:.1f}s)")
+            print(f"DONE ({week_elapsed:.1f}s{', from checkpoint' if restored else ''})")
             print(f"   Budget: +{budget_increase} -{budget_decrease} | "
                   f"Bids: +{bid_raise} -{bid_lower} | "
                   f"Audiences: +{aud_activate} -{aud_suppress} | "
@@ -127,44 +311,45 @@ def run_agent_and_save_results():
             # The simulation is now recommendation-only.
 
         # 3. Get the final state for context (the last week's performance)
-        final_week_state = get_state_for_week(data, max_week)
+        # Reuse the last processed week's snapshot instead of rebuilding it
+        final_week_state = current_week_state
         
         # The final recommendations are the ones generated in the last loop iteration
         final_recommendations = results["decisions"]
 
-        # 4. Prepare final output structure
-        final_output = {
-            "latest_week": max_week,
-            "campaign_history": campaign_history,
-            "final_state_snapshot": final_week_state,
-            "final_recommendations": final_recommendations,
-        }
-
-        # 5. Save to JSON file for frontend visualization
+        # 4. Finalize the streamed JSON file for frontend visualization
         print("\n" + "-" * 80)
         print("Saving results to JSON...")
         try:
-            os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
-            with open(OUTPUT_FILE, 'w') as f:
-                # Use the custom encoder to handle numpy/pandas types
-                json.dump(final_output, f, indent=4, cls=NumpyEncoder)
+            with pipeline_metrics.span("main.save_results"):
+                results_writer.finalize(final_week_state, final_recommendations)
+                remove_output(stale_output)
 
-            file_size = os.path.getsize(OUTPUT_FILE) / 1024  # Size in KB
+            file_size = os.path.getsize(output_path) / 1024  # Size in KB
             total_time = time.time() - total_start_time
 
-            print(f"[OK] Results saved to {OUTPUT_FILE}")
+            print(f"[OK] Results saved to {output_path}")
             print(f"[OK] File size: {file_size:.1f} KB")
+            if agent_logger.audit_log_file:
+                print(f"[OK] Audit log saved to {agent_logger.audit_log_file}")
             print("\n" + "=" * 80)
             print("AI AGENT RUN COMPLETE - INTELLIGENT RECOMMENDATIONS GENERATED")
             print("=" * 80)
             print(f"\nSummary:")
             print(f"   - Processed {max_week} weeks of campaign data")
-            print(f"   - Generated {max_week - START_WEEK + 1} sets of intelligent recommendations (weeks {START_WEEK}-{max_week})")
+            print(f"   - Generated {len(recommendation_weeks)} sets of intelligent recommendations (weeks {recommendation_weeks.start}-{max_week})")
             print(f"   - Weeks 1-2: Baseline data collection only (no recommendations)")
-            print(f"   - Analyzed {len(data['campaigns']['campaign_id'].unique())} campaigns")
-            print(f"   - Optimized {len(data['ad_groups']['ad_group_id'].unique())} ad groups")
-            print(f"   - Evaluated {len(data['audiences']['audience_id'].unique())} audience segments")
+            if data is not None:
+                print(f"   - Analyzed {len(data['campaigns']['campaign_id'].unique())} campaigns")
+                print(f"   - Optimized {len(data['ad_groups']['ad_group_id'].unique())} ad groups")
+                print(f"   - Evaluated {len(data['audiences']['audience_id'].unique())} audience segments")
             print(f"   - Total execution time: {total_time/60:.2f} minutes")
+            cache_stats = agent.cache.stats()
+            if cache_stats["enabled"]:
+                print(f"   - LLM response cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+            if pipeline_metrics.enabled:
+                print(f"\nStage timings:\n{pipeline_metrics.format_table()}")
+                print(f"[OK] Metrics saved to {pipeline_metrics.save()}")
             print(f"\nNext step: Open frontend/index.html to view the interactive dashboard")
             print("=" * 80 + "\n")
         except Exception as e:
@@ -176,10 +361,23 @@ def run_agent_and_save_results():
         print("[ERROR] ERROR DURING AGENT RUN")
         print("=" * 80)
         print(f"\nError: {e}")
+        if results_writer is not None and not results_writer.finalized:
+            results_writer.close()
+            print(f"Completed weeks ({results_writer.weeks_written}) kept in {results_writer.partial_path}")
+        if checkpoint_store.enabled:
+            print(f"Finished weeks are checkpointed in {checkpoint_store.checkpoint_dir}; "
+                  f"run `python -m backend.main --resume` to continue")
         print("\nFull traceback:")
         traceback.print_exc()
         print("\n" + "=" * 80 + "\n")
         return
 
+def main():
+    parser = argparse.ArgumentParser(description="Run the marketing agent over every week and save the results.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Reuse the checkpoints of weeks whose inputs have not changed")
+    args = parser.parse_args()
+    run_agent_and_save_results(resume=args.resume)
+
 if __name__ == "__main__":
-    run_agent_and_save_results()
+    main()
@@ -0,0 +1,333 @@
+"""
+Mock LLM Server - Local stand-in for the OpenAI chat-completions API.
+
+Answers POST /v1/chat/completions with schema-valid agent decisions for
+every ad group and audience found in the prompt, so PolicyAgent can be
+benchmarked and load-tested offline. Latency, token throughput, error
+rates and truncated-JSON responses are configurable to exercise
+concurrency, retry and parsing paths.
+
+Usage:
+    python -m backend.services.mock_llm_server --port 8001 --latency-mean 2.0 --error-rate 0.05
+
+Then point the agent at it with "llm": {"base_url": "http://127.0.0.1:8001/v1"}
+in policy.json.
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BID_ACTIONS = ["raise_bid", "no_change", "lower_bid"]
+AUDIENCE_ACTIONS = ["activate", "no_change", "suppress"]
+
+# Action mix roughly matching the distribution the prompt asks for (30/40/30)
+ACTION_WEIGHTS = [0.3, 0.4, 0.3]
+
+
+class MockLLMConfig:
+    """Behaviour knobs for the mock server."""
+
+    def __init__(self, latency_dist="fixed", latency_mean=0.5, latency_std=0.2,
+                 tokens_per_second=0.0, error_rate=0.0, rate_limit_rate=0.0,
+                 truncate_rate=0.0, seed=0):
+        """
+        Args:
+            latency_dist: "fixed", "uniform" (mean +/- std), "normal" or "lognormal"
+            latency_mean: Mean time-to-first-token in seconds
+            latency_std: Spread of the latency distribution in seconds
+            tokens_per_second: Completion generation speed (0 = instant)
+            error_rate: Probability of answering with HTTP 500
+            rate_limit_rate: Probability of answering with HTTP 429
+            truncate_rate: Probability of cutting the JSON content short
+            seed: Seed for injected failures, latency and generated decisions
+        """
+        self.latency_dist = latency_dist
+        self.latency_mean = latency_mean
+        self.latency_std = latency_std
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.truncate_rate = truncate_rate
+        self.seed = seed
+
+
+class MockLLMState:
+    """Thread-safe request counters and random source shared by all handlers."""
+
+    def __init__(self, config):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.lock = threading.Lock()
+        self.counters = {
+            "requests": 0,
+            "completed": 0,
+            "errors": 0,
+            "rate_limited": 0,
+            "truncated": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0
+        }
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.counters[key] += amount
+
+    def draw(self):
+        with self.lock:
+            return self.rng.random()
+
+    def sample_latency(self):
+        config = self.config
+        with self.lock:
+            if config.latency_dist == "uniform":
+                value = self.rng.uniform(config.latency_mean - config.latency_std,
+                                         config.latency_mean + config.latency_std)
+            elif config.latency_dist == "normal":
+                value = self.rng.gauss(config.latency_mean, config.latency_std)
+            elif config.latency_dist == "lognormal" and config.latency_mean > 0:
+                # Parameterised so the distribution has the requested mean and std
+                variance = config.latency_std ** 2
+                sigma_sq = math.log(1 + variance / config.latency_mean ** 2)
+                mu = math.log(config.latency_mean) - sigma_sq / 2
+                value = self.rng.lognormvariate(mu, sigma_sq ** 0.5)
+            else:
+                value = config.latency_mean
+        return max(0.0, value)
+
+
+def extract_entity_ids(prompt):
+    """
+    Finds the ad group and audience IDs in a prompt.
+
+    Supports both state encodings: the compact tables ("table") and the
+    Python dict repr ("repr").
+
+    Returns:
+        (ad_group_ids, audience_ids) in order of first appearance
+    """
+    if "AD_GROUPS (" in prompt:
+        return _table_ids(prompt, "AD_GROUPS (", "ad_group_id"), _table_ids(prompt, "AUDIENCES (", "audience_id")
+
+    ad_group_ids = [int(x) for x in re.findall(r"'ad_group_id': (\d+)", prompt)]
+    audience_section = prompt.split("'audiences': [", 1)[1] if "'audiences': [" in prompt else ""
+    audience_ids = re.findall(r"'audience_id': '([^']+)'", audience_section)
+    return list(dict.fromkeys(ad_group_ids)), list(dict.fromkeys(audience_ids))
+
+
+def _table_ids(prompt, title, id_column):
+    """Reads the id_column values of a state_encoder table section (located by its header)."""
+    if title not in prompt:
+        return []
+    lines = prompt.split(title, 1)[1].splitlines()[1:]
+
+    ids = []
+    position = None
+    for row in csv.reader(_table_lines(lines)):
+        if position is None:
+            if id_column not in row:
+                return []  # Fields configuration left the ID column out
+            position = row.index(id_column)
+            continue
+        value = row[position] if position < len(row) else ""
+        if value:
+            ids.append(int(value) if value.isdigit() else value)
+    return list(dict.fromkeys(ids))
+
+
+def _table_lines(lines):
+    """Yields the header and data rows of a table section (skipping code legends)."""
+    for line in lines:
+        if not line.strip() or line.startswith("==="):
+            return
+        if " codes: " in line or line == "(none)":
+            continue
+        yield line
+
+
+def generate_decisions(prompt, seed=0):
+    """Builds a deterministic, schema-valid decision set for the IDs in a prompt."""
+    ad_group_ids, audience_ids = extract_entity_ids(prompt)
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    rng = random.Random(f"{seed}:{digest}")
+
+    return {
+        "ad_group_bid_actions": [
+            {
+                "ad_group_id": ad_group_id,
+                "type": rng.choices(BID_ACTIONS, ACTION_WEIGHTS)[0],
+                "reason": "Mock decision generated by the local LLM stand-in for offline benchmarking."
+            }
+            for ad_group_id in ad_group_ids
+        ],
+        "audience_targeting_actions": [
+            {
+                "audience_id": audience_id,
+                "type": rng.choices(AUDIENCE_ACTIONS, ACTION_WEIGHTS)[0],
+                "reason": "Mock decision generated by the local LLM stand-in for offline benchmarking."
+            }
+            for audience_id in audience_ids
+        ],
+        "explanation": "Mock explanation generated by the local LLM stand-in."
+    }
+
+
+def make_handler(state):
+    """Creates the request handler class bound to a MockLLMState."""
+
+    class MockLLMHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.rstrip("/") in ("/health", "/v1/health"):
+                self._send_json(200, {"status": "ok"})
+            elif self.path.rstrip("/") in ("/stats", "/v1/stats"):
+                with state.lock:
+                    self._send_json(200, dict(state.counters))
+            else:
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "not_found"}})
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "not_found"}})
+                return
+
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError:
+                self._send_json(400, {"error": {"message": "Invalid JSON body", "type": "invalid_request_error"}})
+                return
+
+            state.count("requests")
+            config = state.config
+            messages = body.get("messages", [])
+            prompt = messages[-1].get("content", "") if messages else ""
+            prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 4
+
+            # Time to first token
+            time.sleep(state.sample_latency())
+
+            # Injected failures
+            if state.draw() < config.rate_limit_rate:
+                state.count("rate_limited")
+                self._send_json(429, {"error": {"message": "Injected rate limit", "type": "rate_limit_error"}})
+                return
+            if state.draw() < config.error_rate:
+                state.count("errors")
+                self._send_json(500, {"error": {"message": "Injected server error", "type": "server_error"}})
+                return
+
+            content = json.dumps(generate_decisions(prompt, config.seed))
+            finish_reason = "stop"
+            if state.draw() < config.truncate_rate:
+                state.count("truncated")
+                content = content[:max(1, int(len(content) * state.draw()))]
+                finish_reason = "length"
+
+            # Generation time at the configured throughput
+            completion_tokens = max(1, len(content) // 4)
+            if config.tokens_per_second > 0:
+                time.sleep(completion_tokens / config.tokens_per_second)
+
+            state.count("completed")
+            state.count("prompt_tokens", prompt_tokens)
+            state.count("completion_tokens", completion_tokens)
+
+            self._send_json(200, {
+                "id": f"chatcmpl-mock-{uuid.uuid4().hex[:12]}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "mock"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": finish_reason
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens
+                }
+            })
+
+        def _send_json(self, status, payload):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            # Keep benchmark output clean; counters are available at /stats
+            pass
+
+    return MockLLMHandler
+
+
+def create_server(host="127.0.0.1", port=8001, config=None):
+    """Creates (but does not start) a threaded mock server; port 0 picks a free port."""
+    state = MockLLMState(config or MockLLMConfig())
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    server.mock_state = state
+    return server
+
+
+def start_in_background(host="127.0.0.1", port=0, config=None):
+    """
+    Starts a mock server on a daemon thread (for benchmarks and scripts).
+
+    Returns:
+        (server, base_url) - call server.shutdown() when done
+    """
+    server = create_server(host, port, config)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stand-in for the marketing agent.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-dist", default="fixed", choices=["fixed", "uniform", "normal", "lognormal"])
+    parser.add_argument("--latency-mean", type=float, default=0.5, help="Mean time-to-first-token (seconds)")
+    parser.add_argument("--latency-std", type=float, default=0.2, help="Latency spread (seconds)")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Completion throughput (0 = instant)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of HTTP 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Probability of HTTP 429")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="Probability of truncated JSON content")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    config = MockLLMConfig(
+        latency_dist=args.latency_dist,
+        latency_mean=args.latency_mean,
+        latency_std=args.latency_std,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        truncate_rate=args.truncate_rate,
+        seed=args.seed
+    )
+    server = create_server(args.host, args.port, config)
+    print(f"Mock LLM server listening on http://{args.host}:{server.server_address[1]}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
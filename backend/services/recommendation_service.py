@@ -0,0 +1,449 @@
+"""
+Recommendation Service - Long-running local HTTP service over the agent.
+
+Loads the input tables once into a WeeklyDataStore and serves enriched
+states and recommendations per week, memoizing both (and their encoded
+JSON) in memory, so repeated requests for a week skip the cold pipeline
+of `python -m backend.main`. New weeks can be appended while it runs; they
+are also appended to the data CSVs, so they survive a restart.
+
+Endpoints:
+    GET  /health
+    GET  /weeks                         loaded weeks and which are cached
+    GET  /weeks/<week>/state            enriched state ("latest" for the last week)
+    GET  /weeks/<week>/recommendations  PolicyAgent decisions for the week
+    POST /weeks                         append the next week (in memory and to the CSVs):
+                                        {"campaigns": [...], "ad_groups": [...], "audiences": [...]}
+    GET  /stats                         cache hits/misses and appended weeks
+
+Usage:
+    python -m backend.services.recommendation_service --port 8000
+    python -m backend.services.recommendation_service --data-dir /tmp/synthetic --preload
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import pandas as pd
+from backend.agent.state_manager import get_state_for_week
+from backend.logic.data_store import WeeklyDataStore
+from backend.logic.logger import agent_logger
+from backend.logic.metrics import pipeline_metrics
+from backend.logic.policy_loader import policy_loader
+from backend.logic.results_writer import NumpyEncoder
+from backend.logic.table_cache import table_cache, apply_lean_schema
+
+# Same as main.py's START_WEEK: trend analysis needs 3 weeks of history
+MIN_RECOMMENDATION_WEEK = 3
+
+TABLES = ("campaigns", "ad_groups", "audiences")
+
+
+class ServiceError(Exception):
+    """Request error carrying the HTTP status to answer with."""
+
+    def __init__(self, status, message, error_type="invalid_request_error"):
+        super().__init__(message)
+        self.status = status
+        self.error_type = error_type
+
+
+class RecommendationService:
+    """
+    Warm, in-memory backend of the HTTP service.
+
+    States and recommendations are computed on first request and kept
+    until a week is appended. Appending clears them all, since the batch
+    enrichment of every week (weeks_above_median) depends on every loaded
+    week. Recommendations are computed one at a time because PolicyAgent
+    logs through the global agent_logger.
+
+    The shared lock only guards the memo tables and is never held while a
+    state or recommendation is computed, so cached weeks are served while
+    other weeks are being computed; a per-week lock keeps concurrent
+    requests for the same week from computing it twice.
+    """
+
+    def __init__(self, data, agent=None, data_files=None):
+        """
+        Args:
+            data: Dictionary of DataFrames (campaigns, ad_groups, audiences)
+            agent: PolicyAgent to use (created on the first recommendations request)
+            data_files: CSVs the data was loaded from; appended weeks are
+                written to them (None = appended weeks are kept in memory only)
+        """
+        self.store = WeeklyDataStore(data)
+        self.data_files = data_files
+        self._agent = agent
+        self._lock = threading.RLock()
+        self._agent_lock = threading.Lock()
+        self._week_locks = {}
+        self._generation = 0
+        self._states = {}
+        self._recommendations = {}
+        self._bodies = {}
+        self.counters = {
+            "state_hits": 0,
+            "state_misses": 0,
+            "recommendation_hits": 0,
+            "recommendation_misses": 0,
+            "appended_weeks": 0
+        }
+
+    @classmethod
+    def from_files(cls, data_files=None, agent=None):
+        """Loads the tables (through the table cache) and builds the service over those CSVs."""
+        from backend.main import DATA_FILES, load_data
+        data_files = data_files or DATA_FILES
+        return cls(load_data(data_files), agent=agent, data_files=data_files)
+
+    @property
+    def agent(self):
+        if self._agent is None:
+            from backend.agent.policy_agent import PolicyAgent
+            self._agent = PolicyAgent()
+        return self._agent
+
+    def weeks(self):
+        """Returns the loaded weeks and the weeks with memoized results."""
+        with self._lock:
+            return {
+                "weeks": self.store.weeks(),
+                "latest_week": self.store.max_week(),
+                "cached_states": sorted(self._states),
+                "cached_recommendations": sorted(self._recommendations)
+            }
+
+    def resolve_week(self, week):
+        """Parses a week path segment ("latest" or a number) and checks it is loaded."""
+        with self._lock:
+            if week == "latest":
+                return self.store.max_week()
+            try:
+                week = int(week)
+            except (TypeError, ValueError):
+                raise ServiceError(400, f"Invalid week: {week}")
+            if week not in self.store.weeks():
+                raise ServiceError(404, f"Week {week} is not loaded", "not_found")
+            return week
+
+    def get_state(self, week):
+        """Returns the enriched state of a week, computing it on first use."""
+        state = self._cached_state(week)
+        if state is not None:
+            return state
+
+        with self._week_lock(week):
+            # A concurrent request may have computed it while we waited
+            state = self._cached_state(week)
+            if state is not None:
+                return state
+            with self._lock:
+                self.counters["state_misses"] += 1
+                store, generation = self.store, self._generation
+
+            with pipeline_metrics.span("service.state"):
+                state = get_state_for_week(store, week)
+
+            with self._lock:
+                # Drop states computed from data that changed in the meantime
+                if generation == self._generation:
+                    self._states[week] = state
+            return state
+
+    def get_recommendations(self, week):
+        """
+        Returns {"week", "decisions", "log_history"} for a week, running the
+        agent on first use.
+        """
+        if week < MIN_RECOMMENDATION_WEEK:
+            raise ServiceError(400, f"Week {week} has insufficient history; recommendations start from week {MIN_RECOMMENDATION_WEEK}")
+
+        cached = self._cached_recommendations(week)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            generation = self._generation
+        state = self.get_state(week)
+
+        with self._agent_lock:
+            # Computed by the request that held the agent before us
+            cached = self._cached_recommendations(week)
+            if cached is not None:
+                return cached
+            with self._lock:
+                self.counters["recommendation_misses"] += 1
+
+            with pipeline_metrics.span("service.recommendations"):
+                results = self.agent.get_recommendations(state)
+            # Only this week's step is returned (results["log_history"]); drop
+            # the logger's cumulative history so this long-running process
+            # does not keep every prompt and raw output it has ever sent
+            agent_logger.log_history = []
+            recommendations = {"week": week, **results}
+
+            with self._lock:
+                # Drop results computed from data that changed in the meantime
+                if generation == self._generation:
+                    self._recommendations[week] = recommendations
+            return recommendations
+
+    def encoded(self, kind, week):
+        """Returns the memoized JSON body of a week's "state" or "recommendations"."""
+        with self._lock:
+            body = self._bodies.get((kind, week))
+            if body is not None:
+                return body
+            generation = self._generation
+
+        value = self.get_state(week) if kind == "state" else self.get_recommendations(week)
+        body = json.dumps(value, cls=NumpyEncoder).encode("utf-8")
+
+        with self._lock:
+            if generation == self._generation:
+                self._bodies[(kind, week)] = body
+        return body
+
+    def append_week(self, tables):
+        """
+        Appends the rows of the week after the latest loaded week, to the
+        loaded tables and (when the service has data_files) to the CSVs.
+
+        Args:
+            tables: {"campaigns": [row, ...], "ad_groups": [...], "audiences": [...]},
+                rows carrying every column of the loaded tables ("week" may be
+                omitted and defaults to the next week)
+
+        Returns:
+            {"week": new week, "rows": {table: appended row count}}
+        """
+        with self._lock:
+            latest_week = self.store.max_week()
+            week = 1 if latest_week is None else latest_week + 1
+
+            frames = {}
+            for key in TABLES:
+                rows = tables.get(key) if isinstance(tables, dict) else None
+                if not rows or not isinstance(rows, list):
+                    raise ServiceError(400, f"'{key}' must be a non-empty list of rows for week {week}")
+                frames[key] = _week_frame(self.store[key], rows, key, week)
+
+            data = {key: _concat_tables(self.store[key], frames[key], key) for key in TABLES}
+            # Persist before swapping the store, so the CSVs never miss a served week
+            if self.data_files:
+                _append_to_csv(frames, self.data_files)
+            self.store = WeeklyDataStore(data)
+
+            self._generation += 1
+            self._states.clear()
+            self._recommendations.clear()
+            self._bodies.clear()
+            self.counters["appended_weeks"] += 1
+            return {"week": week, "rows": {key: len(frame) for key, frame in frames.items()}}
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, latest_week=self.store.max_week())
+
+    def _cached_state(self, week):
+        with self._lock:
+            state = self._states.get(week)
+            if state is not None:
+                self.counters["state_hits"] += 1
+            return state
+
+    def _cached_recommendations(self, week):
+        with self._lock:
+            cached = self._recommendations.get(week)
+            if cached is not None:
+                self.counters["recommendation_hits"] += 1
+            return cached
+
+    def _week_lock(self, week):
+        """Returns the lock serializing state computations of one week."""
+        with self._lock:
+            return self._week_locks.setdefault(week, threading.Lock())
+
+
+def _week_frame(table, rows, key, week):
+    """Builds a new week's rows for `key` with the loaded table's columns."""
+    try:
+        frame = pd.DataFrame.from_records(rows)
+    except (TypeError, ValueError) as e:
+        raise ServiceError(400, f"Invalid rows for '{key}': {e}")
+
+    if "week" not in frame.columns:
+        frame["week"] = week
+    elif (frame["week"] != week).any():
+        raise ServiceError(400, f"Rows for '{key}' must all be week {week}")
+
+    missing = [column for column in table.columns if column not in frame.columns]
+    if missing:
+        raise ServiceError(400, f"Rows for '{key}' are missing columns: {', '.join(missing)}")
+    return frame[list(table.columns)]
+
+
+def _concat_tables(table, frame, key):
+    """Appends frame to table, keeping the table's column types."""
+    for column, dtype in table.dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            continue
+        try:
+            frame = frame.assign(**{column: frame[column].astype(dtype)})
+        except (TypeError, ValueError):
+            raise ServiceError(400, f"Column '{column}' of '{key}' does not match type {dtype}")
+
+    combined = pd.concat([table, frame], ignore_index=True)
+    # Categorical columns come back as plain strings; re-encode them
+    if table_cache.lean_dtypes:
+        combined = apply_lean_schema(combined, key)
+    return combined
+
+
+def _append_to_csv(frames, data_files):
+    """Appends a week's rows to the CSVs like backend/ingest_week.py, rolling them back on failure."""
+    from backend.ingest_week import append_rows, truncate_rows
+    sizes = {key: os.path.getsize(data_files[key]) for key in frames}
+    try:
+        append_rows(frames, data_files)
+    except BaseException:
+        truncate_rows(sizes, data_files)
+        raise
+
+
+def make_handler(service):
+    """Creates the request handler class bound to a RecommendationService."""
+
+    class RecommendationHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            parts = [part for part in urlsplit(self.path).path.split("/") if part]
+            try:
+                if parts == ["health"]:
+                    self._send_json(200, {"status": "ok"})
+                elif parts == ["stats"]:
+                    self._send_json(200, service.stats())
+                elif parts == ["weeks"]:
+                    self._send_json(200, service.weeks())
+                elif len(parts) == 3 and parts[0] == "weeks" and parts[2] in ("state", "recommendations"):
+                    week = service.resolve_week(parts[1])
+                    self._send_body(200, service.encoded(parts[2], week))
+                else:
+                    raise ServiceError(404, f"Unknown path {self.path}", "not_found")
+            except ServiceError as e:
+                self._send_error(e)
+            except Exception as e:
+                self._send_internal_error(e)
+
+        def do_POST(self):
+            parts = [part for part in urlsplit(self.path).path.split("/") if part]
+            try:
+                if parts != ["weeks"]:
+                    raise ServiceError(404, f"Unknown path {self.path}", "not_found")
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    raise ServiceError(400, "Invalid Content-Length header")
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except json.JSONDecodeError:
+                    raise ServiceError(400, "Invalid JSON body")
+                self._send_json(201, service.append_week(body))
+            except ServiceError as e:
+                self._send_error(e)
+            except Exception as e:
+                self._send_internal_error(e)
+
+        def _send_error(self, error):
+            self._send_json(error.status, {"error": {"message": str(error), "type": error.error_type}})
+
+        def _send_internal_error(self, error):
+            # LLM/network failures, invalid LLM output, enrichment errors, ...
+            print(f"[ERROR] {self.command} {self.path} failed:")
+            traceback.print_exc()
+            self._send_error(ServiceError(500, f"{type(error).__name__}: {error}", "server_error"))
+
+        def _send_json(self, status, payload):
+            self._send_body(status, json.dumps(payload, cls=NumpyEncoder).encode("utf-8"))
+
+        def _send_body(self, status, data):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            # Request counters are available at /stats
+            pass
+
+    return RecommendationHandler
+
+
+def create_server(service, host="127.0.0.1", port=8000):
+    """Creates (but does not start) a threaded server; port 0 picks a free port."""
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def start_in_background(service, host="127.0.0.1", port=0):
+    """
+    Starts the service on a daemon thread (for scripts and benchmarks).
+
+    Returns:
+        (server, base_url) - call server.shutdown() when done
+    """
+    server = create_server(service, host, port)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve weekly states and recommendations from warm in-memory data.")
+    parser.add_argument("--host", default=policy_loader.get_value('service', 'host', default="127.0.0.1"))
+    parser.add_argument("--port", type=int, default=policy_loader.get_value('service', 'port', default=8000))
+    parser.add_argument("--data-dir", default=None, help="Directory with campaigns.csv, ad_groups.csv, audiences.csv (default: backend/data)")
+    parser.add_argument("--preload", action="store_true", help="Build every week's state before serving")
+    args = parser.parse_args()
+
+    data_files = None
+    if args.data_dir:
+        data_files = {key: os.path.join(args.data_dir, f"{key}.csv") for key in TABLES}
+
+    print("Loading campaign data...", end=" ", flush=True)
+    start = time.perf_counter()
+    service = RecommendationService.from_files(data_files)
+    weeks = service.store.weeks()
+    print(f"DONE ({time.perf_counter() - start:.1f}s, weeks {weeks[0]}-{weeks[-1]})" if weeks else "DONE (no data)")
+
+    if args.preload:
+        print("Building weekly states...", end=" ", flush=True)
+        start = time.perf_counter()
+        for week in service.store.weeks():
+            service.get_state(week)
+        print(f"DONE ({time.perf_counter() - start:.1f}s)")
+
+    server = create_server(service, args.host, args.port)
+    print(f"Recommendation service listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,9 @@
 const RESULTS_FILE = 'results.json';
+const RESULTS_DIR = 'results/'; // Sharded output: manifest.json + one file per week
+const MANIFEST_FILE = RESULTS_DIR + 'manifest.json';
 let globalData = null;
+let weekCache = {}; // week number -> Promise of that week's history entry (fetched on demand)
+let seriesPromise = null; // Promise of the per-campaign chart series
 let fullData = null; // Store complete data including week 12
 let currentWeekIndex = null;
 let roasChart = null;
@@ -663,59 +667,46 @@ function renderPerformanceCharts() {
 
     const campaignHistory = globalData.campaign_history;
 
-    // Check if first week has valid data
-    if (!campaignHistory[0] || !campaignHistory[0].state_snapshot || !Array.isArray(campaignHistory[0].state_snapshot.campaigns)) {
-        console.error('Invalid campaign data structure');
-        return;
-    }
-
-    // Always use ALL weeks for the charts (static display)
-    const weeks = campaignHistory.map(entry => `Week ${entry.week}`);
-
-    // Build a map of campaign_id -> {name, roas_data[], cvr_data[]}
-    const campaignMap = {};
-
-    // Initialize campaign map with all campaigns from the first week
-    campaignHistory[0].state_snapshot.campaigns.forEach(campaign => {
-        campaignMap[campaign.campaign_id] = {
-            name: campaign.campaign_name,
-            roasData: [],
-            cvrData: []
-        };
-    });
-
-    // Populate data for each campaign across all weeks
-    campaignHistory.forEach(entry => {
-        entry.state_snapshot.campaigns.forEach(campaign => {
-            const campId = campaign.campaign_id;
-
-            // Add ROAS data
-            campaignMap[campId].roasData.push(campaign.roas);
+    // Charts need every week, so they read the compact series file instead of the week shards
+    loadSeries()
+        .then(series => {
+            if (!series || !Array.isArray(series.campaigns)) {
+                console.error('Invalid campaign series structure');
+                return;
+            }
 
-            // Add CVR data (conversion rate percentage)
-            const conversions = campaign.weekly_conversions || 0;
-            const spent = campaign.weekly_budget_spent || 0;
-            // Calculate CVR as conversions per dollar spent (scaled to percentage)
-            // Or we can use a simple metric: conversions as a rate
-            const cvr = spent > 0 ? (conversions / spent) * 100 : 0;
-            campaignMap[campId].cvrData.push(cvr);
+            // Only chart the weeks currently visible (demo mode hides the last one)
+            const weekCount = campaignHistory.length;
+            const weeks = campaignHistory.map(entry => `Week ${entry.week}`);
+
+            // Build a map of campaign_id -> {name, roas_data[], cvr_data[]}
+            const campaignMap = {};
+            series.campaigns.forEach(campaign => {
+                campaignMap[campaign.campaign_id] = {
+                    name: campaign.campaign_name,
+                    roasData: campaign.roas.slice(0, weekCount),
+                    cvrData: campaign.cvr.slice(0, weekCount)
+                };
+            });
+
+            // Update week indicators to show full range
+            const maxWeek = campaignHistory[campaignHistory.length - 1].week;
+            document.getElementById('charts-current-week').textContent = maxWeek;
+
+            // Show the charts section
+            document.getElementById('performance-charts').style.display = 'block';
+
+            // Populate single campaign selector for both charts
+            populateCampaignSelector(campaignMap);
+
+            // Render both charts with the same selected campaigns (initially show top 5)
+            const selectedCampaigns = getSelectedCampaigns();
+            renderROASChart(weeks, campaignMap, selectedCampaigns);
+            renderCVRChart(weeks, campaignMap, selectedCampaigns);
+        })
+        .catch(error => {
+            console.error('Chart data load error:', error);
         });
-    });
-
-    // Update week indicators to show full range
-    const maxWeek = campaignHistory[campaignHistory.length - 1].week;
-    document.getElementById('charts-current-week').textContent = maxWeek;
-
-    // Show the charts section
-    document.getElementById('performance-charts').style.display = 'block';
-
-    // Populate single campaign selector for both charts
-    populateCampaignSelector(campaignMap);
-
-    // Render both charts with the same selected campaigns (initially show top 5)
-    const selectedCampaigns = getSelectedCampaigns();
-    renderROASChart(weeks, campaignMap, selectedCampaigns);
-    renderCVRChart(weeks, campaignMap, selectedCampaigns);
 }
 
 function populateCampaignSelector(campaignMap) {
@@ -726,10 +717,13 @@ function populateCampaignSelector(campaignMap) {
     select.parentNode.replaceChild(newSelect, select);
 
     // Get campaign IDs sorted by average ROAS (descending)
+    // (weeks where a campaign did not run are null and skipped)
+    const averageRoas = data => {
+        const values = data.filter(val => val !== null);
+        return values.length > 0 ? values.reduce((sum, val) => sum + val, 0) / values.length : 0;
+    };
     const campaignIds = Object.keys(campaignMap).sort((a, b) => {
-        const avgRoasA = campaignMap[a].roasData.reduce((sum, val) => sum + val, 0) / campaignMap[a].roasData.length;
-        const avgRoasB = campaignMap[b].roasData.reduce((sum, val) => sum + val, 0) / campaignMap[b].roasData.length;
-        return avgRoasB - avgRoasA;
+        return averageRoas(campaignMap[b].roasData) - averageRoas(campaignMap[a].roasData);
     });
 
     // Default campaigns to select (campaigns 8, 12, 22, 25)
@@ -1033,18 +1027,172 @@ function updateNavigatorState() {
 
 function updateWeekDisplay(weekIndex) {
     currentWeekIndex = parseInt(weekIndex);
-    const weekData = globalData.campaign_history[currentWeekIndex];
-
-    const weekNumber = weekData.week;
-    const state = weekData.state_snapshot;
-    const recommendations = weekData.recommendations;
+    const requestedIndex = currentWeekIndex;
+    const weekNumber = globalData.campaign_history[requestedIndex].week;
 
     // Update week display
     document.getElementById('latest-week').textContent = weekNumber;
 
-    // Render sections with selected week's data
-    renderActionSummaryCards(recommendations);
-    renderThreeColumnRecommendations(recommendations, state);
+    // Fetch the week's shard (cached after the first visit) before rendering
+    return loadWeek(requestedIndex)
+        .then(weekData => {
+            // Ignore responses for weeks the user already navigated away from
+            if (requestedIndex !== currentWeekIndex) {
+                return;
+            }
+
+            const state = weekData.state_snapshot;
+            const recommendations = weekData.recommendations;
+
+            // Render sections with selected week's data
+            renderActionSummaryCards(recommendations);
+            renderThreeColumnRecommendations(recommendations, state);
+
+            // Warm the cache for the most likely next navigation
+            if (requestedIndex > 0) {
+                loadWeek(requestedIndex - 1).catch(() => {});
+            }
+        })
+        .catch(error => {
+            console.error('Week load error:', error);
+            document.getElementById('status').innerHTML = `<strong>Error:</strong> Could not load week ${weekNumber}: ${error.message}`;
+        });
+}
+
+// ===========================================
+// Results Loading (manifest + lazily fetched week shards)
+// ===========================================
+function validateWeekEntry(entry) {
+    if (!entry || !entry.state_snapshot) {
+        throw new Error(`state_snapshot missing from week ${entry ? entry.week : '?'}`);
+    }
+
+    if (!Array.isArray(entry.state_snapshot.campaigns)) {
+        throw new Error('campaigns is not an array: ' + typeof entry.state_snapshot.campaigns);
+    }
+
+    return entry;
+}
+
+function fetchResults() {
+    // Reset caches so a reload picks up a fresh run
+    weekCache = {};
+    seriesPromise = null;
+
+    // Prefer the small manifest; fall back to the single results.json
+    return fetch(MANIFEST_FILE)
+        .then(response => {
+            if (!response.ok) {
+                return fetchMonolithicResults();
+            }
+            return response.json().then(manifest => {
+                if (!manifest || !Array.isArray(manifest.weeks) || manifest.weeks.length === 0) {
+                    throw new Error('Invalid manifest: weeks missing or empty');
+                }
+
+                return {
+                    latest_week: manifest.latest_week,
+                    campaign_history: manifest.weeks, // {week, file, counts, actions, kpis}
+                    series_file: RESULTS_DIR + manifest.series_file
+                };
+            });
+        });
+}
+
+function fetchMonolithicResults() {
+    return fetch(RESULTS_FILE)
+        .then(response => {
+            if (!response.ok) throw new Error('Results file not found');
+            return response.json();
+        })
+        .then(data => {
+            // Validate data structure
+            if (!data || !data.campaign_history || !Array.isArray(data.campaign_history)) {
+                throw new Error('Invalid data structure: campaign_history missing or not an array');
+            }
+
+            if (data.campaign_history.length === 0) {
+                throw new Error('campaign_history is empty');
+            }
+
+            validateWeekEntry(data.campaign_history[0]);
+
+            // Every week is already in memory: seed the caches from it
+            data.campaign_history.forEach(entry => {
+                weekCache[entry.week] = Promise.resolve(entry);
+            });
+            seriesPromise = Promise.resolve(buildSeriesFromHistory(data.campaign_history));
+
+            return data;
+        });
+}
+
+function buildSeriesFromHistory(campaignHistory) {
+    // Same shape as the backend's series.json
+    const campaigns = {};
+    campaignHistory.forEach((entry, index) => {
+        entry.state_snapshot.campaigns.forEach(campaign => {
+            if (!campaigns[campaign.campaign_id]) {
+                campaigns[campaign.campaign_id] = {
+                    campaign_id: campaign.campaign_id,
+                    campaign_name: campaign.campaign_name,
+                    roas: new Array(index).fill(null),
+                    cvr: new Array(index).fill(null)
+                };
+            }
+
+            // CVR as conversions per unit of spend (scaled to percentage)
+            const conversions = campaign.weekly_conversions || 0;
+            const spent = campaign.weekly_budget_spent || 0;
+            campaigns[campaign.campaign_id].roas[index] = campaign.roas;
+            campaigns[campaign.campaign_id].cvr[index] = spent > 0 ? (conversions / spent) * 100 : 0;
+        });
+    });
+
+    return {
+        weeks: campaignHistory.map(entry => entry.week),
+        campaigns: Object.values(campaigns).map(campaign => ({
+            ...campaign,
+            roas: Array.from({ length: campaignHistory.length }, (_, i) => campaign.roas[i] ?? null),
+            cvr: Array.from({ length: campaignHistory.length }, (_, i) => campaign.cvr[i] ?? null)
+        }))
+    };
+}
+
+function loadWeek(weekIndex) {
+    const summary = globalData.campaign_history[weekIndex];
+
+    if (!weekCache[summary.week]) {
+        weekCache[summary.week] = fetch(RESULTS_DIR + summary.file)
+            .then(response => {
+                if (!response.ok) throw new Error(`Week ${summary.week} shard not found`);
+                return response.json();
+            })
+            .then(validateWeekEntry)
+            .catch(error => {
+                // Allow a retry on the next navigation
+                delete weekCache[summary.week];
+                throw error;
+            });
+    }
+
+    return weekCache[summary.week];
+}
+
+function loadSeries() {
+    if (!seriesPromise) {
+        seriesPromise = fetch(globalData.series_file)
+            .then(response => {
+                if (!response.ok) throw new Error('Chart series file not found');
+                return response.json();
+            })
+            .catch(error => {
+                seriesPromise = null;
+                throw error;
+            });
+    }
+
+    return seriesPromise;
 }
 
 // ===========================================
@@ -1070,31 +1218,10 @@ function loadResults() {
 }
 
 function loadInitialData() {
-    fetch(RESULTS_FILE)
-        .then(response => {
-            if (!response.ok) throw new Error('Results file not found');
-            return response.json();
-        })
+    fetchResults()
         .then(data => {
             console.log('Initial data loaded:', data);
 
-            // Validate data structure
-            if (!data || !data.campaign_history || !Array.isArray(data.campaign_history)) {
-                throw new Error('Invalid data structure: campaign_history missing or not an array');
-            }
-
-            if (data.campaign_history.length === 0) {
-                throw new Error('campaign_history is empty');
-            }
-
-            if (!data.campaign_history[0].state_snapshot) {
-                throw new Error('state_snapshot missing from first week');
-            }
-
-            if (!Array.isArray(data.campaign_history[0].state_snapshot.campaigns)) {
-                throw new Error('campaigns is not an array: ' + typeof data.campaign_history[0].state_snapshot.campaigns);
-            }
-
             // Store the full data (including week 12)
             fullData = data;
 
@@ -1106,16 +1233,17 @@ function loadInitialData() {
 
             globalData = limitedData;
 
-            // Render static performance charts (with weeks 1-11 only)
-            renderPerformanceCharts();
-
             // Initialize week navigator (weeks 1-11 only)
             initializeWeekNavigator();
 
-            // Display week 11 (the latest available in demo mode)
-            updateWeekDisplay(globalData.campaign_history.length - 1);
-
+            // Display week 11 (the latest available in demo mode) - only this week's shard is fetched
+            return updateWeekDisplay(globalData.campaign_history.length - 1);
+        })
+        .then(() => {
             document.getElementById('status').innerHTML = '';
+
+            // Render static performance charts (with weeks 1-11 only) after the first paint
+            renderPerformanceCharts();
         })
         .catch(error => {
             console.error('Load error:', error);
@@ -1124,44 +1252,24 @@ function loadInitialData() {
 }
 
 function loadAllData() {
-    fetch(RESULTS_FILE)
-        .then(response => {
-            if (!response.ok) throw new Error('Results file not found');
-            return response.json();
-        })
+    fetchResults()
         .then(data => {
             console.log('Full data loaded:', data);
 
-            // Validate data structure
-            if (!data || !data.campaign_history || !Array.isArray(data.campaign_history)) {
-                throw new Error('Invalid data structure: campaign_history missing or not an array');
-            }
-
-            if (data.campaign_history.length === 0) {
-                throw new Error('campaign_history is empty');
-            }
-
-            if (!data.campaign_history[0].state_snapshot) {
-                throw new Error('state_snapshot missing from first week');
-            }
-
-            if (!Array.isArray(data.campaign_history[0].state_snapshot.campaigns)) {
-                throw new Error('campaigns is not an array: ' + typeof data.campaign_history[0].state_snapshot.campaigns);
-            }
-
             globalData = data;
             fullData = data;
 
-            // Render static performance charts (all weeks)
-            renderPerformanceCharts();
-
             // Initialize week navigator
             initializeWeekNavigator();
 
-            // Display the latest week by default
-            updateWeekDisplay(globalData.campaign_history.length - 1);
-
+            // Display the latest week by default - only this week's shard is fetched
+            return updateWeekDisplay(globalData.campaign_history.length - 1);
+        })
+        .then(() => {
             document.getElementById('status').innerHTML = '';
+
+            // Render static performance charts (all weeks) after the first paint
+            renderPerformanceCharts();
         })
         .catch(error => {
             console.error('Load error:', error);
@@ -1335,25 +1443,34 @@ function updateAdGroupTable(campaignId) {
         return;
     }
 
-    const history = globalData.campaign_history;
-    const campaignName = globalData.final_state_snapshot.campaigns.find(c => c.campaign_id === parseInt(campaignId))?.campaign_name || `Campaign ${campaignId}`;
-
-    let html = `<h5>${campaignName} - Weekly Performance</h5>`;
-    html += '<table><thead><tr><th>Week</th><th>Ad Group</th><th>Budget</th><th>Spend</th><th>ROAS</th></tr></thead><tbody>';
-
-    history.forEach(weekData => {
-        const adGroups = weekData.state_snapshot.ad_groups.filter(ag => ag.campaign_id === parseInt(campaignId));
-        adGroups.forEach(ag => {
-            html += `<tr>
-                <td>${weekData.week}</td>
-                <td>${ag.ad_group_name}</td>
-                <td>$${ag.weekly_budget_allocated.toFixed(2)}</td>
-                <td>$${ag.weekly_budget_spent.toFixed(2)}</td>
-                <td>${ag.roas.toFixed(2)}</td>
-            </tr>`;
+    // Needs every week: fetch (or reuse cached) shards for the whole history
+    const weekIndexes = globalData.campaign_history.map((_, index) => index);
+    Promise.all(weekIndexes.map(loadWeek)).then(history => {
+        const finalState = history[history.length - 1].state_snapshot;
+        const campaignName = finalState.campaigns.find(c => c.campaign_id === parseInt(campaignId))?.campaign_name || `Campaign ${campaignId}`;
+
+        let html = `<h5>${campaignName} - Weekly Performance</h5>`;
+        html += '<table><thead><tr><th>Week</th><th>Ad Group</th><th>Budget</th><th>Spend</th><th>ROAS</th></tr></thead><tbody>';
+
+        history.forEach(weekData => {
+            const adGroups = weekData.state_snapshot.ad_groups.filter(ag => ag.campaign_id === parseInt(campaignId));
+            adGroups.forEach(ag => {
+                html += `<tr>
+                    <td>${weekData.week}</td>
+                    <td>${ag.ad_group_name}</td>
+                    <td>$${ag.weekly_budget_allocated.toFixed(2)}</td>
+                    <td>$${ag.weekly_budget_spent.toFixed(2)}</td>
+                    <td>${ag.roas.toFixed(2)}</td>
+                </tr>`;
+            });
         });
-    });
 
-    html += '</tbody></table>';
-    container.innerHTML = html;
-}
+        html += '</tbody></table>';
+        container.innerHTML = html;
+    })
+    .catch(error => {
+        console.error('Ad group history load error:', error);
+        container.innerHTML = '<p>Ad group history unavailable.</p>';
+        document.getElementById('status').innerHTML = `<strong>Error:</strong> Could not load the ad group history: ${error.message}`;
+    });
+}
\ No newline at end of file
@@ -2,20 +2,12 @@
 Quick test script to verify the hybrid system works for a single week
 """
 import json
-import pandas as pd
 from backend.agent.policy_agent import PolicyAgent
 from backend.agent.state_manager import get_state_for_week
+from backend.logic.utils import load_all_data
 
-# Load data
-campaigns_df = pd.read_csv("backend/data/campaigns.csv")
-ad_groups_df = pd.read_csv("backend/data/ad_groups.csv")
-audiences_df = pd.read_csv("backend/data/audiences.csv")
-
-data = {
-    "campaigns": campaigns_df,
-    "ad_groups": ad_groups_df,
-    "audiences": audiences_df
-}
+# Load data (from the binary table cache when the CSVs are unchanged)
+data = load_all_data()
 
 # Get state for week 1
 print("Getting state for Week 1...")
@@ -0,0 +1,36 @@
+"""
+Regression test: incremental enrichment must agree with batch enrichment on
+the latest week, including campaigns with missing (NaN) ROAS values
+"""
+import numpy as np
+import pytest
+
+from backend.agent.state_manager import get_state_for_week
+from backend.logic.data_store import WeeklyDataStore
+from backend.logic.incremental_enricher import IncrementalEnricher
+from backend.logic.utils import load_all_data
+
+
+def campaign_fields(state, field):
+    return {campaign['campaign_id']: campaign.get(field) for campaign in state['campaigns']}
+
+
+@pytest.mark.parametrize("missing_roas", [0, 40])
+def test_latest_week_matches_batch(missing_roas):
+    data = {key: df.copy() for key, df in load_all_data().items()}
+    campaigns = data['campaigns']
+    rows = np.random.default_rng(7).choice(len(campaigns), size=missing_roas, replace=False)
+    campaigns.loc[campaigns.index[rows], 'roas'] = np.nan
+    store = WeeklyDataStore(data)
+    latest_week = store.max_week()
+
+    enricher = IncrementalEnricher()
+    for week in store.weeks():
+        incremental = get_state_for_week(store, week, enricher=enricher)
+    batch = get_state_for_week(store, latest_week)
+
+    assert campaign_fields(incremental, 'weeks_above_median') == campaign_fields(batch, 'weeks_above_median')
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
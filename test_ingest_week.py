@@ -0,0 +1,93 @@
+"""
+Regression test for weekly ingestion: a failure while appending the CSV
+rows must leave the data and the output exactly as they were
+"""
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import backend.ingest_week as ingest
+from backend.logic.policy_loader import policy_loader
+from backend.main import DATA_FILES
+
+
+class FixedAgent:
+    """Stand-in for PolicyAgent that returns empty decisions without calling the LLM."""
+
+    def get_recommendations(self, state):
+        return {
+            "decisions": {
+                "campaign_budget_actions": [],
+                "ad_group_bid_actions": [],
+                "audience_targeting_actions": [],
+                "explanation": "fixed"
+            },
+            "log_history": []
+        }
+
+
+def week_rows(week):
+    """The new week's rows as backend/ingest_week.py reads them (without the week column)."""
+    rows = {}
+    for key, path in DATA_FILES.items():
+        df = pd.read_csv(path)
+        rows[key] = df[df["week"] == week].drop(columns=["week"])
+    return rows
+
+
+def output_weeks(output_format):
+    """Weeks listed by the published output."""
+    if output_format == "sharded":
+        with open(os.path.join(ingest.OUTPUT_DIR, "manifest.json")) as f:
+            return [w["week"] for w in json.load(f)["weeks"]]
+    with open(ingest.OUTPUT_FILE) as f:
+        return [e["week"] for e in json.load(f)["campaign_history"]]
+
+
+@pytest.mark.parametrize("output_format", ["sharded", "single"])
+def test_failed_append_leaves_data_and_output_unchanged(tmp_path, monkeypatch, output_format):
+    # Data CSVs holding weeks 1-10, output and buffers in a scratch directory
+    data_files = {}
+    for key, path in DATA_FILES.items():
+        data_files[key] = str(tmp_path / f"{key}.csv")
+        df = pd.read_csv(path)
+        df[df["week"] <= 10].to_csv(data_files[key], index=False)
+    monkeypatch.setattr(ingest, "OUTPUT_DIR", str(tmp_path / "results"))
+    monkeypatch.setattr(ingest, "OUTPUT_FILE", str(tmp_path / "results.json"))
+    get_value = policy_loader.get_value
+
+    def settings(*keys, default=None):
+        if keys == ("output", "format"):
+            return output_format
+        if keys == ("ingest", "state_file"):
+            return str(tmp_path / "enricher_state.json")
+        return get_value(*keys, default=default)
+    monkeypatch.setattr(policy_loader, "get_value", settings)
+
+    ingest.ingest_week(week_rows(11), data_files=data_files, agent=FixedAgent())
+    csv_before = {key: open(path, "rb").read() for key, path in data_files.items()}
+
+    # The second CSV append fails part-way through the ingestion of week 12
+    append_rows = ingest.append_rows
+
+    def failing_append(frames, files):
+        append_rows(dict(list(frames.items())[:1]), files)
+        raise OSError("disk full")
+    monkeypatch.setattr(ingest, "append_rows", failing_append)
+    with pytest.raises(OSError):
+        ingest.ingest_week(week_rows(12), data_files=data_files, agent=FixedAgent())
+
+    assert {key: open(path, "rb").read() for key, path in data_files.items()} == csv_before
+    assert output_weeks(output_format) == [11]
+
+    # A retry ingests the week normally
+    monkeypatch.setattr(ingest, "append_rows", append_rows)
+    ingest.ingest_week(week_rows(12), data_files=data_files, agent=FixedAgent())
+    assert output_weeks(output_format) == [11, 12]
+    assert pd.read_csv(data_files["campaigns"])["week"].max() == 12
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))